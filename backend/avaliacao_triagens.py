@@ -0,0 +1,495 @@
+"""
+Avaliação offline do pipeline de triagem sobre os casos validados.
+
+As triagens validadas de validacao_triagem (validado = 1) são o gabarito. Cada uma
+passa de novo pelo caminho de /api/triagem: embedding, busca dos k casos
+semelhantes no ChromaDB, prompt, geração no Ollama e parse_response. A cor obtida
+é comparada com a validada. Serve para medir o efeito de trocar o modelo, o k ou o
+prompt sobre a acurácia e a latência.
+
+A cor de referência é a `classificacao` gravada na triagem validada. Com
+--correcao-feedback, uma cor citada no `feedback` do validador logo após uma
+indicação explícita de correção ("deveria ser LARANJA", "o correto seria
+VERDE") substitui a classificação; cores citadas de outra forma ("correto, não
+é LARANJA") são ignoradas. O relatório informa quantas referências vieram do
+feedback. Na busca de semelhantes, o próprio caso é excluído: ele está indexado
+na coleção e vazaria a resposta para o prompt.
+
+Os casos rodam com concorrência limitada (--concorrencia), e os embeddings de
+casos simultâneos são agrupados em lotes pelo EmbeddingBatcher. Cada caso
+concluído é acrescentado ao arquivo de resultados (JSONL, --saida), que serve de
+checkpoint. Rodar de novo com a mesma configuração continua de onde parou e só
+repete os casos sem resposta do modelo.
+
+O relatório traz:
+
+- a matriz de confusão entre as cores;
+- a matriz um-contra-todos (VP, FP, FN, VN) de cada cor, com precisão e revocação;
+- as taxas de subtriagem e supertriagem;
+- a vazão e a latência de cada etapa;
+- os tokens de prompt e os gerados.
+
+Com --fake-ollama a geração usa o Ollama simulado de benchmarks/fake_ollama.py.
+Com --embeddings-simulados os embeddings vêm do EmbeddingService simulado, numa
+coleção do ChromaDB em memória. Juntos, permitem rodar sem rede e sem GPU.
+
+Uso:
+    python avaliacao_triagens.py --ollama-url http://gpu01:11434 --modelo-llm mistral --k 3
+    python avaliacao_triagens.py --k 5 --saida avaliacao_k5.jsonl --relatorio avaliacao_k5.json
+    python avaliacao_triagens.py --fake-ollama --embeddings-simulados --limite 200
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+import time
+import unicodedata
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from cache_respostas import calcular_fingerprint
+from construtor_prompt import ConstrutorPrompt
+from embedding_batcher import EmbeddingBatcher
+from ollama_service import OllamaService
+from repositorio import conexao
+from saude_ollama import CircuitBreaker
+
+logger = logging.getLogger("avaliacao_triagens")
+
+# Da mais para a menos urgente
+CORES = ("VERMELHO", "LARANJA", "AMARELO", "VERDE", "AZUL")
+SEM_COR = "INDEFINIDA"
+ETAPAS = ("embedding", "busca", "prompt", "llm", "parse", "total")
+# Cor logo após uma indicação explícita de correção (feedback já sem acentos e em minúsculas)
+_CORRECAO_NO_FEEDBACK = re.compile(
+    r"(?<!nao )\b(?:deveria ser|deveria ter sido|correto seria|correta seria|o correto e|a correta e|"
+    r"corrigir para|corrigido para|corrigida para|reclassificar como|reclassificado como|reclassificada como)"
+    r"\s*:?\s*(vermelho|laranja|amarelo|verde|azul)\b"
+)
+
+
+def _sem_acentos(texto: str) -> str:
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+def cor_de_referencia(classificacao: Optional[str], feedback: Optional[str],
+                      correcao_feedback: bool = False) -> Tuple[Optional[str], str]:
+    """Cor validada do caso e sua origem ("classificacao" ou "feedback"); None se não houver cor válida."""
+    classificacao = (classificacao or "").strip().upper()
+    if correcao_feedback and feedback:
+        correcoes = {cor.upper() for cor in _CORRECAO_NO_FEEDBACK.findall(_sem_acentos(feedback))}
+        if len(correcoes) == 1 and classificacao not in correcoes:
+            return correcoes.pop(), "feedback"
+    return (classificacao, "classificacao") if classificacao in CORES else (None, "")
+
+
+def carregar_casos(limite: Optional[int] = None, data_inicio: Optional[str] = None, data_fim: Optional[str] = None,
+                   correcao_feedback: bool = False) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Casos validados com cor de referência, do mais antigo ao mais recente.
+
+    Returns:
+        Os casos e o número de triagens validadas ignoradas por não terem uma cor reconhecida
+    """
+    condicoes, params = ["validado = 1"], []
+    if data_inicio:
+        condicoes.append("data_hora >= ?")
+        params.append(data_inicio)
+    if data_fim:
+        condicoes.append("data_hora <= ?")
+        params.append(f"{data_fim} 23:59:59" if len(data_fim) == 10 else data_fim)
+    sql = (f"SELECT id, sintomas, classificacao, feedback FROM validacao_triagem "
+           f"WHERE {' AND '.join(condicoes)} ORDER BY data_hora, id")
+    if limite:
+        sql += " LIMIT ?"
+        params.append(limite)
+    with conexao() as conn:
+        linhas = conn.execute(sql, params).fetchall()
+
+    casos, sem_referencia = [], 0
+    for triagem_id, sintomas, classificacao, feedback in linhas:
+        verdade, origem = cor_de_referencia(classificacao, feedback, correcao_feedback)
+        if verdade is None or not sintomas:
+            sem_referencia += 1
+            continue
+        casos.append({"id": triagem_id, "sintomas": sintomas, "verdade": verdade, "origem_verdade": origem})
+    return casos, sem_referencia
+
+
+class ArquivoResultados:
+    """
+    Resultados por caso em JSONL, usados como checkpoint.
+
+    A primeira linha guarda a configuração da avaliação; retomar com outra
+    configuração misturaria resultados de pipelines diferentes e é recusado.
+    """
+
+    def __init__(self, caminho: str, configuracao: Dict[str, Any], recomecar: bool = False):
+        self.caminho = caminho
+        self.resultados: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(caminho) and not recomecar:
+            with open(caminho, "r", encoding="utf-8") as f:
+                linha = f.readline()
+                cabecalho = json.loads(linha or "{}")
+                if cabecalho.get("configuracao") != configuracao:
+                    raise ValueError(f"{caminho} foi gerado com outra configuração "
+                                     f"({cabecalho.get('configuracao')}); use --recomecar ou outra --saida")
+                for linha in f:
+                    try:
+                        resultado = json.loads(linha)
+                    except json.JSONDecodeError:
+                        # Última linha truncada por uma interrupção: o caso é refeito
+                        continue
+                    self.resultados[resultado["id"]] = resultado
+            self._arquivo = open(caminho, "a", encoding="utf-8")
+            if self._arquivo.tell() and not linha.endswith("\n"):
+                self._arquivo.write("\n")
+        else:
+            self._arquivo = open(caminho, "w", encoding="utf-8")
+            self._arquivo.write(json.dumps({"configuracao": configuracao}, ensure_ascii=False) + "\n")
+        self._arquivo.flush()
+
+    def concluidos(self) -> set:
+        """Ids dos casos já respondidos pelo modelo (os demais são repetidos)."""
+        return {triagem_id for triagem_id, r in self.resultados.items() if r["motivo"] == "ok"}
+
+    def gravar(self, resultado: Dict[str, Any]):
+        self.resultados[resultado["id"]] = resultado
+        self._arquivo.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+        self._arquivo.flush()
+
+    def fechar(self):
+        self._arquivo.close()
+
+
+class AvaliadorTriagens:
+    """Reprocessa casos pelo pipeline de triagem com no máximo `concorrencia` casos em andamento."""
+
+    def __init__(self, embedding_service, collection, ollama_service: OllamaService, k: int = 3,
+                 concorrencia: int = 4, prazo_s: Optional[float] = None, lote_embeddings: int = 16):
+        self.collection = collection
+        self.ollama_service = ollama_service
+        self.k = k
+        self.concorrencia = concorrencia
+        self.prazo_s = prazo_s
+        self.batcher = EmbeddingBatcher(embedding_service, max_batch_size=lote_embeddings, max_wait_ms=5.0)
+
+    def _buscar_semelhantes(self, triagem_id: str, embedding: List[float]) -> List[Dict[str, str]]:
+        if self.k <= 0:
+            return []
+        # Um resultado a mais, porque o próprio caso volta da busca e é descartado
+        resultados = self.collection.query(query_embeddings=[embedding], n_results=self.k + 1)
+        return [
+            {"sintomas": metadata["content"], "classificacao": metadata.get("classificacao", "")}
+            for id_caso, metadata in zip(resultados["ids"][0], resultados["metadatas"][0])
+            if id_caso != triagem_id
+        ][:self.k]
+
+    async def avaliar_caso(self, caso: Dict[str, Any]) -> Dict[str, Any]:
+        tempos = {}
+        inicio = marca = time.perf_counter()
+
+        def etapa(nome):
+            nonlocal marca
+            agora = time.perf_counter()
+            tempos[nome] = round((agora - marca) * 1000, 2)
+            marca = agora
+
+        embedding = await self.batcher.get_embedding(caso["sintomas"])
+        etapa("embedding")
+        semelhantes = await asyncio.to_thread(self._buscar_semelhantes, caso["id"], embedding)
+        etapa("busca")
+        prompt = self.ollama_service.construtor_prompt.construir(caso["sintomas"], semelhantes)
+        etapa("prompt")
+        deadline = time.monotonic() + self.prazo_s if self.prazo_s else None
+        geracao = await self.ollama_service.generate(prompt.texto, deadline=deadline)
+        etapa("llm")
+        prevista = None
+        if geracao.sucesso:
+            prevista = self.ollama_service.parse_response(geracao.texto)[0] or SEM_COR
+        etapa("parse")
+        tempos["total"] = round((time.perf_counter() - inicio) * 1000, 2)
+
+        return {
+            "id": caso["id"],
+            "verdade": caso["verdade"],
+            "origem_verdade": caso["origem_verdade"],
+            "prevista": prevista,
+            "motivo": geracao.motivo,
+            "tentativas": geracao.tentativas,
+            "casos_no_prompt": prompt.casos_incluidos,
+            "tokens_prompt": geracao.tokens_prompt,
+            "tokens_prompt_estimados": prompt.tokens_estimados,
+            "tokens_gerados": geracao.tokens_gerados,
+            "tempos_ms": tempos
+        }
+
+    async def avaliar(self, casos: List[Dict[str, Any]], ao_concluir: Callable[[Dict[str, Any]], None]):
+        """Avalia os casos, chamando `ao_concluir` com o resultado de cada um assim que termina."""
+        pendentes = iter(casos)
+        concluidos = 0
+        inicio = time.perf_counter()
+
+        async def trabalhador():
+            nonlocal concluidos
+            # O iterador é compartilhado: cada trabalhador pega o próximo caso livre
+            for caso in pendentes:
+                try:
+                    resultado = await self.avaliar_caso(caso)
+                except Exception as e:
+                    logger.error(f"Erro ao avaliar o caso {caso['id']}: {str(e)}")
+                    resultado = {"id": caso["id"], "verdade": caso["verdade"], "origem_verdade": caso["origem_verdade"],
+                                 "prevista": None, "motivo": "erro", "erro": str(e)}
+                ao_concluir(resultado)
+                concluidos += 1
+                if concluidos % 50 == 0:
+                    logger.info(f"{concluidos}/{len(casos)} casos avaliados "
+                                f"({concluidos / (time.perf_counter() - inicio):.2f} casos/s)")
+
+        try:
+            await asyncio.gather(*(trabalhador() for _ in range(self.concorrencia)))
+        finally:
+            await self.batcher.stop()
+
+
+def _resumo_ms(valores: List[float]) -> Optional[Dict[str, float]]:
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    percentil = lambda fracao: ordenados[min(len(ordenados) - 1, int(len(ordenados) * fracao))]
+    return {"p50": percentil(0.5), "p95": percentil(0.95), "p99": percentil(0.99),
+            "media": round(sum(ordenados) / len(ordenados), 2)}
+
+
+def _razao(numerador: float, denominador: float) -> Optional[float]:
+    return round(numerador / denominador, 4) if denominador else None
+
+
+def gerar_relatorio(resultados: Iterable[Dict[str, Any]], execucao: List[Dict[str, Any]],
+                    duracao_s: float) -> Dict[str, Any]:
+    """
+    Métricas de qualidade sobre todos os resultados do arquivo e de vazão sobre os da execução atual.
+
+    Args:
+        resultados: Último resultado de cada caso (inclusive de execuções anteriores)
+        execucao: Resultados produzidos nesta execução
+        duracao_s: Duração desta execução
+    """
+    resultados = list(resultados)
+    respondidos = [r for r in resultados if r["motivo"] == "ok"]
+    matriz = {verdade: {prevista: 0 for prevista in CORES + (SEM_COR,)} for verdade in CORES}
+    for r in respondidos:
+        matriz[r["verdade"]][r["prevista"]] += 1
+
+    total = len(respondidos)
+    por_cor = {}
+    for cor in CORES:
+        vp = matriz[cor][cor]
+        fn = sum(matriz[cor].values()) - vp
+        fp = sum(matriz[verdade][cor] for verdade in CORES if verdade != cor)
+        precisao, revocacao = _razao(vp, vp + fp), _razao(vp, vp + fn)
+        por_cor[cor] = {
+            "vp": vp, "fp": fp, "fn": fn, "vn": total - vp - fp - fn,
+            "suporte": vp + fn,
+            "precisao": precisao,
+            "revocacao": revocacao,
+            "f1": _razao(2 * precisao * revocacao, precisao + revocacao) if precisao and revocacao else None
+        }
+
+    nivel = {cor: i for i, cor in enumerate(CORES)}
+    # Subtriagem: cor prevista menos urgente que a validada (o erro clinicamente perigoso)
+    subtriagem = sum(1 for r in respondidos if r["prevista"] in nivel and nivel[r["prevista"]] > nivel[r["verdade"]])
+    supertriagem = sum(1 for r in respondidos if r["prevista"] in nivel and nivel[r["prevista"]] < nivel[r["verdade"]])
+
+    tokens_prompt = sum(r["tokens_prompt"] or r["tokens_prompt_estimados"] for r in respondidos)
+    tokens_gerados = sum(r["tokens_gerados"] or 0 for r in respondidos)
+    gerados_execucao = sum(r.get("tokens_gerados") or 0 for r in execucao)
+    return {
+        "casos": len(resultados),
+        "respondidos": total,
+        "sem_resposta": dict(Counter(r["motivo"] for r in resultados if r["motivo"] != "ok")),
+        "referencia_corrigida_pelo_feedback": sum(1 for r in resultados if r["origem_verdade"] == "feedback"),
+        "acuracia": _razao(sum(matriz[cor][cor] for cor in CORES), total),
+        "subtriagem": _razao(subtriagem, total),
+        "supertriagem": _razao(supertriagem, total),
+        "indefinidas": _razao(sum(matriz[cor][SEM_COR] for cor in CORES), total),
+        "matriz_confusao": matriz,
+        "por_cor": por_cor,
+        "latencia_ms": {etapa: _resumo_ms([r["tempos_ms"][etapa] for r in respondidos]) for etapa in ETAPAS},
+        "tokens": {
+            "prompt": tokens_prompt,
+            "gerados": tokens_gerados,
+            "prompt_por_caso": _razao(tokens_prompt, total),
+            "gerados_por_caso": _razao(tokens_gerados, total),
+            "prompt_informado_pelo_ollama": sum(1 for r in respondidos if r["tokens_prompt"] is not None)
+        },
+        "execucao": {
+            "casos": len(execucao),
+            "duracao_s": round(duracao_s, 2),
+            "casos_por_segundo": round(len(execucao) / duracao_s, 2) if duracao_s else None,
+            "tokens_gerados_por_segundo": round(gerados_execucao / duracao_s, 1) if duracao_s else None
+        }
+    }
+
+
+def _indexar_em_memoria(collection, embedding_service, lote: int = 256) -> int:
+    """Indexa todos os casos validados numa coleção temporária, sem marcar a indexação no banco."""
+    with conexao() as conn:
+        casos = conn.execute(
+            "SELECT id, sintomas, resposta, classificacao FROM validacao_triagem WHERE validado = 1"
+        ).fetchall()
+    for inicio in range(0, len(casos), lote):
+        bloco = casos[inicio:inicio + lote]
+        collection.upsert(
+            ids=[caso[0] for caso in bloco],
+            embeddings=embedding_service.get_batch_embeddings([caso[1] for caso in bloco]),
+            metadatas=[{"content": caso[1], "resposta": caso[2] or "", "classificacao": caso[3] or ""}
+                       for caso in bloco]
+        )
+    return len(casos)
+
+
+def _carregar_recuperacao(args) -> tuple:
+    import chromadb
+
+    if args.embeddings_simulados:
+        from benchmarks.embedding_simulado import EmbeddingSimulado
+
+        embedding_service = EmbeddingSimulado(cache_dir=tempfile.mkdtemp(), custo_lote_ms=0, custo_texto_ms=0)
+        collection = chromadb.EphemeralClient().get_or_create_collection(name="avaliacao_triagens")
+        indexados = _indexar_em_memoria(collection, embedding_service)
+        logger.info(f"{indexados} casos validados indexados na coleção em memória")
+        return embedding_service, collection
+
+    from embedding_service import EmbeddingService
+    from indexacao_casos import sincronizar_casos_validados
+
+    embedding_service = EmbeddingService(model_name=args.modelo_embeddings,
+                                         backend=os.getenv("EMBEDDING_BACKEND", "fp32"))
+    collection = chromadb.PersistentClient(path=args.chroma_dir).get_or_create_collection(name="triagem_hci")
+    if not args.sem_sincronizacao:
+        sincronizar_casos_validados(collection, embedding_service)
+    return embedding_service, collection
+
+
+def main():
+    from migracoes import aplicar_migracoes
+
+    parser = argparse.ArgumentParser(description="Avalia o pipeline de triagem sobre os casos validados")
+    parser.add_argument("--saida", default="avaliacao_triagens.jsonl", help="Resultados por caso (checkpoint)")
+    parser.add_argument("--relatorio", help="Grava também o relatório JSON neste arquivo")
+    parser.add_argument("--recomecar", action="store_true", help="Descarta os resultados de uma execução anterior")
+    parser.add_argument("--limite", type=int, help="Avalia só os N casos validados mais antigos")
+    parser.add_argument("--data-inicio", help="Só casos a partir desta data (AAAA-MM-DD)")
+    parser.add_argument("--data-fim", help="Só casos até esta data (AAAA-MM-DD)")
+    parser.add_argument("--correcao-feedback", action="store_true",
+                        help="Usa como referência a cor indicada no feedback como correção (\"deveria ser LARANJA\")")
+    parser.add_argument("--concorrencia", type=int, default=4, help="Casos em andamento ao mesmo tempo")
+    parser.add_argument("--k", type=int, default=3, help="Casos semelhantes buscados para o prompt")
+    parser.add_argument("--ollama-url", default=os.getenv("OLLAMA_URL", "http://localhost:11434"))
+    parser.add_argument("--modelo-llm", default=os.getenv("OLLAMA_MODEL", "mistral"))
+    parser.add_argument("--orcamento-tokens", type=int, default=int(os.getenv("PROMPT_TOKEN_BUDGET", "1536")))
+    parser.add_argument("--num-predict", type=int, default=int(os.getenv("OLLAMA_NUM_PREDICT", "320")))
+    parser.add_argument("--tentativas", type=int, default=2, help="Tentativas por caso antes de registrar a falha")
+    parser.add_argument("--timeout", type=float, default=float(os.getenv("OLLAMA_READ_TIMEOUT", "120")),
+                        help="Timeout de leitura de cada chamada ao Ollama (s)")
+    parser.add_argument("--prazo-s", type=float, help="Prazo total de cada geração, como TRIAGEM_SLA_S na API")
+    parser.add_argument("--modelo-embeddings", default=os.getenv("EMBEDDING_MODEL", "pucpr/biobertpt-clin"))
+    parser.add_argument("--chroma-dir", default="./chroma_db")
+    parser.add_argument("--sem-sincronizacao", action="store_true",
+                        help="Não indexa antes os casos validados ainda fora da coleção")
+    parser.add_argument("--fake-ollama", action="store_true", help="Usa o Ollama simulado em vez de --ollama-url")
+    parser.add_argument("--fake-latencia", type=float, default=0.05)
+    parser.add_argument("--fake-tokens-por-segundo", type=float, default=0.0)
+    parser.add_argument("--embeddings-simulados", action="store_true",
+                        help="Embeddings simulados e coleção em memória (sem o modelo BERT)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    # Os registros por chamada dos serviços encobririam o progresso da avaliação
+    for nome in ("ollama_service", "embedding_service", "construtor_prompt", "httpx"):
+        logging.getLogger(nome).setLevel(logging.WARNING)
+    aplicar_migracoes()
+
+    servidor_fake = None
+    ollama_url = args.ollama_url
+    if args.fake_ollama:
+        from benchmarks.fake_ollama import iniciar_fake_ollama
+
+        servidor_fake = iniciar_fake_ollama(latencia=args.fake_latencia,
+                                            tokens_por_segundo=args.fake_tokens_por_segundo)
+        ollama_url = servidor_fake.url
+
+    construtor = ConstrutorPrompt(orcamento_tokens=args.orcamento_tokens)
+    ollama_service = OllamaService(
+        url=ollama_url, model=args.modelo_llm, max_retries=args.tentativas, read_timeout=args.timeout,
+        max_connections=args.concorrencia, construtor_prompt=construtor, num_predict=args.num_predict,
+        # O circuito nunca abre: uma falha fica registrada no caso, que é repetido ao retomar
+        circuit_breaker=CircuitBreaker(limiar_falhas=sys.maxsize)
+    )
+    configuracao = {
+        "modelo_llm": args.modelo_llm,
+        "ollama": "simulado" if args.fake_ollama else "real",
+        "prompt": calcular_fingerprint(args.modelo_llm, construtor.prefixo),
+        "k": args.k,
+        "orcamento_tokens": args.orcamento_tokens,
+        "num_predict": args.num_predict,
+        "embeddings": "simulado" if args.embeddings_simulados else args.modelo_embeddings,
+        "correcao_feedback": args.correcao_feedback
+    }
+    try:
+        arquivo = ArquivoResultados(args.saida, configuracao, args.recomecar)
+    except ValueError as e:
+        parser.error(str(e))
+
+    casos, sem_referencia = carregar_casos(args.limite, args.data_inicio, args.data_fim,
+                                           correcao_feedback=args.correcao_feedback)
+    concluidos = arquivo.concluidos()
+    pendentes = [caso for caso in casos if caso["id"] not in concluidos]
+    corrigidos = sum(1 for caso in casos if caso["origem_verdade"] == "feedback")
+    logger.info(f"{len(casos)} casos validados ({sem_referencia} sem cor de referência ignorados, "
+                f"{corrigidos} com a referência corrigida pelo feedback); "
+                f"{len(casos) - len(pendentes)} já avaliados em {args.saida}, {len(pendentes)} pendentes")
+
+    embedding_service, collection = _carregar_recuperacao(args)
+    avaliador = AvaliadorTriagens(embedding_service, collection, ollama_service, k=args.k,
+                                  concorrencia=args.concorrencia, prazo_s=args.prazo_s)
+    execucao: List[Dict[str, Any]] = []
+
+    def ao_concluir(resultado):
+        execucao.append(resultado)
+        arquivo.gravar(resultado)
+
+    async def avaliar():
+        try:
+            await avaliador.avaliar(pendentes, ao_concluir)
+        finally:
+            await ollama_service.aclose()
+
+    inicio = time.perf_counter()
+    try:
+        asyncio.run(avaliar())
+    finally:
+        arquivo.fechar()
+        embedding_service.close()
+        if servidor_fake is not None:
+            servidor_fake.shutdown()
+
+    ids_casos = {caso["id"] for caso in casos}
+    relatorio = gerar_relatorio((r for i, r in arquivo.resultados.items() if i in ids_casos), execucao,
+                                time.perf_counter() - inicio)
+    relatorio["configuracao"] = configuracao
+    relatorio["sem_cor_de_referencia"] = sem_referencia
+    if args.relatorio:
+        with open(args.relatorio, "w", encoding="utf-8") as f:
+            json.dump(relatorio, f, indent=2, ensure_ascii=False)
+    print(json.dumps(relatorio, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
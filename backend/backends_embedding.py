@@ -0,0 +1,123 @@
+"""
+Backends de inferência do modelo de embeddings na CPU.
+
+    fp32         modelo PyTorch em float32, execução eager (comportamento original)
+    int8         quantização dinâmica int8 das camadas Linear (pesos int8, ativações
+                 quantizadas em tempo de execução); menor uso de memória e matmuls mais
+                 rápidos na CPU, com embeddings praticamente iguais aos do fp32
+    torchscript  grafo exportado com torch.jit.trace, congelado (torch.jit.freeze) e
+                 otimizado para inferência; elimina o overhead do Python entre as camadas
+
+O agrupamento por comprimento (buckets) arredonda a largura de cada lote para o
+próximo tamanho da lista, limitando o número de formatos distintos de entrada: o
+runtime do grafo exportado especializa e reaproveita a otimização por formato.
+"""
+import logging
+from typing import Dict, Optional, Sequence, Tuple
+
+import torch
+from transformers import AutoModel, AutoTokenizer
+
+logger = logging.getLogger("backends_embedding")
+
+BACKENDS = ("fp32", "int8", "torchscript")
+BUCKETS_PADRAO = (16, 32, 64, 128, 256, 512)
+
+
+def configurar_threads(num_threads: Optional[int] = None, interop_threads: Optional[int] = None):
+    """Define as threads do PyTorch (valem para o processo inteiro)."""
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    if interop_threads:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError:
+            # Só pode ser definido antes do primeiro trabalho paralelo do processo
+            logger.warning("Threads inter-op já inicializadas; mantendo o valor atual")
+
+
+def largura_bucket(largura: int, buckets: Optional[Sequence[int]]) -> int:
+    """Menor bucket que comporta `largura` (ou a própria largura, sem buckets ou acima do maior)."""
+    if buckets:
+        for bucket in buckets:
+            if bucket >= largura:
+                return bucket
+    return largura
+
+
+class ModeloEmbedding:
+    """Interface comum dos backends: recebe os tensores do tokenizer e retorna o last_hidden_state."""
+
+    def __init__(self, modelo, backend: str):
+        self.modelo = modelo
+        self.backend = backend
+
+    def __call__(self, inputs: Dict[str, torch.Tensor]) -> torch.Tensor:
+        with torch.inference_mode():
+            saida = self.modelo(**inputs)
+        # O grafo exportado já retorna o tensor; o modelo eager, um ModelOutput
+        return saida if isinstance(saida, torch.Tensor) else saida.last_hidden_state
+
+
+class _SaidaTensor(torch.nn.Module):
+    """Expõe só o last_hidden_state, já que o torch.jit.trace exige saídas em tensores."""
+
+    def __init__(self, modelo):
+        super().__init__()
+        self.modelo = modelo
+
+    def forward(self, input_ids, attention_mask, token_type_ids=None):
+        return self.modelo(input_ids=input_ids, attention_mask=attention_mask,
+                           token_type_ids=token_type_ids).last_hidden_state
+
+
+def _quantizar_int8(modelo):
+    return torch.ao.quantization.quantize_dynamic(modelo, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _exportar_torchscript(modelo, tokenizer, device):
+    exemplo = tokenizer(["paciente com febre e tosse", "dor"], padding="max_length", truncation=True, max_length=16,
+                        return_tensors="pt")
+    exemplo = {chave: valor.to(device) for chave, valor in exemplo.items()}
+    with torch.inference_mode():
+        grafo = torch.jit.trace(_SaidaTensor(modelo), example_kwarg_inputs=exemplo, strict=False)
+    grafo = torch.jit.freeze(grafo.eval())
+    try:
+        grafo = torch.jit.optimize_for_inference(grafo)
+    except Exception as e:
+        logger.warning(f"optimize_for_inference indisponível, usando o grafo congelado: {str(e)}")
+    return grafo
+
+
+def carregar_backend(model_name: str, backend: str = "fp32",
+                     device: Optional[torch.device] = None) -> Tuple[object, ModeloEmbedding]:
+    """
+    Carrega o tokenizer e o modelo no backend pedido.
+
+    Se a exportação do grafo falhar, volta para o fp32; o backend efetivamente
+    usado fica em `ModeloEmbedding.backend`.
+
+    Returns:
+        (tokenizer, modelo)
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend de embeddings inválido: {backend} (opções: {', '.join(BACKENDS)})")
+    device = device or torch.device("cpu")
+    if backend == "int8" and device.type != "cpu":
+        logger.warning("Quantização dinâmica int8 só é suportada na CPU; usando CPU")
+        device = torch.device("cpu")
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    modelo = AutoModel.from_pretrained(model_name).to(device).eval()
+
+    if backend == "int8":
+        modelo = _quantizar_int8(modelo)
+    elif backend == "torchscript":
+        try:
+            modelo = _exportar_torchscript(modelo, tokenizer, device)
+        except Exception as e:
+            logger.error(f"Falha ao exportar o grafo TorchScript, usando fp32: {str(e)}")
+            backend = "fp32"
+
+    logger.info(f"Backend de embeddings: {backend} ({device}, {torch.get_num_threads()} threads)")
+    return tokenizer, ModeloEmbedding(modelo, backend)
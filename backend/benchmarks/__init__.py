@@ -0,0 +1,6 @@
+"""
+Ferramentas de benchmark e servidores simulados para testes de desempenho do backend.
+
+Execute os scripts a partir do diretório backend, por exemplo:
+    python -m benchmarks.bench_ollama_concorrencia
+"""
@@ -0,0 +1,428 @@
+"""
+Teste de carga de ponta a ponta da API, com chegadas em malha aberta.
+
+Sobe em subprocessos o Ollama simulado (benchmarks/fake_ollama.py, com latência e
+taxa de tokens configuráveis) e a API com uvicorn. A API usa um banco SQLite e um
+ChromaDB temporários, com --triagens-base triagens sintéticas, e o EmbeddingService
+simulado (benchmarks/embedding_simulado.py) ou o real (--embeddings real, com
+--modelo). O gerador de carga fica em outro processo, sem disputar o GIL com a API.
+
+Cada rota recebe chegadas em malha aberta (Poisson ou intervalos constantes) na
+taxa pedida, independentemente das respostas: se a API atrasar, as requisições se
+acumulam, como pacientes chegando à recepção. A latência é medida a partir do
+instante agendado da chegada, então o atraso do próprio gerador também conta. As
+requisições dos primeiros --aquecimento segundos são descartadas.
+
+    triagem    POST /api/triagem com queixas sintéticas (--queixas-distintas controla
+               a chance de acerto no cache de respostas)
+    triagens   GET /api/triagens, uma página de 50 com filtro sorteado
+    validar    POST /api/validar de triagens pendentes do banco e das geradas no teste
+    login      POST /api/login (--usuario/--senha, padrão o admin criado pela API)
+
+O resultado é um JSON com vazão, latência p50/p95/p99 e taxa de erro por rota,
+CPU e memória do processo da API e o tempo médio de cada etapa da triagem (lido
+de /metrics). Grave com --saida e compare com o de outro commit com --comparar. A
+saída termina com código 1 se a taxa de erro de alguma rota passar de --max-taxa-erro.
+
+Uso:
+    python -m benchmarks.bench_carga --duracao 60 --taxa triagem=2 triagens=10 validar=1 login=1
+    python -m benchmarks.bench_carga --saida carga_antes.json
+    python -m benchmarks.bench_carga --comparar carga_antes.json
+    python -m benchmarks.bench_carga --url http://servidor:8000 --taxa triagens=50
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.bench_embeddings_lote import gerar_queixas
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TAXAS_PADRAO = {"triagem": 2.0, "triagens": 10.0, "validar": 1.0, "login": 1.0}
+FILTROS_LISTAGEM = ("todas", "pendentes", "validadas")
+
+
+def _porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _uso_processo(pid: int) -> Optional[dict]:
+    """Tempo de CPU (s) e pico de RSS (MB) de um processo, lidos do /proc (só no Linux)."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            campos = f.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/status") as f:
+            pico_kb = next(int(linha.split()[1]) for linha in f if linha.startswith("VmHWM:"))
+    except (OSError, StopIteration):
+        return None
+    # utime e stime são o 14º e o 15º campos de /proc/<pid>/stat
+    return {"cpu_s": (int(campos[11]) + int(campos[12])) / os.sysconf("SC_CLK_TCK"),
+            "pico_rss_mb": round(pico_kb / 1024, 1)}
+
+
+def _etapas_metricas(texto: str) -> Dict[str, list]:
+    """Soma (s) e contagem do histograma triagem_etapa_segundos, por etapa."""
+    etapas = {}
+    for sufixo, etapa, valor in re.findall(r'^triagem_etapa_segundos_(sum|count)\{etapa="([^"]+)"\} (\S+)$',
+                                           texto, re.MULTILINE):
+        etapas.setdefault(etapa, [0.0, 0])[0 if sufixo == "sum" else 1] = float(valor)
+    return etapas
+
+
+def servir(args):
+    """Processo da API: banco, ChromaDB e cache de embeddings temporários em `args.diretorio`."""
+    os.environ["TRIAGEM_DB_PATH"] = os.path.join(args.diretorio, "carga.db")
+    os.environ.setdefault("LOG_FILE", os.path.join(args.diretorio, "triagem_api.log"))
+    os.environ.setdefault("LOG_CONSOLE", "false")
+    # ./chroma_db e ./embedding_cache ficam no diretório temporário
+    os.chdir(args.diretorio)
+
+    import uvicorn
+    from migracoes import aplicar_migracoes
+    from benchmarks.bench_exportacao import popular_banco
+
+    aplicar_migracoes()
+    popular_banco(args.triagens_base)
+
+    import main
+    if args.embeddings == "simulado":
+        from benchmarks.embedding_simulado import EmbeddingSimulado
+        main._carregar_embedding_service = lambda: EmbeddingSimulado(
+            custo_lote_ms=args.custo_lote_ms, custo_texto_ms=args.custo_texto_ms
+        )
+    uvicorn.run(main.app, host="127.0.0.1", port=args.porta, log_config=None, access_log=False)
+
+
+def _iniciar_pilha(args, diretorio: str, processos: List[subprocess.Popen]) -> tuple:
+    """Sobe o Ollama simulado e a API; retorna a URL da API e o seu processo."""
+    porta_ollama, porta_api = _porta_livre(), _porta_livre()
+    ambiente = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [BACKEND, os.getenv("PYTHONPATH")])),
+                "OLLAMA_URL": f"http://127.0.0.1:{porta_ollama}"}
+    if args.modelo:
+        ambiente["EMBEDDING_MODEL"] = args.modelo
+
+    log_ollama = open(os.path.join(diretorio, "fake_ollama.txt"), "w")
+    processos.append(subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_ollama", "--porta", str(porta_ollama),
+         "--latencia", str(args.latencia), "--tokens-por-segundo", str(args.tokens_por_segundo)],
+        cwd=BACKEND, env=ambiente, stdout=log_ollama, stderr=subprocess.STDOUT
+    ))
+    saida_api = os.path.join(diretorio, "api.txt")
+    api = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.bench_carga", "--servir", "--porta", str(porta_api),
+         "--diretorio", diretorio, "--embeddings", args.embeddings, "--triagens-base", str(args.triagens_base),
+         "--custo-lote-ms", str(args.custo_lote_ms), "--custo-texto-ms", str(args.custo_texto_ms)],
+        cwd=BACKEND, env=ambiente, stdout=open(saida_api, "w"), stderr=subprocess.STDOUT
+    )
+    processos.append(api)
+
+    # Pronta quando todos os serviços carregados em segundo plano (inclusive a indexação) terminarem
+    base_url = f"http://127.0.0.1:{porta_api}"
+    limite = time.monotonic() + args.timeout_inicio
+    while time.monotonic() < limite:
+        if api.poll() is not None:
+            raise RuntimeError(f"A API terminou durante a inicialização (saída em {saida_api})")
+        try:
+            estados = {nome: s["estado"] for nome, s in httpx.get(f"{base_url}/api/status").json()["servicos"].items()}
+        except (httpx.HTTPError, KeyError, ValueError):
+            estados = {}
+        if estados and all(estado == "ready" for estado in estados.values()):
+            return base_url, api
+        if "failed" in estados.values():
+            raise RuntimeError(f"Serviço da API falhou ao carregar: {estados} (saída em {saida_api})")
+        time.sleep(0.2)
+    raise RuntimeError(f"A API não ficou pronta em {args.timeout_inicio}s (saída em {saida_api})")
+
+
+class GeradorRequisicoes:
+    """Monta as requisições de cada rota e confere as respostas."""
+
+    def __init__(self, args, rng: random.Random):
+        self.rng = rng
+        self.queixas = gerar_queixas(args.queixas_distintas, seed=args.semente)
+        self.credenciais = {"username": args.usuario, "password": args.senha}
+        self.pendentes: List[str] = []
+        self.provisorias = 0
+
+    async def carregar_pendentes(self, cliente: httpx.AsyncClient):
+        resposta = await cliente.get("/api/triagens", params={"filtro": "pendentes", "limit": 500, "campos": "id"})
+        self.pendentes = [t["id"] for t in resposta.json()["triagens"]]
+
+    def requisicao(self, rota: str) -> Optional[tuple]:
+        if rota == "triagem":
+            return "POST", "/api/triagem", {"json": {"sintomas": self.rng.choice(self.queixas)}}
+        if rota == "triagens":
+            return "GET", "/api/triagens", {"params": {"filtro": self.rng.choice(FILTROS_LISTAGEM), "limit": 50}}
+        if rota == "validar":
+            if not self.pendentes:
+                return None
+            return "POST", "/api/validar", {"json": {"triagem_id": self.rng.choice(self.pendentes),
+                                                     "validado_por": "carga", "feedback": "Classificação adequada"}}
+        return "POST", "/api/login", {"json": self.credenciais}
+
+    def conferir(self, rota: str, resposta: httpx.Response) -> Optional[str]:
+        """Retorna a categoria do erro, ou None se a resposta estiver correta."""
+        if resposta.status_code != 200:
+            return str(resposta.status_code)
+        corpo = resposta.json()
+        if rota == "triagem":
+            self.provisorias += bool(corpo.get("provisoria"))
+            self.pendentes.append(corpo["id"])
+        elif rota in ("validar", "login") and not corpo.get("success"):
+            return "success_false"
+        return None
+
+
+async def _disparar(cliente, gerador: GeradorRequisicoes, rota: str, agendado: float, amostras: list):
+    requisicao = gerador.requisicao(rota)
+    if requisicao is None:
+        amostras.append((rota, agendado, 0.0, "sem_triagem_pendente"))
+        return
+    metodo, caminho, opcoes = requisicao
+    try:
+        resposta = await cliente.request(metodo, caminho, **opcoes)
+        erro = gerador.conferir(rota, resposta)
+    except httpx.TimeoutException:
+        erro = "timeout"
+    except httpx.HTTPError as e:
+        erro = type(e).__name__
+    amostras.append((rota, agendado, time.perf_counter() - agendado, erro))
+
+
+def agendar_chegadas(taxas: Dict[str, float], duracao: float, chegadas: str, rng: random.Random) -> List[tuple]:
+    """Instantes (s desde o início) de todas as chegadas, intercalando as rotas."""
+    agenda = []
+    for rota, taxa in taxas.items():
+        if taxa <= 0:
+            continue
+        t = 0.0
+        while True:
+            t += rng.expovariate(taxa) if chegadas == "poisson" else 1 / taxa
+            if t >= duracao:
+                break
+            agenda.append((t, rota))
+    return sorted(agenda)
+
+
+def resumir_rota(amostras: list, taxa: float, janela_s: float) -> dict:
+    erros = Counter(erro for _, _, _, erro in amostras if erro)
+    latencias = sorted(latencia * 1000 for _, _, latencia, erro in amostras if erro is None)
+    resumo = {
+        "taxa_alvo_rps": taxa,
+        "enviadas": len(amostras),
+        "sucesso": len(latencias),
+        "erros": dict(erros),
+        "taxa_erro": round(sum(erros.values()) / len(amostras), 4) if amostras else 0.0,
+        "vazao_rps": round(len(latencias) / janela_s, 2) if janela_s > 0 else 0.0
+    }
+    if latencias:
+        percentil = lambda fracao: round(latencias[min(len(latencias) - 1, int(len(latencias) * fracao))], 1)
+        resumo["latencia_ms"] = {"p50": percentil(0.5), "p95": percentil(0.95), "p99": percentil(0.99),
+                                 "max": round(latencias[-1], 1), "media": round(sum(latencias) / len(latencias), 1)}
+    return resumo
+
+
+async def gerar_carga(base_url: str, args, taxas: Dict[str, float], pid_api: Optional[int]) -> dict:
+    rng = random.Random(args.semente)
+    agenda = agendar_chegadas(taxas, args.aquecimento + args.duracao, args.chegadas, rng)
+    gerador = GeradorRequisicoes(args, rng)
+    amostras: list = []
+    marcos = {}
+
+    limites = httpx.Limits(max_connections=None, max_keepalive_connections=200)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limites) as cliente:
+        await gerador.carregar_pendentes(cliente)
+
+        async def marcar(nome):
+            # Métricas e uso de CPU no fim do aquecimento e no fim do teste, para considerar só o intervalo medido
+            marcos[nome] = {"instante": time.perf_counter(), "processo": _uso_processo(pid_api) if pid_api else None,
+                            "etapas": _etapas_metricas((await cliente.get("/metrics")).text)}
+
+        inicio = time.perf_counter()
+        atraso_max = 0.0
+        tarefas = set()
+        aquecido = args.aquecimento == 0
+        if aquecido:
+            await marcar("inicio")
+        for instante, rota in agenda:
+            if not aquecido and instante >= args.aquecimento:
+                aquecido = True
+                tarefas.add(asyncio.create_task(marcar("inicio")))
+            agendado = inicio + instante
+            espera = agendado - time.perf_counter()
+            if espera > 0:
+                await asyncio.sleep(espera)
+            else:
+                atraso_max = max(atraso_max, -espera)
+            tarefa = asyncio.create_task(_disparar(cliente, gerador, rota, agendado, amostras))
+            tarefas.add(tarefa)
+            tarefa.add_done_callback(tarefas.discard)
+        await asyncio.gather(*tarefas)
+        fim = time.perf_counter()
+        await marcar("fim")
+
+    inicio_medicao = inicio + args.aquecimento
+    medidas = [a for a in amostras if a[1] >= inicio_medicao]
+    janela_s = max([a[1] + a[2] for a in medidas], default=fim) - inicio_medicao
+    resultado = {
+        "janela_s": round(janela_s, 2),
+        "atraso_max_gerador_ms": round(atraso_max * 1000, 1),
+        "rotas": {rota: resumir_rota([a for a in medidas if a[0] == rota], taxa, janela_s)
+                  for rota, taxa in taxas.items()},
+        "triagens_provisorias": gerador.provisorias
+    }
+
+    antes, depois = marcos.get("inicio"), marcos["fim"]
+    if antes is not None:
+        etapas = {}
+        for etapa, (soma, contagem) in depois["etapas"].items():
+            soma_antes, contagem_antes = antes["etapas"].get(etapa, (0.0, 0))
+            if contagem > contagem_antes:
+                etapas[etapa] = round((soma - soma_antes) / (contagem - contagem_antes) * 1000, 2)
+        resultado["etapas_triagem_media_ms"] = etapas
+        if antes["processo"] and depois["processo"]:
+            cpu_s = depois["processo"]["cpu_s"] - antes["processo"]["cpu_s"]
+            atendidas = sum(r["enviadas"] for r in resultado["rotas"].values())
+            resultado["api"] = {
+                "cpu_s": round(cpu_s, 2),
+                "utilizacao_cpu": round(cpu_s / (depois["instante"] - antes["instante"]), 3),
+                "cpu_ms_por_requisicao": round(cpu_s / atendidas * 1000, 2) if atendidas else None,
+                "pico_rss_mb": depois["processo"]["pico_rss_mb"]
+            }
+    return resultado
+
+
+def comparar(atual: dict, base: dict) -> dict:
+    """Variação percentual de vazão e latências, por rota, em relação a um resultado anterior."""
+    variacao = lambda novo, antigo: round((novo - antigo) / antigo * 100, 1) if antigo else None
+    comparacao = {"commit_base": base.get("commit")}
+    for rota, resumo in atual["rotas"].items():
+        anterior = base.get("rotas", {}).get(rota)
+        if not anterior:
+            continue
+        comparacao[rota] = {
+            "vazao_rps_%": variacao(resumo["vazao_rps"], anterior["vazao_rps"]),
+            "taxa_erro": [anterior["taxa_erro"], resumo["taxa_erro"]]
+        }
+        if "latencia_ms" in resumo and "latencia_ms" in anterior:
+            for chave in ("p50", "p95", "p99"):
+                comparacao[rota][f"{chave}_%"] = variacao(resumo["latencia_ms"][chave],
+                                                          anterior["latencia_ms"][chave])
+    return comparacao
+
+
+def _commit_atual() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def executar(args) -> dict:
+    taxas = dict(TAXAS_PADRAO)
+    for item in args.taxa or []:
+        rota, _, valor = item.partition("=")
+        if rota not in TAXAS_PADRAO:
+            raise SystemExit(f"Rota desconhecida em --taxa: {rota} (opções: {', '.join(TAXAS_PADRAO)})")
+        taxas[rota] = float(valor)
+    taxas = {rota: taxa for rota, taxa in taxas.items() if taxa > 0}
+
+    diretorio = tempfile.mkdtemp(prefix="carga_")
+    processos: List[subprocess.Popen] = []
+    try:
+        if args.url:
+            base_url, pid_api = args.url.rstrip("/"), None
+        else:
+            inicio = time.perf_counter()
+            base_url, api = _iniciar_pilha(args, diretorio, processos)
+            pid_api = api.pid
+            inicializacao_s = round(time.perf_counter() - inicio, 1)
+        resultado = asyncio.run(gerar_carga(base_url, args, taxas, pid_api))
+    finally:
+        for processo in reversed(processos):
+            processo.terminate()
+            try:
+                processo.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                # Triagens abandonadas pelo cliente ainda aguardando o Ollama seguram o encerramento do uvicorn
+                processo.kill()
+                processo.wait()
+
+    resultado = {
+        "commit": _commit_atual(),
+        "configuracao": {
+            "url": args.url, "duracao_s": args.duracao, "aquecimento_s": args.aquecimento,
+            "chegadas": args.chegadas, "taxas_rps": taxas, "queixas_distintas": args.queixas_distintas,
+            "semente": args.semente, "cpus": os.cpu_count(),
+            **({} if args.url else {
+                "embeddings": args.embeddings, "modelo": args.modelo, "triagens_base": args.triagens_base,
+                "ollama_latencia_s": args.latencia, "ollama_tokens_por_segundo": args.tokens_por_segundo,
+                "custo_lote_ms": args.custo_lote_ms, "custo_texto_ms": args.custo_texto_ms,
+                "inicializacao_s": inicializacao_s, "diretorio": diretorio
+            })
+        },
+        **resultado
+    }
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            resultado["comparacao"] = comparar(resultado, json.load(f))
+    resultado["ok"] = all(r["taxa_erro"] <= args.max_taxa_erro for r in resultado["rotas"].values())
+    return resultado
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--taxa", nargs="+", metavar="ROTA=RPS",
+                        help="Chegadas por segundo de cada rota (padrão: triagem=2 triagens=10 validar=1 login=1)")
+    parser.add_argument("--duracao", type=float, default=30, help="Duração da medição (s)")
+    parser.add_argument("--aquecimento", type=float, default=5, help="Carga inicial descartada (s)")
+    parser.add_argument("--chegadas", choices=("poisson", "constante"), default="poisson")
+    parser.add_argument("--timeout", type=float, default=60, help="Timeout de cada requisição (s)")
+    parser.add_argument("--queixas-distintas", type=int, default=5000)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--usuario", default="admin")
+    parser.add_argument("--senha", default="admin")
+    parser.add_argument("--max-taxa-erro", type=float, default=0.01)
+    parser.add_argument("--saida", help="Grava o resultado neste arquivo JSON")
+    parser.add_argument("--comparar", help="Resultado JSON de outro commit, para comparação")
+    parser.add_argument("--url", help="Usa uma API já em execução, sem subir o Ollama simulado e a API")
+    # Pilha local
+    parser.add_argument("--latencia", type=float, default=0.5, help="Latência do Ollama simulado (s)")
+    parser.add_argument("--tokens-por-segundo", type=float, default=50, help="Taxa de tokens do Ollama simulado")
+    parser.add_argument("--embeddings", choices=("simulado", "real"), default="simulado")
+    parser.add_argument("--modelo", help="Modelo do EmbeddingService real (EMBEDDING_MODEL)")
+    parser.add_argument("--custo-lote-ms", type=float, default=10.0, help="Custo de cada forward simulado")
+    parser.add_argument("--custo-texto-ms", type=float, default=1.0, help="Custo simulado por texto do lote")
+    parser.add_argument("--triagens-base", type=int, default=2000, help="Triagens sintéticas no banco inicial")
+    parser.add_argument("--timeout-inicio", type=float, default=300, help="Espera máxima pela API pronta (s)")
+    # Uso interno: processo da API
+    parser.add_argument("--servir", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--porta", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--diretorio", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.servir:
+        servir(args)
+        sys.exit(0)
+    resultado = executar(args)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+    if not resultado["ok"]:
+        sys.exit(1)
@@ -0,0 +1,187 @@
+"""
+Paridade, latência e memória dos backends de embeddings (fp32, int8, torchscript).
+
+Cada backend roda em um subprocesso próprio, para que o RSS medido seja só o
+dele. Para cada um são medidos o tempo de carregamento, a latência de um texto
+por vez (p50/p99), a vazão em lote e o RSS após o carregamento e o pico. Os
+embeddings de um corpus fixo de queixas são comparados com os do fp32: a
+similaridade de cosseno mínima deve ser >= 0.99 (a saída termina com código 1
+se algum backend ficar abaixo ou não puder ser carregado).
+
+Com --somente-paridade, as medições de latência e vazão são puladas: só os
+embeddings do corpus fixo são gerados e comparados, o que permite usar o script
+como verificação de regressão.
+
+Uso:
+    python -m benchmarks.bench_embedding_backends --threads 4
+    python -m benchmarks.bench_embedding_backends --modelo ./modelo_local --backends fp32 int8
+    python -m benchmarks.bench_embedding_backends --modelo ./modelo_local --somente-paridade
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.bench_embeddings_lote import gerar_queixas
+
+LIMIAR_PARIDADE = 0.99
+
+# Corpus fixo da verificação de paridade: queixas curtas e longas, com acentos e números
+QUEIXAS_PARIDADE = [
+    "Paciente com febre alta há 3 dias, tosse seca e dificuldade para respirar.",
+    "Dor torácica em aperto, irradiando para o braço esquerdo, com sudorese.",
+    "Criança de 5 anos com vômitos e diarreia desde ontem, boca seca.",
+    "Cefaleia intensa de início súbito, a pior da vida, com rigidez de nuca.",
+    "Renovação de receita de losartana, sem queixas agudas.",
+    "Idoso desorientado, com fraqueza súbita no lado direito e fala arrastada.",
+    "Corte profundo na mão com sangramento que não para com compressão.",
+    "Dor lombar leve há uma semana após carregar peso.",
+    "Gestante de 32 semanas com sangramento vaginal e dor abdominal.",
+    "Falta de ar aos pequenos esforços, edema de membros inferiores, ortopneia.",
+    "Paciente diabético com glicemia de 450 mg/dL, poliúria e sonolência.",
+    "Tontura ao levantar, náuseas, sem perda de consciência.",
+    "Queimadura de segundo grau no antebraço com água fervente.",
+    "Dor de garganta, coriza e febre baixa há dois dias.",
+    "Convulsão há 20 minutos, agora sonolento, sem história de epilepsia.",
+    "Atestado para retorno ao trabalho.",
+    "Dor abdominal em fossa ilíaca direita, febre de 38,5 e anorexia.",
+    "Palpitações com frequência cardíaca de 150 bpm, sem dor torácica.",
+    "Reação alérgica após picada de abelha com inchaço nos lábios e chiado no peito.",
+    "Paciente refere dor em queimação ao urinar e urgência miccional há 2 dias, "
+    "sem febre, sem dor lombar, sem náuseas ou vômitos, nega corrimento, "
+    "última menstruação há duas semanas, sem outras queixas.",
+]
+
+
+def _memoria_mb() -> dict:
+    """RSS atual e pico do processo (VmRSS/VmHWM no Linux, ru_maxrss nos demais)."""
+    try:
+        with open("/proc/self/status") as f:
+            campos = dict(linha.split(":", 1) for linha in f if linha.startswith(("VmRSS", "VmHWM")))
+        return {"rss_mb": round(int(campos["VmRSS"].split()[0]) / 1024, 1),
+                "pico_rss_mb": round(int(campos["VmHWM"].split()[0]) / 1024, 1)}
+    except OSError:
+        import resource
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        pico = pico / 2**20 if sys.platform == "darwin" else pico / 1024
+        return {"rss_mb": None, "pico_rss_mb": round(pico, 1)}
+
+
+def medir_backend(modelo: str, backend: str, threads: int, textos: int, repeticoes: int,
+                  arquivo_embeddings: str, somente_paridade: bool = False) -> dict:
+    """Executado no subprocesso: carrega um backend, mede e grava os embeddings do corpus fixo."""
+    from embedding_service import EmbeddingService
+
+    memoria_inicial = _memoria_mb()["rss_mb"]
+    inicio = time.perf_counter()
+    servico = EmbeddingService(model_name=modelo, cache_dir=tempfile.mkdtemp(), backend=backend,
+                               num_threads=threads or None)
+    carregamento_s = time.perf_counter() - inicio
+    memoria_carregado = _memoria_mb()["rss_mb"]
+
+    np.save(arquivo_embeddings, np.asarray(servico.get_batch_embeddings(QUEIXAS_PARIDADE, use_cache=False),
+                                           dtype=np.float32))
+    if somente_paridade:
+        info = servico.get_info()
+        servico.close()
+        return {"backend": info["backend"], "carregamento_s": round(carregamento_s, 2)}
+
+    # Latência de um texto por vez, como no atendimento de uma triagem isolada
+    latencias = []
+    for i in range(repeticoes):
+        texto = QUEIXAS_PARIDADE[i % len(QUEIXAS_PARIDADE)]
+        inicio = time.perf_counter()
+        servico.get_embedding(texto, use_cache=False)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    latencias.sort()
+
+    queixas = gerar_queixas(textos)
+    inicio = time.perf_counter()
+    servico.get_batch_embeddings(queixas, use_cache=False)
+    vazao = textos / (time.perf_counter() - inicio)
+
+    memoria = _memoria_mb()
+    info = servico.get_info()
+    servico.close()
+    return {
+        "backend": info["backend"],
+        "threads": info["threads"],
+        "seq_buckets": info["seq_buckets"],
+        "carregamento_s": round(carregamento_s, 2),
+        "latencia_ms_p50": round(latencias[len(latencias) // 2], 2),
+        "latencia_ms_p99": round(latencias[int(len(latencias) * 0.99)], 2),
+        "latencia_ms_media": round(statistics.fmean(latencias), 2),
+        "textos_por_segundo_lote": round(vazao, 1),
+        "rss_modelo_mb": round(memoria_carregado - memoria_inicial, 1) if memoria_inicial else None,
+        "rss_final_mb": memoria["rss_mb"],
+        "pico_rss_mb": memoria["pico_rss_mb"]
+    }
+
+
+def similaridade_minima(referencia: np.ndarray, embeddings: np.ndarray) -> float:
+    """Menor similaridade de cosseno entre os embeddings de mesmo índice."""
+    referencia = referencia / np.linalg.norm(referencia, axis=1, keepdims=True)
+    embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return float(np.min(np.sum(referencia * embeddings, axis=1)))
+
+
+def executar(modelo: str, backends: list, threads: int, textos: int, repeticoes: int,
+             somente_paridade: bool = False) -> dict:
+    diretorio = tempfile.mkdtemp()
+    resultados = {}
+    for backend in backends:
+        arquivo = os.path.join(diretorio, f"{backend}.npy")
+        processo = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_embedding_backends", "--modelo", modelo,
+             "--threads", str(threads), "--textos", str(textos), "--repeticoes", str(repeticoes),
+             "--medir-backend", backend, "--arquivo-embeddings", arquivo]
+            + (["--somente-paridade"] if somente_paridade else []),
+            capture_output=True, text=True
+        )
+        if processo.returncode != 0:
+            resultados[backend] = {"erro": processo.stderr.strip().splitlines()[-1:]}
+            continue
+        resultados[backend] = json.loads(processo.stdout.strip().splitlines()[-1])
+
+    referencia = os.path.join(diretorio, "fp32.npy")
+    for backend, resultado in resultados.items():
+        arquivo = os.path.join(diretorio, f"{backend}.npy")
+        if "erro" in resultado or not os.path.exists(referencia) or backend == "fp32":
+            continue
+        minima = similaridade_minima(np.load(referencia), np.load(arquivo))
+        resultado["cosseno_minimo_vs_fp32"] = round(minima, 5)
+        resultado["paridade_ok"] = minima >= LIMIAR_PARIDADE
+    return {"modelo": modelo, "queixas_paridade": len(QUEIXAS_PARIDADE), "backends": resultados}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modelo", default="pucpr/biobertpt-clin")
+    parser.add_argument("--backends", nargs="+", default=["fp32", "int8", "torchscript"])
+    parser.add_argument("--threads", type=int, default=0, help="Threads do PyTorch (0 = padrão)")
+    parser.add_argument("--textos", type=int, default=256, help="Textos da medição de vazão em lote")
+    parser.add_argument("--repeticoes", type=int, default=100, help="Textos da medição de latência individual")
+    parser.add_argument("--somente-paridade", action="store_true",
+                        help="Só compara os embeddings com os do fp32, sem medir latência e vazão")
+    parser.add_argument("--medir-backend", help=argparse.SUPPRESS)
+    parser.add_argument("--arquivo-embeddings", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.medir_backend:
+        print(json.dumps(medir_backend(args.modelo, args.medir_backend, args.threads, args.textos,
+                                       args.repeticoes, args.arquivo_embeddings, args.somente_paridade)))
+        sys.exit(0)
+
+    if "fp32" not in args.backends:
+        args.backends.insert(0, "fp32")  # referência da paridade
+    resultado = executar(args.modelo, args.backends, args.threads, args.textos, args.repeticoes,
+                         args.somente_paridade)
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+    if any(b.get("paridade_ok") is False or "erro" in b for b in resultado["backends"].values()):
+        sys.exit(1)
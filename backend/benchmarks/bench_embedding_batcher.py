@@ -0,0 +1,82 @@
+"""
+Benchmark do agrupamento de pedidos de embedding (EmbeddingBatcher).
+
+Simula clientes concorrentes pedindo embeddings de textos inéditos e compara
+o caminho antigo (get_embedding síncrono, um texto por forward pass) com o
+agrupador em lotes, reportando embeddings/segundo e latências p50/p99.
+
+Uso:
+    python -m benchmarks.bench_embedding_batcher --clientes 32 --pedidos 8 --janela-ms 5
+"""
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+
+from embedding_service import EmbeddingService
+from embedding_batcher import EmbeddingBatcher
+from benchmarks.bench_embeddings_lote import gerar_queixas
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[int(p * (len(ordenados) - 1))]
+
+
+async def rodar_clientes(obter_embedding, textos, clientes: int) -> dict:
+    latencias = []
+    fatias = [textos[i::clientes] for i in range(clientes)]
+
+    async def cliente(fatia):
+        for texto in fatia:
+            inicio = time.perf_counter()
+            await obter_embedding(texto)
+            latencias.append(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*[cliente(f) for f in fatias])
+    duracao = time.perf_counter() - inicio
+    return {
+        "embeddings_por_segundo": round(len(textos) / duracao, 2),
+        "latencia_p50_ms": round(percentil(latencias, 0.50) * 1000, 2),
+        "latencia_p99_ms": round(percentil(latencias, 0.99) * 1000, 2)
+    }
+
+
+async def executar(model_name: str, clientes: int, pedidos: int, janela_ms: float, max_lote: int) -> dict:
+    servico = EmbeddingService(model_name=model_name, cache_dir=tempfile.mkdtemp())
+    servico.get_batch_embeddings(["aquecimento"], use_cache=False)
+    total = clientes * pedidos
+
+    async def direto(texto):
+        return servico.get_embedding(texto, use_cache=False)
+
+    textos = [f"{t} (caso {i})" for i, t in enumerate(gerar_queixas(total, seed=1))]
+    sequencial = await rodar_clientes(direto, textos, clientes)
+
+    agrupador = EmbeddingBatcher(servico, max_batch_size=max_lote, max_wait_ms=janela_ms, use_cache=False)
+    textos = [f"{t} (caso {i})" for i, t in enumerate(gerar_queixas(total, seed=2))]
+    agrupado = await rodar_clientes(agrupador.get_embedding, textos, clientes)
+    metricas = agrupador.get_metrics()
+    await agrupador.stop()
+
+    return {
+        "clientes": clientes,
+        "pedidos": total,
+        "janela_ms": janela_ms,
+        "sequencial": sequencial,
+        "agrupado": agrupado,
+        "tamanho_medio_lote": metricas["tamanho_lote"]["media"]
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modelo", default="pucpr/biobertpt-clin")
+    parser.add_argument("--clientes", type=int, default=32)
+    parser.add_argument("--pedidos", type=int, default=8)
+    parser.add_argument("--janela-ms", type=float, default=5.0)
+    parser.add_argument("--max-lote", type=int, default=16)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(executar(args.modelo, args.clientes, args.pedidos, args.janela_ms, args.max_lote)), indent=2))
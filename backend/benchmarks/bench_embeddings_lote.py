@@ -0,0 +1,65 @@
+"""
+Benchmark de throughput do EmbeddingService.get_batch_embeddings na CPU.
+
+Mede textos/segundo para diferentes tamanhos de lote, sem uso de cache, sobre
+queixas sintéticas de comprimentos variados.
+
+Uso:
+    python -m benchmarks.bench_embeddings_lote --textos 256 --lotes 1 8 32 64
+"""
+import argparse
+import json
+import random
+import tempfile
+import time
+
+import torch
+
+from embedding_service import EmbeddingService
+
+TERMOS = [
+    "febre alta", "tosse seca", "dor torácica", "falta de ar", "cefaleia intensa",
+    "vômitos", "diarreia", "dor abdominal", "tontura", "sangramento", "convulsão",
+    "dor lombar", "náuseas", "mal estar", "desmaio", "palpitações", "confusão mental"
+]
+
+
+def gerar_queixas(n: int, seed: int = 42) -> list:
+    """Gera queixas sintéticas com 2 a 25 termos, para variar o comprimento."""
+    rng = random.Random(seed)
+    queixas = []
+    for i in range(n):
+        termos = rng.choices(TERMOS, k=rng.randint(2, 25))
+        queixas.append(f"Paciente {i} relata " + ", ".join(termos) + ".")
+    return queixas
+
+
+def executar(model_name: str, n_textos: int, lotes: list) -> dict:
+    servico = EmbeddingService(model_name=model_name, cache_dir=tempfile.mkdtemp())
+    queixas = gerar_queixas(n_textos)
+
+    # Aquecimento
+    servico.get_batch_embeddings(queixas[:8], use_cache=False)
+
+    resultados = {}
+    for lote in lotes:
+        inicio = time.perf_counter()
+        servico.get_batch_embeddings(queixas, use_cache=False, batch_size=lote)
+        duracao = time.perf_counter() - inicio
+        resultados[str(lote)] = round(n_textos / duracao, 2)
+
+    return {
+        "modelo": model_name,
+        "textos": n_textos,
+        "threads": torch.get_num_threads(),
+        "textos_por_segundo": resultados
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modelo", default="pucpr/biobertpt-clin")
+    parser.add_argument("--textos", type=int, default=256)
+    parser.add_argument("--lotes", type=int, nargs="+", default=[1, 8, 32, 64])
+    args = parser.parse_args()
+    print(json.dumps(executar(args.modelo, args.textos, args.lotes), indent=2))
@@ -0,0 +1,246 @@
+"""
+Memória e vazão da exportação em streaming de /api/triagens/exportar.
+
+Cria um banco temporário com N triagens sintéticas, sobe a API com uvicorn em
+uma thread (sem o lifespan: a exportação só depende do banco) e baixa a
+exportação inteira (CSV e NDJSON) com httpx em streaming, amostrando o RSS do
+processo a cada parte recebida. O TestClient do Starlette não serve aqui: ele
+acumula o corpo inteiro da resposta antes de devolvê-la. A
+exportação deve caber em um limite fixo de memória, independente de N.
+
+O conteúdo também é conferido com o banco, em memória constante: as linhas de
+cada exportação devem vir estritamente em ordem (data_hora, id) decrescente, o
+que detecta linhas repetidas ou puladas entre blocos, e o resumo SHA-256 dos
+campos principais, na ordem exportada, deve ser igual ao da mesma consulta
+feita direto no banco. A saída termina com código 1 se o crescimento do RSS
+passar de --limite-rss-mb ou se alguma exportação divergir do banco.
+
+Com --comparar-legado, mede também o pico de GET /api/triagens (lista completa
+em um único JSON) para o mesmo banco.
+
+Uso:
+    python -m benchmarks.bench_exportacao --triagens 1000000 --limite-rss-mb 64
+    python -m benchmarks.bench_exportacao --triagens 20000  # verificação de regressão
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import random
+import sys
+import socket
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import httpx
+import uvicorn
+
+from benchmarks.bench_embedding_backends import _memoria_mb
+
+CORES = ["VERMELHO", "LARANJA", "AMARELO", "VERDE", "AZUL"]
+# As triagens sintéticas começam em INICIO_DADOS, uma a cada INTERVALO_DADOS
+INICIO_DADOS = datetime(2020, 1, 1)
+INTERVALO_DADOS = timedelta(minutes=3)
+# Campos comparados com o banco (o texto da resposta tem quebras de linha, e os sintomas, aspas)
+CAMPOS_CONFERIDOS = ("id", "sintomas", "resposta", "data_hora", "classificacao")
+RESPOSTA = ("CLASSIFICAÇÃO: {cor}\n\nANÁLISE CLÍNICA:\nFebre alta e tosse há 3 dias\nSaturação preservada\n\n"
+            "CONDUTAS RECOMENDADAS:\nAntitérmico\nHidratação\nReavaliação em 60 minutos")
+
+
+def popular_banco(n: int, seed: int = 3):
+    """Insere as triagens em transações de 50 mil linhas, sem manter as linhas em memória."""
+    from repositorio import transacao
+    from estatisticas import reconstruir_estatisticas
+
+    rng = random.Random(seed)
+    lote = 50_000
+    for base in range(0, n, lote):
+        def linhas():
+            for i in range(base, min(base + lote, n)):
+                cor = rng.choice(CORES)
+                validado = rng.random() < 0.6
+                data_hora = (INICIO_DADOS + INTERVALO_DADOS * i).strftime("%Y-%m-%d %H:%M:%S")
+                yield (f"{i:08d}-{rng.getrandbits(32):08x}", f"Paciente {i} com febre, tosse e dor, \"aspas\"",
+                       RESPOSTA.format(cor=cor), data_hora, int(validado), "dr_bench" if validado else None,
+                       data_hora if validado else None, cor, "Febre alta e tosse", "Antitérmico")
+        with transacao() as conn:
+            conn.executemany(
+                "INSERT INTO validacao_triagem (id, sintomas, resposta, data_hora, validado, validado_por, "
+                "data_validacao, classificacao, justificativa, condutas) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                linhas()
+            )
+    with transacao() as conn:
+        reconstruir_estatisticas(conn)
+
+
+def _linhas_com_quebra(partes):
+    """Reagrupa as partes recebidas em linhas (mantendo o \\n), para o csv.reader."""
+    resto = ""
+    for parte in partes:
+        resto += parte
+        *linhas, resto = resto.split("\n")
+        for linha in linhas:
+            yield linha + "\n"
+    if resto:
+        yield resto
+
+
+class Conferencia:
+    """Contagem, ordem e resumo SHA-256 de uma sequência de triagens, sem guardá-las."""
+
+    def __init__(self):
+        self.linhas = 0
+        self.fora_de_ordem = 0
+        self._resumo = hashlib.sha256()
+        self._anterior = None
+
+    def adicionar(self, triagem: dict):
+        valores = ["" if triagem[campo] is None else str(triagem[campo]) for campo in CAMPOS_CONFERIDOS]
+        chave = (triagem["data_hora"], triagem["id"])
+        if self._anterior is not None and chave >= self._anterior:
+            self.fora_de_ordem += 1
+        self._anterior = chave
+        self._resumo.update("\x1f".join(valores).encode("utf-8") + b"\x1e")
+        self.linhas += 1
+
+    @property
+    def resumo(self) -> str:
+        return self._resumo.hexdigest()
+
+
+def conferir_banco(parametros: dict) -> Conferencia:
+    """A mesma consulta da exportação, feita direto no banco e percorrida pelo cursor."""
+    from main import _montar_filtros_triagens
+    from repositorio import conexao
+
+    condicoes, params = _montar_filtros_triagens(**parametros)
+    where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+    conferencia = Conferencia()
+    with conexao() as conn:
+        cursor = conn.execute(f"SELECT {', '.join(CAMPOS_CONFERIDOS)} FROM validacao_triagem {where} "
+                              f"ORDER BY data_hora DESC, id DESC", params)
+        for linha in cursor:
+            conferencia.adicionar(dict(zip(CAMPOS_CONFERIDOS, linha)))
+    return conferencia
+
+
+def exportar(base_url: str, formato: str, parametros: dict) -> dict:
+    rss_inicial = _memoria_mb()["rss_mb"]
+    rss_maximo = rss_inicial
+    conferencia = Conferencia()
+
+    def partes(resposta):
+        nonlocal rss_maximo
+        for parte in resposta.iter_text():
+            rss_maximo = max(rss_maximo, _memoria_mb()["rss_mb"])
+            yield parte
+
+    inicio = time.perf_counter()
+    with httpx.stream("GET", f"{base_url}/api/triagens/exportar", params={"formato": formato, **parametros},
+                      timeout=None) as resposta:
+        resposta.raise_for_status()
+        if formato == "csv":
+            # Os campos de texto (a resposta do modelo) têm quebras de linha entre aspas
+            triagens = csv.DictReader(_linhas_com_quebra(partes(resposta)))
+        else:
+            triagens = (json.loads(linha) for linha in _linhas_com_quebra(partes(resposta)) if linha.strip())
+        for triagem in triagens:
+            conferencia.adicionar(triagem)
+        bytes_recebidos = resposta.num_bytes_downloaded
+    duracao = time.perf_counter() - inicio
+
+    esperado = conferir_banco(parametros)
+    return {
+        "linhas": conferencia.linhas,
+        "linhas_no_banco": esperado.linhas,
+        "fora_de_ordem": conferencia.fora_de_ordem,
+        "conteudo_confere": conferencia.resumo == esperado.resumo,
+        "mb": round(bytes_recebidos / 2**20, 1),
+        "duracao_s": round(duracao, 2),
+        "linhas_por_segundo": round(conferencia.linhas / duracao),
+        "rss_inicial_mb": rss_inicial,
+        "crescimento_rss_mb": round(rss_maximo - rss_inicial, 1)
+    }
+
+
+def iniciar_servidor(app) -> tuple:
+    """Sobe a API em uma thread, numa porta livre, e espera ela aceitar conexões."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        porta = s.getsockname()[1]
+    servidor = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=porta, lifespan="off",
+                                             log_level="warning"))
+    threading.Thread(target=servidor.run, daemon=True).start()
+    while not servidor.started:
+        time.sleep(0.05)
+    return servidor, f"http://127.0.0.1:{porta}"
+
+
+def executar(n_triagens: int, limite_rss_mb: float, comparar_legado: bool) -> dict:
+    diretorio = tempfile.mkdtemp()
+    os.environ["TRIAGEM_DB_PATH"] = os.path.join(diretorio, "exportacao.db")
+    os.environ.setdefault("OLLAMA_URL", "http://127.0.0.1:1")
+
+    from migracoes import aplicar_migracoes
+    aplicar_migracoes()
+    inicio = time.perf_counter()
+    popular_banco(n_triagens)
+    populacao_s = time.perf_counter() - inicio
+
+    import main
+
+    servidor, base_url = iniciar_servidor(main.app)
+    resultados = {"triagens": n_triagens, "populacao_s": round(populacao_s, 1),
+                  "limite_rss_mb": limite_rss_mb, "exportacoes": {}}
+    # Filtro por datas no terço central do período gerado, para ter linhas com qualquer N
+    terco = INTERVALO_DADOS * (n_triagens // 3)
+    casos = {
+        "csv_todas": ("csv", {}),
+        "ndjson_todas": ("ndjson", {}),
+        "csv_validadas_vermelho_periodo": ("csv", {
+            "filtro": "validadas", "classificacao": "VERMELHO",
+            "data_inicio": (INICIO_DADOS + terco).strftime("%Y-%m-%d"),
+            "data_fim": (INICIO_DADOS + 2 * terco).strftime("%Y-%m-%d")
+        }),
+    }
+    for nome, (formato, parametros) in casos.items():
+        resultados["exportacoes"][nome] = exportar(base_url, formato, parametros)
+
+    if comparar_legado:
+        rss_inicial = _memoria_mb()["rss_mb"]
+        inicio = time.perf_counter()
+        quantidade = len(httpx.get(f"{base_url}/api/triagens", params={"filtro": "todas"},
+                                   timeout=None).json()["triagens"])
+        resultados["legado_lista_completa"] = {
+            "linhas": quantidade,
+            "duracao_s": round(time.perf_counter() - inicio, 2),
+            "pico_rss_mb": _memoria_mb()["pico_rss_mb"],
+            "rss_inicial_mb": rss_inicial
+        }
+
+    servidor.should_exit = True
+    todas = resultados["exportacoes"]
+    resultados["ok"] = (
+        todas["csv_todas"]["linhas"] == n_triagens
+        and todas["ndjson_todas"]["linhas"] == n_triagens
+        and all(e["linhas"] == e["linhas_no_banco"] > 0 and e["conteudo_confere"] and not e["fora_de_ordem"]
+                and e["crescimento_rss_mb"] <= limite_rss_mb for e in todas.values())
+    )
+    return resultados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--triagens", type=int, default=1_000_000)
+    parser.add_argument("--limite-rss-mb", type=float, default=64.0,
+                        help="Crescimento máximo do RSS durante uma exportação")
+    parser.add_argument("--comparar-legado", action="store_true",
+                        help="Mede também GET /api/triagens sem paginação (usa muita memória)")
+    args = parser.parse_args()
+    resultado = executar(args.triagens, args.limite_rss_mb, args.comparar_legado)
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+    if not resultado["ok"]:
+        sys.exit(1)
@@ -0,0 +1,98 @@
+"""
+Benchmark da busca de vizinhos mais próximos: IndiceVetorial contra o laço da
+versão anterior de EmbeddingService.find_similar_texts.
+
+O laço anterior obtinha o embedding de cada texto do corpus (uma lista de floats
+vinda do cache), convertia para NumPy e calculava as duas normas a cada item,
+ordenando a lista inteira no final. Aqui o cache é simulado por uma matriz
+float32 (`tolist()` por texto, como EmbeddingCache.get), sem carregar o modelo.
+
+Para cada tamanho de corpus mede o tempo de construção do índice, a latência por
+consulta dos dois métodos, a vazão da busca em lote e confere que os top-k são
+os mesmos.
+
+Uso:
+    python -m benchmarks.bench_indice_vetorial --tamanhos 1000 10000 100000
+"""
+import argparse
+import json
+import statistics
+import time
+
+import numpy as np
+
+from indice_vetorial import IndiceVetorial
+
+
+def buscar_legado(consulta, obter_embedding, n: int, top_k: int) -> list:
+    """Reprodução do laço anterior de find_similar_texts."""
+    similaridades = []
+    for i in range(n):
+        texto_embedding = obter_embedding(i)
+        consulta_np = np.array(consulta)
+        texto_np = np.array(texto_embedding)
+        similaridade = np.dot(consulta_np, texto_np) / (np.linalg.norm(consulta_np) * np.linalg.norm(texto_np))
+        similaridades.append({"index": i, "similarity": float(similaridade)})
+    similaridades.sort(key=lambda x: x["similarity"], reverse=True)
+    return similaridades[:top_k]
+
+
+def medir_ms(funcao, repeticoes: int) -> list:
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return tempos
+
+
+def executar(tamanhos: list, dimensao: int, top_k: int, consultas: int, consultas_legado: int,
+             lote: int) -> dict:
+    rng = np.random.default_rng(42)
+    resultados = {"dimensao": dimensao, "top_k": top_k, "corpus": {}}
+    for n in tamanhos:
+        corpus = rng.standard_normal((n, dimensao), dtype=np.float32)
+        perguntas = rng.standard_normal((max(consultas, lote), dimensao), dtype=np.float32)
+
+        inicio = time.perf_counter()
+        indice = IndiceVetorial(capacidade_inicial=n)
+        indice.adicionar(list(range(n)), corpus)
+        construcao_ms = (time.perf_counter() - inicio) * 1000
+
+        consulta = perguntas[0].tolist()
+        legado = buscar_legado(consulta, lambda i: corpus[i].tolist(), n, top_k)
+        iguais = [item["index"] for item in legado] == [chave for chave, _ in indice.buscar(consulta, top_k)]
+
+        tempos_legado = medir_ms(lambda: buscar_legado(consulta, lambda i: corpus[i].tolist(), n, top_k),
+                                 consultas_legado)
+        proxima = iter(perguntas)
+        tempos_indice = medir_ms(lambda: indice.buscar(next(proxima), top_k), consultas)
+        tempos_lote = medir_ms(lambda: indice.buscar_lote(perguntas[:lote], top_k), 3)
+
+        media_legado = statistics.fmean(tempos_legado)
+        media_indice = statistics.fmean(tempos_indice)
+        resultados["corpus"][str(n)] = {
+            "construcao_indice_ms": round(construcao_ms, 2),
+            "memoria_indice_mb": round(indice.matriz.nbytes / 2**20, 1),
+            "legado_ms_por_consulta": round(media_legado, 3),
+            "indice_ms_por_consulta": round(media_indice, 3),
+            "indice_p99_ms": round(sorted(tempos_indice)[int(len(tempos_indice) * 0.99)], 3),
+            "lote_consultas_por_segundo": round(lote / (min(tempos_lote) / 1000)),
+            "aceleracao": round(media_legado / media_indice, 1),
+            "mesmos_top_k": iguais
+        }
+    return resultados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--dimensao", type=int, default=768)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--consultas", type=int, default=200)
+    parser.add_argument("--consultas-legado", type=int, default=3,
+                        help="Consultas medidas com o laço anterior (lento em corpus grandes)")
+    parser.add_argument("--lote", type=int, default=64, help="Consultas por chamada de buscar_lote")
+    args = parser.parse_args()
+    print(json.dumps(executar(args.tamanhos, args.dimensao, args.top_k, args.consultas,
+                              args.consultas_legado, args.lote), indent=2))
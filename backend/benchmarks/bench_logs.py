@@ -0,0 +1,163 @@
+"""
+Custo do logging por requisição de triagem, antes e depois do QueueHandler.
+
+Reproduz os registros de uma requisição de /api/triagem (as mensagens dos loggers
+triagem_api, ollama_service, motor_regras etc.) e mede o tempo gasto na thread
+que registra, em duas configurações:
+
+    antes   a configuração anterior: handlers de arquivo e de console chamados na
+            própria thread (no loop de eventos), com o arquivo extra do
+            ollama_service gravando suas linhas duas vezes
+    depois  configuracao_logs.configurar_logs(): só um QueueHandler na thread que
+            registra; JSON, rotação e console na thread do QueueListener
+
+As requisições são espaçadas por --intervalo-ms (a thread de gravação trabalha
+entre elas, como no atendimento real); com 0 o teste vira uma rajada, útil para
+ver o descarte com a fila cheia. O console é redirecionado para um arquivo
+temporário nas duas configurações. Ao final confere que o arquivo JSONL tem uma
+linha por registro (menos os descartados), e mede também o custo de um
+logger.debug desativado com f-string e com formatação preguiçosa (%s).
+
+Uso:
+    python -m benchmarks.bench_logs --requisicoes 2000 --intervalo-ms 2
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+SINTOMAS = "Paciente com febre alta há 3 dias, tosse seca e dificuldade para respirar, saturação 93%"
+
+# (logger, mensagem) emitidos em uma triagem atendida pelo modelo
+REGISTROS_TRIAGEM = [
+    ("triagem_api", lambda: f"Iniciando triagem: {SINTOMAS[:50]}..."),
+    ("triagem_api", lambda: "Pré-triagem por regras: AMARELO (48us)"),
+    ("triagem_api", lambda: "Embedding gerado com sucesso"),
+    ("triagem_api", lambda: "Casos similares encontrados: 3"),
+    ("ollama_service", lambda: "Prompt montado: ~612 tokens, 3 casos semelhantes"),
+    ("ollama_service", lambda: "Enviando prompt para Ollama (tentativa 1/3)"),
+    ("httpx", lambda: 'HTTP Request: POST http://localhost:11434/api/generate "HTTP/1.1 200 OK"'),
+    ("ollama_service", lambda: "Resposta gerada com sucesso: 437 caracteres"),
+    ("triagem_api", lambda: "Resposta gerada: 437 caracteres"),
+    ("ollama_service", lambda: "Resposta processada: classificação=AMARELO, justificativa=186 caracteres, "
+                               "condutas=188 caracteres"),
+    ("triagem_api", lambda: "Resposta processada: classificação=AMARELO"),
+    ("triagem_api", lambda: "Triagem salva para validação: id=570f90bb-72b3-4c63-adcc-9d4c032a0a58"),
+    ("rastreamento", lambda: 'Rastro POST /api/triagem 200 308.6ms: {"id": "abc", "etapas": {"embedding": 16.7}}'),
+]
+
+
+def configurar_antes(diretorio: str):
+    formato = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    raiz = logging.getLogger()
+    arquivo = logging.FileHandler(os.path.join(diretorio, "triagem_api.log"))
+    arquivo.setFormatter(formato)
+    raiz.addHandler(arquivo)
+    console = logging.StreamHandler()
+    console.setFormatter(formato)
+    raiz.addHandler(console)
+    raiz.setLevel(logging.INFO)
+    extra = logging.FileHandler(os.path.join(diretorio, "ollama_service.log"))
+    extra.setFormatter(formato)
+    logging.getLogger("ollama_service").addHandler(extra)
+
+    def desfazer():
+        for handler in list(raiz.handlers):
+            raiz.removeHandler(handler)
+            handler.close()
+        logging.getLogger("ollama_service").removeHandler(extra)
+        extra.close()
+    return desfazer
+
+
+def medir_requisicoes(requisicoes: int, intervalo_s: float = 0.0) -> list:
+    loggers = [(logging.getLogger(nome), mensagem) for nome, mensagem in REGISTROS_TRIAGEM]
+    tempos = []
+    for _ in range(requisicoes):
+        inicio = time.perf_counter()
+        for logger, mensagem in loggers:
+            logger.info(mensagem())
+        tempos.append((time.perf_counter() - inicio) * 1e6)
+        if intervalo_s:
+            time.sleep(intervalo_s)
+    return tempos
+
+
+def resumo(tempos: list) -> dict:
+    ordenados = sorted(tempos)
+    return {
+        "us_por_requisicao_media": round(statistics.fmean(ordenados), 1),
+        "us_por_requisicao_p50": round(ordenados[len(ordenados) // 2], 1),
+        "us_por_requisicao_p99": round(ordenados[int(len(ordenados) * 0.99)], 1),
+        "us_por_requisicao_max": round(ordenados[-1], 1),
+    }
+
+
+def medir_debug_desativado(repeticoes: int) -> dict:
+    logger = logging.getLogger("embedding_service")
+    texto = SINTOMAS * 4
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        logger.debug(f"Gerando novo embedding para: {texto[:30]}...")
+    fstring = (time.perf_counter() - inicio) / repeticoes * 1e9
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        logger.debug("Gerando novo embedding para: %.30s...", texto)
+    preguicoso = (time.perf_counter() - inicio) / repeticoes * 1e9
+    return {"fstring_ns": round(fstring, 1), "preguicoso_ns": round(preguicoso, 1)}
+
+
+def executar(requisicoes: int, intervalo_ms: float) -> dict:
+    diretorio = tempfile.mkdtemp()
+    stderr_original = sys.stderr
+    sys.stderr = open(os.path.join(diretorio, "console.txt"), "w")
+    try:
+        desfazer = configurar_antes(diretorio)
+        medir_requisicoes(50)
+        antes = resumo(medir_requisicoes(requisicoes, intervalo_ms / 1000))
+        desfazer()
+
+        from configuracao_logs import configurar_logs, encerrar_logs, registros_descartados
+        arquivo = os.path.join(diretorio, "depois.log")
+        configurar_logs(nivel="INFO", arquivo=arquivo, console=True)
+        medir_requisicoes(50)
+        depois = resumo(medir_requisicoes(requisicoes, intervalo_ms / 1000))
+        debug = medir_debug_desativado(200_000)
+        inicio = time.perf_counter()
+        encerrar_logs()
+        esvaziamento_ms = (time.perf_counter() - inicio) * 1000
+    finally:
+        sys.stderr.close()
+        sys.stderr = stderr_original
+
+    esperado = (requisicoes + 50) * len(REGISTROS_TRIAGEM)
+    with open(arquivo, encoding="utf-8") as f:
+        gravados = sum(1 for linha in f if json.loads(linha)["mensagem"])
+    return {
+        "requisicoes": requisicoes,
+        "intervalo_ms": intervalo_ms,
+        "registros_por_requisicao": len(REGISTROS_TRIAGEM),
+        "antes": antes,
+        "depois": depois,
+        "reducao": round(antes["us_por_requisicao_media"] / depois["us_por_requisicao_media"], 1),
+        "esvaziamento_fila_ms": round(esvaziamento_ms, 1),
+        "debug_desativado": debug,
+        "registros_gravados": gravados,
+        "registros_descartados": registros_descartados(),
+        "ok": gravados + registros_descartados() == esperado
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requisicoes", type=int, default=2000)
+    parser.add_argument("--intervalo-ms", type=float, default=2.0, help="Pausa entre requisições (0 = rajada)")
+    args = parser.parse_args()
+    resultado = executar(args.requisicoes, args.intervalo_ms)
+    print(json.dumps(resultado, indent=2))
+    if not resultado["ok"]:
+        sys.exit(1)
@@ -0,0 +1,106 @@
+"""
+Custo do registro de métricas no caminho quente (metricas.py).
+
+Mede o tempo por observação de Histograma.observar, do context manager medir e
+de Contador.inc, com uma thread e com várias threads observando ao mesmo tempo
+(como o pool de threads do SQLite), comparando com um histograma protegido por
+um lock único. Ao final confere que a contagem exportada bate com o total de
+observações de todas as threads (a saída termina com código 1 se não bater).
+
+Uso:
+    python -m benchmarks.bench_metricas --observacoes 200000 --threads 1 8
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from bisect import bisect_left
+
+from metricas import Contador, Histograma, LIMITES_LATENCIA
+
+
+class HistogramaComLock:
+    """Referência: um único conjunto de contagens protegido por lock."""
+
+    def __init__(self, limites=LIMITES_LATENCIA):
+        self.limites = limites
+        self.contagens = {}
+        self.lock = threading.Lock()
+
+    def observar(self, valor, *rotulos):
+        with self.lock:
+            contagens = self.contagens.get(rotulos)
+            if contagens is None:
+                contagens = self.contagens[rotulos] = [0] * (len(self.limites) + 1) + [0.0]
+            contagens[bisect_left(self.limites, valor)] += 1
+            contagens[-1] += valor
+
+
+def medir_ns(funcao, observacoes: int, threads: int) -> float:
+    """Tempo de parede por observação (ns), com `threads` threads dividindo as observações."""
+    por_thread = observacoes // threads
+    barreira = threading.Barrier(threads + 1)
+
+    def trabalhar():
+        barreira.wait()
+        for i in range(por_thread):
+            funcao(i)
+
+    trabalhadores = [threading.Thread(target=trabalhar) for _ in range(threads)]
+    for t in trabalhadores:
+        t.start()
+    barreira.wait()
+    inicio = time.perf_counter()
+    for t in trabalhadores:
+        t.join()
+    return (time.perf_counter() - inicio) / (por_thread * threads) * 1e9
+
+
+def executar(observacoes: int, lista_threads: list) -> dict:
+    resultados = {"observacoes": observacoes, "threads": {}}
+    ok = True
+    for threads in lista_threads:
+        histograma = Histograma("bench_segundos", "bench", rotulos=("etapa",))
+        com_lock = HistogramaComLock()
+        contador = Contador("bench_total", "bench", rotulos=("resultado",))
+        cronometrado = Histograma("bench_medir_segundos", "bench", rotulos=("etapa",))
+
+        def usar_medir(i):
+            with cronometrado.medir("embedding"):
+                pass
+
+        resultado = {
+            "vazio_ns": medir_ns(lambda i: None, observacoes, threads),
+            "histograma_ns": medir_ns(lambda i: histograma.observar(i * 1e-6, "embedding"), observacoes, threads),
+            "histograma_com_lock_ns": medir_ns(lambda i: com_lock.observar(i * 1e-6, "embedding"),
+                                               observacoes, threads),
+            "medir_ns": medir_ns(usar_medir, observacoes, threads),
+            "contador_ns": medir_ns(lambda i: contador.inc("ok"), observacoes, threads),
+        }
+        resultado = {chave: round(valor, 1) for chave, valor in resultado.items()}
+
+        esperado = (observacoes // threads) * threads
+        contagem = histograma.valores()[("embedding",)]
+        resultado["contagem_consistente"] = (sum(contagem[:-1]) == esperado
+                                             and contador.valores()[("ok",)] == esperado)
+        ok = ok and resultado["contagem_consistente"]
+
+        inicio = time.perf_counter()
+        texto = "\n".join(histograma.exportar() + contador.exportar())
+        resultado["exportacao_ms"] = round((time.perf_counter() - inicio) * 1000, 3)
+        resultado["linhas_exportadas"] = texto.count("\n") + 1
+        resultados["threads"][str(threads)] = resultado
+    resultados["ok"] = ok
+    return resultados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--observacoes", type=int, default=200_000)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8])
+    args = parser.parse_args()
+    resultado = executar(args.observacoes, args.threads)
+    print(json.dumps(resultado, indent=2))
+    if not resultado["ok"]:
+        sys.exit(1)
@@ -0,0 +1,151 @@
+"""
+Benchmark da pré-triagem por regras (motor_regras) sobre queixas sintéticas.
+
+Compara o autômato de Aho-Corasick com a busca encadeada de substrings da
+versão anterior de mock_response, medindo latência por queixa (média, p50, p99)
+e queixas/segundo, e mostra a distribuição das cores atribuídas.
+
+Também confere a cor de um conjunto de sondas (frases reais com termos
+ambíguos e negações) e termina com código 1 se alguma divergir do esperado.
+
+Uso:
+    python -m benchmarks.bench_motor_regras --queixas 100000
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from collections import Counter
+
+from motor_regras import MotorRegras, TABELA_PADRAO
+
+TERMOS = [
+    "parada cardíaca", "não responde a estímulos", "sangramento intenso", "dor torácica", "dor no peito",
+    "dispneia grave", "confusão mental", "convulsão", "febre alta", "vômitos", "desidratação",
+    "dor moderada", "dor abdominal", "falta de ar", "desmaio", "dor leve", "tosse seca",
+    "resfriado", "mal-estar", "tontura", "náuseas", "atestado", "renovação de receita",
+    "dor lombar", "cefaleia intensa", "palpitações", "coriza", "diarreia"
+]
+NEGACOES = ["nega", "sem", "não apresenta", "ausência de"]
+CONTEXTO = [
+    "há 2 dias", "desde ontem", "piora à noite", "após esforço", "Refere", "Relata",
+    "paciente idoso", "criança de 5 anos", "gestante", "hipertenso", "diabético"
+]
+
+# Frases com a cor esperada: falsos positivos de termos ambíguos e escopo de negação
+SONDAS = [
+    ("menstruação parada há 2 meses", "AMARELO"),
+    ("paciente está parada no corredor", "AMARELO"),
+    ("não responde bem ao analgésico", "AMARELO"),
+    ("choque elétrico leve no dedo", "AMARELO"),
+    ("PCR elevado no exame de sangue, paciente estável", "AMARELO"),
+    ("paciente em PCR", "VERMELHO"),
+    ("parada cardíaca presenciada", "VERMELHO"),
+    ("não responde a estímulos", "VERMELHO"),
+    ("não tem convulsão mas está confuso", "LARANJA"),
+    ("paciente não apresenta dor no peito", "AMARELO"),
+    ("nega febre, refere dor no peito", "LARANJA"),
+    ("sem febre e dor no peito forte", "LARANJA"),
+    ("nega dor no peito, tosse", "AMARELO"),
+    ("pele fria e pegajosa", "VERMELHO"),
+]
+
+# Listas da versão anterior de mock_response.get_mock_response
+LEGADO = [
+    ("VERMELHO", ["parada", "inconsciente", "choque", "não responde", "sangramento intenso"]),
+    ("LARANJA", ["dor torácica", "dispneia grave", "confusão", "convulsão"]),
+    ("AMARELO", ["febre alta", "vômitos", "desidratação", "dor moderada"]),
+    ("VERDE", ["dor leve", "tosse", "resfriado", "mal estar"]),
+    ("AZUL", ["renovação", "atestado", "crônico", "consulta de rotina"]),
+]
+
+
+def classificar_legado(sintomas: str) -> str:
+    sintomas_lower = sintomas.lower()
+    for cor, termos in LEGADO:
+        if any(termo in sintomas_lower for termo in termos):
+            return cor
+    return "AMARELO"
+
+
+def gerar_queixas(n: int, seed: int = 7) -> list:
+    """Queixas com 1 a 6 termos, negações ocasionais, contexto e variação de caixa e acentos."""
+    rng = random.Random(seed)
+    queixas = []
+    for _ in range(n):
+        partes = [rng.choice(CONTEXTO)]
+        for termo in rng.sample(TERMOS, rng.randint(1, 6)):
+            if rng.random() < 0.2:
+                termo = f"{rng.choice(NEGACOES)} {termo}"
+            if rng.random() < 0.1:
+                termo = termo.upper()
+            partes.append(termo)
+        queixas.append(", ".join(partes) + rng.choice([".", "", "!", ". Sem outras queixas."]))
+    return queixas
+
+
+def medir(classificar, queixas: list) -> dict:
+    latencias = []
+    inicio_total = time.perf_counter()
+    for queixa in queixas:
+        inicio = time.perf_counter()
+        classificar(queixa)
+        latencias.append((time.perf_counter() - inicio) * 1e6)
+    duracao = time.perf_counter() - inicio_total
+    latencias.sort()
+    return {
+        "queixas_por_segundo": round(len(queixas) / duracao),
+        "media_us": round(statistics.fmean(latencias), 2),
+        "p50_us": round(latencias[len(latencias) // 2], 2),
+        "p99_us": round(latencias[int(len(latencias) * 0.99)], 2),
+        "max_us": round(latencias[-1], 2)
+    }
+
+
+def conferir_sondas(motor: MotorRegras) -> list:
+    """Sondas cuja cor difere da esperada."""
+    divergentes = []
+    for queixa, esperada in SONDAS:
+        cor = motor.classificar(queixa).cor
+        if cor != esperada:
+            divergentes.append({"queixa": queixa, "esperada": esperada, "obtida": cor})
+    return divergentes
+
+
+def executar(n_queixas: int) -> dict:
+    inicio = time.perf_counter()
+    motor = MotorRegras.de_arquivo(TABELA_PADRAO)
+    compilacao_ms = (time.perf_counter() - inicio) * 1000
+
+    queixas = gerar_queixas(n_queixas)
+    for queixa in queixas[:1000]:  # aquecimento
+        motor.classificar(queixa)
+
+    resultados = {
+        "queixas": n_queixas,
+        "compilacao_ms": round(compilacao_ms, 2),
+        "estados_automato": len(motor._transicoes),
+        "motor_regras": medir(motor.classificar, queixas),
+        "legado_substrings": medir(classificar_legado, queixas),
+    }
+    cores = Counter(motor.classificar(q).cor for q in queixas)
+    negadas = sum(1 for q in queixas if motor.classificar(q).negados)
+    divergencias = sum(1 for q in queixas if motor.classificar(q).cor != classificar_legado(q))
+    resultados["distribuicao_cores"] = dict(cores.most_common())
+    resultados["queixas_com_negacao_reconhecida"] = negadas
+    resultados["divergencias_com_legado"] = divergencias
+    resultados["sondas"] = len(SONDAS)
+    resultados["sondas_divergentes"] = conferir_sondas(motor)
+    return resultados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queixas", type=int, default=100_000)
+    args = parser.parse_args()
+    resultados = executar(args.queixas)
+    print(json.dumps(resultados, indent=2, ensure_ascii=False))
+    if resultados["sondas_divergentes"]:
+        sys.exit(1)
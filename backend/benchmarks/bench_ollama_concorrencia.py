@@ -0,0 +1,51 @@
+"""
+Benchmark de concorrência do OllamaService contra um Ollama simulado.
+
+Dispara N gerações simultâneas e compara o tempo total com a latência de uma
+única chamada: com transporte assíncrono o total deve ficar próximo de
+max(latência), e não da soma das latências.
+
+Uso:
+    python -m benchmarks.bench_ollama_concorrencia --requisicoes 20 --latencia 0.5
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from ollama_service import OllamaService
+from benchmarks.fake_ollama import iniciar_fake_ollama
+
+
+async def executar(n: int, latencia: float) -> dict:
+    servidor = iniciar_fake_ollama(latencia=latencia)
+    servico = OllamaService(url=servidor.url, max_retries=1, max_connections=n)
+    try:
+        # Aquecer o pool de conexões
+        await servico.generate_response(servico.format_prompt("aquecimento"))
+
+        inicio = time.perf_counter()
+        respostas = await asyncio.gather(*[
+            servico.generate_response(servico.format_prompt(f"paciente {i} com febre e tosse")) for i in range(n)
+        ])
+        total = time.perf_counter() - inicio
+    finally:
+        await servico.aclose()
+        servidor.shutdown()
+
+    return {
+        "requisicoes": n,
+        "latencia_por_chamada_s": latencia,
+        "tempo_total_s": round(total, 3),
+        "soma_latencias_s": round(n * latencia, 3),
+        "razao_total_sobre_max": round(total / latencia, 2),
+        "respostas_validas": sum(1 for r in respostas if "CLASSIFICAÇÃO:" in r)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requisicoes", type=int, default=20)
+    parser.add_argument("--latencia", type=float, default=0.5)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(executar(args.requisicoes, args.latencia)), indent=2))
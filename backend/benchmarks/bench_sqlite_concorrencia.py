@@ -0,0 +1,130 @@
+"""
+Benchmark de concorrência do acesso ao SQLite.
+
+Compara o padrão antigo (uma conexão nova por chamada, journal padrão e
+timeout padrão do módulo sqlite3) com o pool do repositório (WAL, synchronous=NORMAL,
+busy timeout e conexões reaproveitadas), com escritores e leitores simultâneos.
+Reporta inserções/segundo, latência de leitura p50/p99 e erros "database is locked".
+
+Uso:
+    python -m benchmarks.bench_sqlite_concorrencia --escritores 8 --insercoes 200 --leitores 4
+"""
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+from repositorio import ConnectionPool
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS validacao_triagem (
+    id TEXT PRIMARY KEY, sintomas TEXT NOT NULL, resposta TEXT NOT NULL, data_hora TEXT NOT NULL,
+    validado INTEGER DEFAULT 0, feedback TEXT, validado_por TEXT, data_validacao TEXT,
+    classificacao TEXT, justificativa TEXT, condutas TEXT
+)
+"""
+INSERT = ("INSERT INTO validacao_triagem (id, sintomas, resposta, data_hora, classificacao) "
+          "VALUES (?, ?, ?, ?, ?)")
+SELECT = "SELECT id, sintomas, classificacao FROM validacao_triagem WHERE validado = 0 ORDER BY data_hora DESC LIMIT 50"
+
+
+class AcessoAntigo:
+    """Reproduz o acesso anterior: sqlite3.connect/close a cada operação."""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+
+    @contextmanager
+    def transacao(self):
+        conn = sqlite3.connect(self.caminho)
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    conexao = transacao
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[int(p * (len(ordenados) - 1))]
+
+
+def executar_cenario(acesso, escritores: int, insercoes: int, leitores: int) -> dict:
+    erros = []
+    falhas_escrita = []
+    latencias_leitura = []
+    terminou = threading.Event()
+
+    def escritor():
+        for _ in range(insercoes):
+            try:
+                with acesso.transacao() as conn:
+                    conn.execute(INSERT, (str(uuid.uuid4()), "febre alta e tosse", "CLASSIFICAÇÃO: VERDE",
+                                          datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "VERDE"))
+            except sqlite3.OperationalError as e:
+                erros.append(str(e))
+                falhas_escrita.append(e)
+
+    def leitor():
+        while not terminou.is_set():
+            inicio = time.perf_counter()
+            try:
+                with acesso.conexao() as conn:
+                    conn.execute(SELECT).fetchall()
+                latencias_leitura.append(time.perf_counter() - inicio)
+            except sqlite3.OperationalError as e:
+                erros.append(str(e))
+
+    threads_leitura = [threading.Thread(target=leitor) for _ in range(leitores)]
+    threads_escrita = [threading.Thread(target=escritor) for _ in range(escritores)]
+    inicio = time.perf_counter()
+    for t in threads_leitura + threads_escrita:
+        t.start()
+    for t in threads_escrita:
+        t.join()
+    duracao = time.perf_counter() - inicio
+    terminou.set()
+    for t in threads_leitura:
+        t.join()
+
+    total = escritores * insercoes
+    return {
+        "insercoes_por_segundo": round((total - len(falhas_escrita)) / duracao, 1),
+        "leitura_p50_ms": round(percentil(latencias_leitura, 0.50) * 1000, 3),
+        "leitura_p99_ms": round(percentil(latencias_leitura, 0.99) * 1000, 3),
+        "leituras": len(latencias_leitura),
+        "erros_database_locked": sum(1 for e in erros if "locked" in e)
+    }
+
+
+def novo_banco() -> str:
+    caminho = os.path.join(tempfile.mkdtemp(), "bench.db")
+    conn = sqlite3.connect(caminho)
+    conn.execute(SCHEMA)
+    conn.commit()
+    conn.close()
+    return caminho
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escritores", type=int, default=8)
+    parser.add_argument("--insercoes", type=int, default=200)
+    parser.add_argument("--leitores", type=int, default=4)
+    args = parser.parse_args()
+
+    antes = executar_cenario(AcessoAntigo(novo_banco()), args.escritores, args.insercoes, args.leitores)
+    pool = ConnectionPool(novo_banco(), max_connections=args.escritores + args.leitores)
+    depois = executar_cenario(pool, args.escritores, args.insercoes, args.leitores)
+    pool.fechar()
+    print(json.dumps({"antes": antes, "depois": depois}, indent=2))
@@ -0,0 +1,54 @@
+"""
+Benchmark do tempo até a classificação com geração em streaming.
+
+Compara, contra um Ollama simulado com taxa de tokens fixa, o tempo até a cor
+de Manchester estar disponível via generate_stream com o tempo da resposta
+completa via generate_response.
+
+Uso:
+    python -m benchmarks.bench_triagem_stream --tokens-por-segundo 20
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from ollama_service import OllamaService
+from benchmarks.fake_ollama import iniciar_fake_ollama
+
+
+async def executar(latencia: float, tokens_por_segundo: float) -> dict:
+    servidor = iniciar_fake_ollama(latencia=latencia, tokens_por_segundo=tokens_por_segundo)
+    servico = OllamaService(url=servidor.url, max_retries=1)
+    sintomas = "paciente com dor torácica intensa há 30 minutos"
+    prompt = servico.format_prompt(sintomas)
+    try:
+        inicio = time.perf_counter()
+        await servico.generate_response(prompt)
+        tempo_completo = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        partes = []
+        tempo_classificacao = None
+        async for token in servico.generate_stream(prompt):
+            partes.append(token)
+            if tempo_classificacao is None and servico.extract_classification("".join(partes)):
+                tempo_classificacao = time.perf_counter() - inicio
+        tempo_stream = time.perf_counter() - inicio
+    finally:
+        await servico.aclose()
+        servidor.shutdown()
+
+    return {
+        "tempo_resposta_completa_s": round(tempo_completo, 3),
+        "tempo_ate_classificacao_stream_s": round(tempo_classificacao, 3),
+        "tempo_total_stream_s": round(tempo_stream, 3)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latencia", type=float, default=0.2)
+    parser.add_argument("--tokens-por-segundo", type=float, default=20)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(executar(args.latencia, args.tokens_por_segundo)), indent=2))
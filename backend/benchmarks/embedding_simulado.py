@@ -0,0 +1,69 @@
+"""
+EmbeddingService determinístico para benchmarks e testes de carga, sem o modelo BERT.
+
+Herda do EmbeddingService real e troca apenas o forward do modelo: o cache LRU,
+o caminho em lote (usado pelo EmbeddingBatcher e pela indexação) e as métricas
+continuam os mesmos. Cada texto recebe um vetor pseudoaleatório derivado do seu
+hash, sempre o mesmo para o mesmo texto, e o custo do forward é simulado com uma
+pausa (que, como as operações do PyTorch, libera o GIL).
+"""
+import hashlib
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import torch
+
+from embedding_service import EmbeddingService
+from rastreamento import span
+
+
+class EmbeddingSimulado(EmbeddingService):
+
+    def __init__(self, cache_dir: str = "./embedding_cache", dimensao: int = 768, custo_lote_ms: float = 10.0,
+                 custo_texto_ms: float = 1.0, batch_size: int = 32, cache_max_entries: int = 100_000):
+        """
+        Args:
+            cache_dir: Diretório do cache de embeddings
+            dimensao: Dimensão dos vetores gerados
+            custo_lote_ms: Custo fixo simulado de cada forward
+            custo_texto_ms: Custo simulado adicional por texto do lote
+        """
+        self.model_name = "simulado"
+        self.cache_dir = cache_dir
+        self.batch_size = batch_size
+        self.max_length = 512
+        self.cache_max_entries = cache_max_entries
+        self.cache_max_bytes = None
+        self.seq_buckets = ()
+        self.dimensao = dimensao
+        self.custo_lote_s = custo_lote_ms / 1000
+        self.custo_texto_s = custo_texto_ms / 1000
+        self.device = torch.device("cpu")
+        self._load_cache()
+        # Os métodos públicos só conferem que modelo e tokenizer existem
+        self.tokenizer = SimpleNamespace(pad_token_id=0)
+        self.model = SimpleNamespace(backend="simulado")
+
+    def get_info(self) -> Dict[str, Any]:
+        return {
+            "modelo": self.model_name,
+            "backend": self.backend,
+            "dimensao": self.dimensao,
+            "custo_lote_ms": self.custo_lote_s * 1000,
+            "custo_texto_ms": self.custo_texto_s * 1000
+        }
+
+    def _vetor(self, texto: str) -> List[float]:
+        semente = int.from_bytes(hashlib.md5(texto.encode()).digest()[:8], "little")
+        vetor = np.random.default_rng(semente).standard_normal(self.dimensao).astype(np.float32)
+        return (vetor / np.linalg.norm(vetor)).tolist()
+
+    def _encode(self, texts: List[str], batch_size: Optional[int] = None) -> List[List[float]]:
+        batch_size = batch_size or self.batch_size
+        for inicio in range(0, len(texts), batch_size):
+            lote = len(texts[inicio:inicio + batch_size])
+            with span("embedding.forward", lote=lote):
+                time.sleep(self.custo_lote_s + self.custo_texto_s * lote)
+        return [self._vetor(texto) for texto in texts]
@@ -0,0 +1,164 @@
+"""
+Servidor HTTP que simula a API do Ollama para benchmarks e testes de carga.
+
+Responde a /api/generate (com ou sem streaming) e /api/tags com latência e taxa
+de tokens configuráveis, sem necessidade de GPU, modelo ou acesso à rede.
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+
+CORES = ["VERMELHO", "LARANJA", "AMARELO", "VERDE", "AZUL"]
+
+RESPOSTA_MODELO = """CLASSIFICAÇÃO: {cor}
+
+ANÁLISE CLÍNICA:
+Sintomas relatados compatíveis com classificação {cor}
+Sinais vitais devem ser confirmados na admissão
+Sem informações adicionais no relato do paciente
+Reavaliar caso haja piora do quadro
+
+CONDUTAS RECOMENDADAS:
+Verificar sinais vitais completos
+Avaliação médica conforme prioridade {cor}
+Monitorar evolução dos sintomas
+Registrar queixa principal no prontuário
+Orientar paciente sobre tempo de espera"""
+
+
+def resposta_simulada(prompt: str) -> str:
+    """Gera uma resposta determinística no formato do protocolo a partir do prompt."""
+    indice = int(hashlib.md5(prompt.encode()).hexdigest(), 16) % len(CORES)
+    return RESPOSTA_MODELO.format(cor=CORES[indice])
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _enviar_json(self, status: int, corpo: dict):
+        dados = json.dumps(corpo).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._enviar_json(200, {"models": [{"name": f"{self.server.modelo}:latest"}]})
+        else:
+            self._enviar_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        tamanho = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(tamanho) or b"{}")
+        if self.path != "/api/generate":
+            self._enviar_json(404, {"error": "not found"})
+            return
+
+        self.server.contar_requisicao()
+        texto = resposta_simulada(payload.get("prompt", ""))
+        # Mantém os espaços em cada fragmento para que a concatenação reproduza o texto
+        tokens = [t + " " for t in texto.split(" ")]
+        tokens[-1] = tokens[-1][:-1]
+        inicio = time.monotonic()
+        time.sleep(self.server.latencia)
+
+        final = {
+            "model": payload.get("model", self.server.modelo),
+            "done": True,
+            "prompt_eval_count": len(payload.get("prompt", "").split()),
+            "eval_count": len(tokens)
+        }
+
+        if payload.get("stream", True):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for token in tokens:
+                if self.server.tokens_por_segundo:
+                    time.sleep(1 / self.server.tokens_por_segundo)
+                self._enviar_chunk({"model": final["model"], "response": token, "done": False})
+            final["response"] = ""
+            final["total_duration"] = int((time.monotonic() - inicio) * 1e9)
+            self._enviar_chunk(final)
+            self.wfile.write(b"0\r\n\r\n")
+            return
+
+        if self.server.tokens_por_segundo:
+            time.sleep(len(tokens) / self.server.tokens_por_segundo)
+        final["response"] = texto
+        final["total_duration"] = int((time.monotonic() - inicio) * 1e9)
+        self._enviar_json(200, final)
+
+    def _enviar_chunk(self, corpo: dict):
+        dados = (json.dumps(corpo) + "\n").encode()
+        self.wfile.write(f"{len(dados):x}\r\n".encode() + dados + b"\r\n")
+        self.wfile.flush()
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, endereco: Tuple[str, int], latencia: float = 0.5,
+                 tokens_por_segundo: float = 0.0, modelo: str = "mistral"):
+        super().__init__(endereco, FakeOllamaHandler)
+        self.latencia = latencia
+        self.tokens_por_segundo = tokens_por_segundo
+        self.modelo = modelo
+        self.requisicoes = 0
+        self._lock = threading.Lock()
+
+    def contar_requisicao(self):
+        with self._lock:
+            self.requisicoes += 1
+
+    @property
+    def url(self) -> str:
+        host, porta = self.server_address[:2]
+        return f"http://{host}:{porta}"
+
+
+def iniciar_fake_ollama(latencia: float = 0.5, tokens_por_segundo: float = 0.0,
+                        host: str = "127.0.0.1", porta: int = 0) -> FakeOllamaServer:
+    """
+    Inicia o servidor simulado em uma thread daemon.
+
+    Args:
+        latencia: Tempo fixo (s) antes de responder cada geração
+        tokens_por_segundo: Taxa de geração simulada (0 desativa)
+        host: Endereço de escuta
+        porta: Porta de escuta (0 escolhe uma porta livre)
+
+    Returns:
+        Servidor em execução; use `server.url` como URL do Ollama e `server.shutdown()` para parar
+    """
+    server = FakeOllamaServer((host, porta), latencia=latencia, tokens_por_segundo=tokens_por_segundo)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor Ollama simulado")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=11435)
+    parser.add_argument("--latencia", type=float, default=0.5)
+    parser.add_argument("--tokens-por-segundo", type=float, default=0.0)
+    args = parser.parse_args()
+
+    servidor = FakeOllamaServer((args.host, args.porta), latencia=args.latencia,
+                                tokens_por_segundo=args.tokens_por_segundo)
+    print(f"Fake Ollama escutando em {servidor.url}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        servidor.shutdown()
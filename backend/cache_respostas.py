@@ -0,0 +1,190 @@
+"""
+Cache das respostas do modelo para queixas repetidas ou quase idênticas.
+
+A busca é feita em duas etapas: primeiro pelo texto normalizado (minúsculas,
+sem acentos, pontuação e espaços repetidos) e, se não houver entrada, pela
+similaridade de cosseno entre o embedding da queixa e os embeddings das
+respostas armazenadas. A busca semântica só é feita com um limiar definido:
+os vetores do BERT são anisotrópicos, e o limiar precisa ser medido sobre as
+triagens validadas (calibracao_cache.py) antes de ser ligado. Classificações graves (VERMELHO e LARANJA) só são
+servidas por correspondência exata, e queixas que a pré-triagem por regras já
+classifica como graves não passam pela busca semântica, a menos que isso seja
+explicitamente permitido.
+
+As entradas expiram após o TTL, a entrada usada há mais tempo é descartada
+quando o limite é atingido, e o cache inteiro é invalidado quando a impressão
+digital (modelo + instruções do prompt) muda.
+
+Todos os métodos são chamados a partir do loop de eventos, sem concorrência.
+"""
+import hashlib
+import logging
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from indice_vetorial import IndiceVetorial
+
+logger = logging.getLogger("cache_respostas")
+
+CLASSIFICACOES_GRAVES = ("VERMELHO", "LARANJA")
+
+
+def normalizar_texto(texto: str) -> str:
+    """Chave exata: minúsculas, sem acentos, sem pontuação e com espaços simples."""
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    texto = re.sub(r"[^\w\s]", " ", texto)
+    return " ".join(texto.split())
+
+
+def calcular_fingerprint(*partes: str) -> str:
+    """Impressão digital da configuração de geração (ex.: modelo e prefixo do prompt)."""
+    return hashlib.sha256("\x00".join(partes).encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass
+class EntradaCache:
+    resposta: str
+    classificacao: str
+    criado_em: float
+
+
+@dataclass
+class ResultadoCache:
+    resposta: str
+    classificacao: str
+    tipo: str  # "exato" ou "semantico"
+    similaridade: float = 1.0
+
+
+class CacheRespostas:
+    def __init__(self, fingerprint: str, ttl_s: float = 900.0, max_entradas: int = 1000,
+                 limiar_similaridade: Optional[float] = None, permitir_semantico_grave: bool = False):
+        """
+        Args:
+            fingerprint: Impressão digital do modelo e do prompt; se mudar, o cache é esvaziado
+            ttl_s: Tempo de vida de cada entrada em segundos
+            max_entradas: Número máximo de entradas (descarte LRU)
+            limiar_similaridade: Similaridade de cosseno mínima para um acerto semântico (None: só acertos exatos)
+            permitir_semantico_grave: Se True, VERMELHO/LARANJA também podem vir de acerto semântico
+        """
+        self.fingerprint = fingerprint
+        self.ttl_s = ttl_s
+        self.max_entradas = max_entradas
+        self.limiar_similaridade = limiar_similaridade
+        self.permitir_semantico_grave = permitir_semantico_grave
+        self._entradas: "OrderedDict[str, EntradaCache]" = OrderedDict()
+        # Embeddings normalizados das entradas, atualizados a cada inserção e remoção
+        self._indice = IndiceVetorial(capacidade_inicial=min(max_entradas, 1024))
+        self._metricas = {"acertos_exatos": 0, "acertos_semanticos": 0, "falhas": 0,
+                          "bloqueados_gravidade": 0, "expiradas": 0, "descartadas": 0, "invalidacoes": 0}
+        logger.info(f"Cache de respostas inicializado: ttl={ttl_s}s, max_entradas={max_entradas}, "
+                    f"limiar={limiar_similaridade}")
+
+    def definir_fingerprint(self, fingerprint: str):
+        """Esvazia o cache se o modelo ou o prompt mudaram."""
+        if fingerprint != self.fingerprint:
+            self.fingerprint = fingerprint
+            self.limpar()
+            self._metricas["invalidacoes"] += 1
+            logger.info("Cache de respostas invalidado: modelo ou prompt alterado")
+
+    def limpar(self):
+        self._entradas.clear()
+        self._indice.limpar()
+
+    def _expirada(self, entrada: EntradaCache, agora: float) -> bool:
+        return agora - entrada.criado_em > self.ttl_s
+
+    def _remover(self, chave: str):
+        self._entradas.pop(chave, None)
+        self._indice.remover(chave)
+
+    def buscar_exato(self, sintomas: str) -> Optional[ResultadoCache]:
+        """Procura a queixa pelo texto normalizado (não conta falha: a busca semântica vem em seguida)."""
+        chave = normalizar_texto(sintomas)
+        entrada = self._entradas.get(chave)
+        if entrada is None:
+            return None
+        if self._expirada(entrada, time.monotonic()):
+            self._remover(chave)
+            self._metricas["expiradas"] += 1
+            return None
+        self._entradas.move_to_end(chave)
+        self._metricas["acertos_exatos"] += 1
+        return ResultadoCache(entrada.resposta, entrada.classificacao, "exato")
+
+    def buscar_semelhante(self, embedding, classificacao_regras: Optional[str] = None) -> Optional[ResultadoCache]:
+        """
+        Procura a entrada mais similar ao embedding da queixa, acima do limiar.
+
+        Args:
+            embedding: Embedding da queixa
+            classificacao_regras: Cor da pré-triagem por regras; se for grave, só o acerto exato vale
+        """
+        if self.limiar_similaridade is None:
+            self._metricas["falhas"] += 1
+            return None
+        if classificacao_regras in CLASSIFICACOES_GRAVES and not self.permitir_semantico_grave:
+            self._metricas["bloqueados_gravidade"] += 1
+            self._metricas["falhas"] += 1
+            return None
+        consulta = np.asarray(embedding, dtype=np.float32)
+        if not len(self._indice) or not np.any(consulta):
+            self._metricas["falhas"] += 1
+            return None
+        similaridades = self._indice.similaridades(consulta)
+        chaves = self._indice.chaves
+        agora = time.monotonic()
+
+        # Percorre os candidatos acima do limiar do mais ao menos similar
+        acima = np.flatnonzero(similaridades >= self.limiar_similaridade)
+        for indice in acima[np.argsort(-similaridades[acima])]:
+            similaridade = float(similaridades[indice])
+            chave = chaves[indice]
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                continue
+            if self._expirada(entrada, agora):
+                self._remover(chave)
+                self._metricas["expiradas"] += 1
+                continue
+            if entrada.classificacao in CLASSIFICACOES_GRAVES and not self.permitir_semantico_grave:
+                self._metricas["bloqueados_gravidade"] += 1
+                continue
+            self._entradas.move_to_end(chave)
+            self._metricas["acertos_semanticos"] += 1
+            return ResultadoCache(entrada.resposta, entrada.classificacao, "semantico", similaridade)
+
+        self._metricas["falhas"] += 1
+        return None
+
+    def armazenar(self, sintomas: str, resposta: str, classificacao: str, embedding=None):
+        """Guarda a resposta gerada para a queixa (o embedding permite acertos semânticos)."""
+        chave = normalizar_texto(sintomas)
+        self._entradas[chave] = EntradaCache(resposta, classificacao or "", time.monotonic())
+        self._entradas.move_to_end(chave)
+        if self.limiar_similaridade is not None and embedding is not None and np.any(embedding):
+            self._indice.adicionar([chave], [embedding])
+        else:
+            self._indice.remover(chave)
+        while len(self._entradas) > self.max_entradas:
+            descartada, _ = self._entradas.popitem(last=False)
+            self._indice.remover(descartada)
+            self._metricas["descartadas"] += 1
+
+    def get_metrics(self) -> Dict[str, Any]:
+        consultas = self._metricas["acertos_exatos"] + self._metricas["acertos_semanticos"] + self._metricas["falhas"]
+        acertos = self._metricas["acertos_exatos"] + self._metricas["acertos_semanticos"]
+        return {
+            **self._metricas,
+            "entradas": len(self._entradas),
+            "taxa_acerto": round(acertos / consultas, 4) if consultas else 0.0,
+            "fingerprint": self.fingerprint
+        }
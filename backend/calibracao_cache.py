@@ -0,0 +1,124 @@
+"""
+Calibração do limiar de similaridade do cache semântico de respostas.
+
+Os acertos semânticos do CacheRespostas reaproveitam a resposta de outra queixa
+quando a similaridade de cosseno entre os embeddings passa do limiar
+(RESPONSE_CACHE_SIMILARITY). Os vetores do BERT são anisotrópicos: queixas sem
+relação entre si costumam ter similaridade alta, então o limiar só pode ser
+ligado depois de medido sobre os dados.
+
+Para cada par de triagens validadas com textos normalizados diferentes (textos
+iguais já são servidos pela busca exata), calcula a similaridade e, em cada
+limiar candidato, a precisão (fração dos pares acima do limiar com a mesma cor
+de referência) e os pares em que uma queixa grave (VERMELHO ou LARANJA) receberia
+a resposta de uma não grave, que o cache não bloqueia. O limiar recomendado é o
+menor com precisão mínima (--precisao-minima), nenhum desses pares e pelo menos
+--min-pares pares; se nenhum atender, o cache semântico deve continuar desligado.
+
+Uso:
+    python calibracao_cache.py --limite 3000
+    python calibracao_cache.py --embeddings-simulados --limite 500
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from avaliacao_triagens import CORES, carregar_casos
+from cache_respostas import CLASSIFICACOES_GRAVES, normalizar_texto
+
+logger = logging.getLogger("calibracao_cache")
+
+LIMIARES = (0.90, 0.92, 0.94, 0.95, 0.96, 0.97, 0.98, 0.985, 0.99, 0.995)
+_GRAVIDADE = {cor: i for i, cor in enumerate(CORES)}
+
+
+def calibrar(casos: List[Dict[str, Any]], embeddings: List[List[float]], limiares=LIMIARES,
+             precisao_minima: float = 0.99, min_pares: int = 30) -> Dict[str, Any]:
+    """Precisão e pares grave/não grave acima de cada limiar, e o limiar recomendado (ou None)."""
+    matriz = np.asarray(embeddings, dtype=np.float32)
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    matriz = matriz / np.where(normas == 0, 1, normas)
+    gravidades = np.array([_GRAVIDADE[caso["verdade"]] for caso in casos])
+    graves = np.array([caso["verdade"] in CLASSIFICACOES_GRAVES for caso in casos])
+    textos = np.array([normalizar_texto(caso["sintomas"]) for caso in casos], dtype=object)
+
+    linhas, colunas = np.triu_indices(len(casos), k=1)
+    distintos = textos[linhas] != textos[colunas]
+    linhas, colunas = linhas[distintos], colunas[distintos]
+    similaridades = np.einsum("ij,ij->i", matriz[linhas], matriz[colunas])
+    mesma_cor = gravidades[linhas] == gravidades[colunas]
+    grave_com_nao_grave = graves[linhas] != graves[colunas]
+
+    por_limiar = []
+    recomendado: Optional[float] = None
+    for limiar in limiares:
+        acima = similaridades >= limiar
+        pares = int(acima.sum())
+        corretos = int((acima & mesma_cor).sum())
+        subtriagem_grave = int((acima & grave_com_nao_grave).sum())
+        precisao = round(corretos / pares, 4) if pares else None
+        por_limiar.append({"limiar": limiar, "pares": pares, "precisao": precisao,
+                           "pares_grave_com_nao_grave": subtriagem_grave})
+        if recomendado is None and pares >= min_pares and precisao >= precisao_minima and subtriagem_grave == 0:
+            recomendado = limiar
+
+    return {
+        "casos": len(casos),
+        "pares": int(len(similaridades)),
+        "similaridade_mediana": round(float(np.median(similaridades)), 4) if len(similaridades) else None,
+        "similaridade_p99": round(float(np.percentile(similaridades, 99)), 4) if len(similaridades) else None,
+        "por_limiar": por_limiar,
+        "limiar_recomendado": recomendado
+    }
+
+
+def main():
+    from migracoes import aplicar_migracoes
+
+    parser = argparse.ArgumentParser(description="Calibra o limiar do cache semântico sobre as triagens validadas")
+    parser.add_argument("--limite", type=int, default=3000, help="Usa só os N casos validados mais antigos")
+    parser.add_argument("--precisao-minima", type=float, default=0.99)
+    parser.add_argument("--min-pares", type=int, default=30, help="Pares acima do limiar exigidos para recomendá-lo")
+    parser.add_argument("--modelo-embeddings", default=os.getenv("EMBEDDING_MODEL", "pucpr/biobertpt-clin"))
+    parser.add_argument("--embeddings-simulados", action="store_true",
+                        help="Embeddings simulados (só para testar o script; o limiar não vale para o modelo real)")
+    parser.add_argument("--relatorio", help="Grava também o relatório JSON neste arquivo")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    aplicar_migracoes()
+
+    casos, sem_referencia = carregar_casos(args.limite)
+    logger.info(f"{len(casos)} casos validados ({sem_referencia} sem cor de referência ignorados)")
+    if len(casos) < 2:
+        parser.error("São necessários ao menos dois casos validados para calibrar o limiar")
+
+    if args.embeddings_simulados:
+        from benchmarks.embedding_simulado import EmbeddingSimulado
+
+        embedding_service = EmbeddingSimulado(cache_dir=tempfile.mkdtemp(), custo_lote_ms=0, custo_texto_ms=0)
+    else:
+        from embedding_service import EmbeddingService
+
+        embedding_service = EmbeddingService(model_name=args.modelo_embeddings,
+                                             backend=os.getenv("EMBEDDING_BACKEND", "fp32"))
+    try:
+        embeddings = embedding_service.get_batch_embeddings([caso["sintomas"] for caso in casos])
+    finally:
+        embedding_service.close()
+
+    relatorio = calibrar(casos, embeddings, precisao_minima=args.precisao_minima, min_pares=args.min_pares)
+    relatorio["modelo_embeddings"] = "simulado" if args.embeddings_simulados else args.modelo_embeddings
+    if args.relatorio:
+        with open(args.relatorio, "w", encoding="utf-8") as f:
+            json.dump(relatorio, f, indent=2, ensure_ascii=False)
+    print(json.dumps(relatorio, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
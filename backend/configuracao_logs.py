@@ -0,0 +1,165 @@
+"""
+Configuração única do logging da aplicação.
+
+Os módulos só criam o próprio logger (logging.getLogger("nome")); quem configura
+os destinos é `configurar_logs()`, chamado uma vez por main.py:
+
+- o logger raiz recebe apenas um QueueHandler, então um `logger.info` no loop de
+  eventos só enfileira o registro, sem E/S de arquivo ou terminal;
+- uma thread (QueueListener) formata e grava os registros: JSON, um por linha,
+  em um arquivo com rotação por tamanho, e texto no console;
+- cada registro leva o id da requisição em andamento (X-Request-ID, do rastreamento),
+  capturado na thread que registrou.
+
+Se a fila encher (disco parado, por exemplo), os registros excedentes são
+descartados e contados, em vez de bloquear as requisições.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from datetime import datetime
+from typing import Optional
+
+from rastreamento import id_requisicao_atual
+
+FORMATO_TEXTO = "%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s"
+
+# Atributos padrão do LogRecord; os demais (passados em `extra=`) vão para o JSON
+_ATRIBUTOS_PADRAO = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {
+    "message", "asctime", "request_id"
+}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_handler_fila: Optional["HandlerFila"] = None
+
+
+class FormatadorJSON(logging.Formatter):
+    """Um objeto JSON por registro: data_hora, nivel, logger, mensagem, request_id e campos extras."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        dados = {
+            "data_hora": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "mensagem": record.getMessage(),
+        }
+        if getattr(record, "request_id", "-") != "-":
+            dados["request_id"] = record.request_id
+        for chave, valor in record.__dict__.items():
+            if chave not in _ATRIBUTOS_PADRAO and not chave.startswith("_"):
+                dados[chave] = valor
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            dados["excecao"] = record.exc_text
+        if record.stack_info:
+            dados["pilha"] = record.stack_info
+        return json.dumps(dados, ensure_ascii=False, default=str)
+
+
+class HandlerFila(logging.handlers.QueueHandler):
+    """
+    QueueHandler que não bloqueia nem formata: só resolve a mensagem (os argumentos
+    podem mudar depois) e anota o id da requisição, deixando a formatação para a thread.
+    """
+
+    def __init__(self, fila: queue.SimpleQueue, max_fila: int):
+        super().__init__(fila)
+        self.max_fila = max_fila
+        self.descartados = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # O traceback mantém os frames vivos; na fila vai só o texto
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.request_id = id_requisicao_atual() or "-"
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        # SimpleQueue (em C, sem lock em Python) não tem limite próprio; o tamanho é conferido aqui
+        if self.queue.qsize() >= self.max_fila:
+            self.descartados += 1
+        else:
+            self.queue.put_nowait(record)
+
+
+def configurar_logs(nivel: Optional[str] = None, arquivo: Optional[str] = None, max_bytes: Optional[int] = None,
+                    backups: Optional[int] = None, console: Optional[bool] = None,
+                    max_fila: int = 10000) -> logging.handlers.QueueListener:
+    """
+    Configura o logger raiz (uma única vez por processo; chamadas seguintes não fazem nada).
+
+    Args:
+        nivel: Nível mínimo (LOG_LEVEL, padrão INFO)
+        arquivo: Arquivo JSONL dos logs (LOG_FILE, padrão triagem_api.log; vazio desativa)
+        max_bytes: Tamanho que dispara a rotação do arquivo (LOG_MAX_BYTES, padrão 10 MB)
+        backups: Arquivos rotacionados mantidos (LOG_BACKUP_COUNT, padrão 5)
+        console: Se também escreve no console (LOG_CONSOLE, padrão true)
+        max_fila: Registros pendentes antes de começar a descartar
+    """
+    global _listener, _handler_fila
+    if _listener is not None:
+        return _listener
+
+    nivel = (nivel or os.getenv("LOG_LEVEL", "INFO")).upper()
+    arquivo = os.getenv("LOG_FILE", "triagem_api.log") if arquivo is None else arquivo
+    max_bytes = max_bytes or int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+    backups = int(os.getenv("LOG_BACKUP_COUNT", "5")) if backups is None else backups
+    console = os.getenv("LOG_CONSOLE", "true").lower() == "true" if console is None else console
+
+    destinos = []
+    if arquivo:
+        handler_arquivo = logging.handlers.RotatingFileHandler(arquivo, maxBytes=max_bytes, backupCount=backups,
+                                                               encoding="utf-8")
+        handler_arquivo.setFormatter(FormatadorJSON())
+        destinos.append(handler_arquivo)
+    if console:
+        handler_console = logging.StreamHandler()
+        handler_console.setFormatter(logging.Formatter(FORMATO_TEXTO))
+        destinos.append(handler_console)
+
+    # Nenhum formato usa arquivo, linha, função ou processo de origem: dispensa coletá-los em cada registro
+    logging._srcfile = None
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    fila: queue.SimpleQueue = queue.SimpleQueue()
+    _handler_fila = HandlerFila(fila, max_fila)
+    raiz = logging.getLogger()
+    for handler in list(raiz.handlers):
+        raiz.removeHandler(handler)
+    raiz.addHandler(_handler_fila)
+    raiz.setLevel(nivel)
+
+    # O uvicorn configura handlers próprios; com eles passando pela raiz, tudo sai pela fila
+    for nome in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        logging.getLogger(nome).handlers.clear()
+        logging.getLogger(nome).propagate = True
+
+    _listener = logging.handlers.QueueListener(fila, *destinos, respect_handler_level=True)
+    _listener.start()
+    atexit.register(encerrar_logs)
+    return _listener
+
+
+def encerrar_logs():
+    """Grava os registros pendentes e encerra a thread de logging."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+        if registros_descartados():
+            print(f"{registros_descartados()} registros de log descartados com a fila cheia", file=sys.stderr)
+
+
+def registros_descartados() -> int:
+    return _handler_fila.descartados if _handler_fila is not None else 0
@@ -0,0 +1,163 @@
+"""
+Montagem do prompt de triagem enviado ao Ollama.
+
+O prompt tem três partes, nesta ordem:
+
+1. Prefixo fixo com as instruções do Protocolo de Manchester e o formato da
+   resposta. É idêntico byte a byte em todas as requisições, o que permite ao
+   Ollama reaproveitar o cache KV já calculado para ele e processar só o final.
+2. Casos validados semelhantes, com a classificação confirmada pelo
+   profissional, incluídos em ordem de relevância enquanto couberem no
+   orçamento de tokens.
+3. Os sintomas do paciente.
+"""
+import logging
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Union
+
+logger = logging.getLogger("construtor_prompt")
+
+PREFIXO_TRIAGEM = """Você é um sistema especializado em triagem hospitalar baseado no Protocolo de Manchester.
+
+Sua tarefa é analisar os sintomas do paciente e fornecer:
+1. Uma classificação de urgência (VERMELHO, LARANJA, AMARELO, VERDE ou AZUL)
+2. Uma análise clínica em tópicos curtos e objetivos
+3. Condutas recomendadas em formato de lista numerada
+
+PROTOCOLO DE MANCHESTER:
+- VERMELHO (Emergência): Risco imediato à vida. Atendimento imediato.
+- LARANJA (Muito Urgente): Risco alto. Atendimento em até 10 minutos.
+- AMARELO (Urgente): Risco moderado. Atendimento em até 60 minutos.
+- VERDE (Pouco Urgente): Risco baixo. Atendimento em até 120 minutos.
+- AZUL (Não Urgente): Sem risco. Atendimento em até 240 minutos.
+
+Forneça sua resposta no seguinte formato exato:
+
+CLASSIFICAÇÃO: [COR]
+
+ANÁLISE CLÍNICA:
+[Ponto principal 1 - máximo 15 palavras]
+[Ponto principal 2 - máximo 15 palavras]
+[Ponto principal 3 - máximo 15 palavras]
+[Ponto principal 4 - máximo 15 palavras]
+
+CONDUTAS RECOMENDADAS:
+[Conduta 1 - máximo 15 palavras]
+[Conduta 2 - máximo 15 palavras]
+[Conduta 3 - máximo 15 palavras]
+[Conduta 4 - máximo 15 palavras]
+[Conduta 5 - máximo 15 palavras]
+
+IMPORTANTE: Seja extremamente conciso. Use apenas tópicos curtos com informações essenciais. Evite frases longas e explicações detalhadas. NÃO INCLUA MARCADORES (•, *, números) no início dos tópicos.
+"""
+
+CABECALHO_CASOS = "\nCASOS SEMELHANTES JÁ VALIDADOS POR PROFISSIONAIS (use como referência):\n"
+CABECALHO_SINTOMAS = "\nSINTOMAS DO PACIENTE:\n"
+
+_PECAS_TEXTO = re.compile(r"\w+|[^\w\s]")
+
+
+def estimar_tokens(texto: str) -> int:
+    """
+    Estimativa conservadora do número de tokens do texto.
+
+    Tokenizadores BPE/SentencePiece dividem palavras em português (sobretudo as
+    acentuadas) em mais de um token; contar palavras e sinais de pontuação com
+    um fator de 1,4 fica acima da contagem real na prática.
+    """
+    return math.ceil(len(_PECAS_TEXTO.findall(texto)) * 1.4)
+
+
+@dataclass
+class PromptMontado:
+    texto: str
+    tokens_estimados: int
+    casos_incluidos: int
+    casos_descartados: int = 0
+    tokens_por_parte: Dict[str, int] = field(default_factory=dict)
+
+
+class ConstrutorPrompt:
+    def __init__(self, orcamento_tokens: int = 1536, max_caracteres_caso: int = 400,
+                 contador_tokens: Optional[Callable[[str], int]] = None, prefixo: str = PREFIXO_TRIAGEM):
+        """
+        Args:
+            orcamento_tokens: Número máximo de tokens do prompt completo
+            max_caracteres_caso: Tamanho máximo dos sintomas de cada caso de referência
+            contador_tokens: Função de contagem de tokens (padrão: estimar_tokens)
+            prefixo: Instruções fixas enviadas no início de todo prompt
+        """
+        self.orcamento_tokens = orcamento_tokens
+        self.max_caracteres_caso = max_caracteres_caso
+        self.contar_tokens = contador_tokens or estimar_tokens
+        self.prefixo = prefixo
+        self.tokens_prefixo = self.contar_tokens(prefixo)
+        self.tokens_cabecalho_casos = self.contar_tokens(CABECALHO_CASOS)
+
+    @staticmethod
+    def _normalizar_caso(caso: Union[str, Dict[str, str]]) -> Dict[str, str]:
+        # Aceita tanto o texto dos sintomas quanto os metadados do ChromaDB
+        if isinstance(caso, str):
+            return {"sintomas": caso, "classificacao": ""}
+        return {"sintomas": caso.get("sintomas") or caso.get("content") or "",
+                "classificacao": caso.get("classificacao") or ""}
+
+    def _formatar_caso(self, caso: Dict[str, str]) -> str:
+        sintomas = " ".join(caso["sintomas"].split())
+        if len(sintomas) > self.max_caracteres_caso:
+            sintomas = sintomas[:self.max_caracteres_caso].rsplit(" ", 1)[0] + "..."
+        linha = f"- Sintomas: {sintomas}"
+        if caso["classificacao"]:
+            linha += f" | Classificação validada: {caso['classificacao']}"
+        return linha + "\n"
+
+    def construir(self, sintomas: str, casos: Optional[Sequence[Union[str, Dict[str, str]]]] = None) -> PromptMontado:
+        """
+        Monta o prompt respeitando o orçamento de tokens.
+
+        O prefixo e os sintomas sempre entram; os casos semelhantes (já ordenados
+        por relevância) entram enquanto houver orçamento, e os que não cabem são
+        descartados.
+        """
+        parte_sintomas = f"{CABECALHO_SINTOMAS}{sintomas.strip()}\n"
+        tokens_sintomas = self.contar_tokens(parte_sintomas)
+        disponivel = self.orcamento_tokens - self.tokens_prefixo - tokens_sintomas - self.tokens_cabecalho_casos
+
+        linhas_casos: List[str] = []
+        tokens_casos = 0
+        descartados = 0
+        vistos = set()
+        for caso in casos or []:
+            caso = self._normalizar_caso(caso)
+            if not caso["sintomas"] or caso["sintomas"] in vistos:
+                continue
+            vistos.add(caso["sintomas"])
+            linha = self._formatar_caso(caso)
+            tokens_linha = self.contar_tokens(linha)
+            if tokens_casos + tokens_linha > disponivel:
+                descartados += 1
+                continue
+            linhas_casos.append(linha)
+            tokens_casos += tokens_linha
+
+        partes = [self.prefixo]
+        if linhas_casos:
+            partes.append(CABECALHO_CASOS + "".join(linhas_casos))
+            tokens_casos += self.tokens_cabecalho_casos
+        partes.append(parte_sintomas)
+
+        tokens = self.tokens_prefixo + tokens_casos + tokens_sintomas
+        if tokens > self.orcamento_tokens:
+            logger.warning(f"Prompt excede o orçamento mesmo sem casos: {tokens} > {self.orcamento_tokens} tokens")
+        if descartados:
+            logger.info(f"Casos semelhantes fora do orçamento de tokens: {descartados}")
+
+        return PromptMontado(
+            texto="".join(partes),
+            tokens_estimados=tokens,
+            casos_incluidos=len(linhas_casos),
+            casos_descartados=descartados,
+            tokens_por_parte={"prefixo": self.tokens_prefixo, "casos": tokens_casos, "sintomas": tokens_sintomas}
+        )
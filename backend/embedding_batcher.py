@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from rastreamento import RastroLote, rastro_atual, span, usar_rastro
+
+logger = logging.getLogger("embedding_batcher")
+
+
+class EmbeddingBatcher:
+    """
+    Agrupa pedidos concorrentes de embedding em forward passes em lote.
+
+    Pedidos que chegam dentro de uma janela curta (ou até atingir o tamanho
+    máximo do lote) são processados juntos por EmbeddingService.get_batch_embeddings
+    em uma thread separada, e o futuro de cada chamador é resolvido com seu vetor.
+    """
+
+    def __init__(self, embedding_service, max_batch_size: int = 16, max_wait_ms: float = 5.0,
+                 use_cache: bool = True, metrics_window: int = 1000):
+        """
+        Inicializa o agrupador de pedidos.
+
+        Args:
+            embedding_service: Instância de EmbeddingService
+            max_batch_size: Número máximo de textos por forward pass
+            max_wait_ms: Tempo máximo (ms) que o primeiro pedido de um lote aguarda por outros
+            use_cache: Se deve consultar e alimentar o cache do EmbeddingService
+            metrics_window: Quantidade de amostras recentes mantidas para percentis
+        """
+        self.embedding_service = embedding_service
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.use_cache = use_cache
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+        # Métricas
+        self.total_requests = 0
+        self.total_batches = 0
+        self.cache_hits = 0
+        self._batch_sizes: Deque[int] = deque(maxlen=metrics_window)
+        self._queue_waits: Deque[float] = deque(maxlen=metrics_window)
+        self._forward_times: Deque[float] = deque(maxlen=metrics_window)
+
+    def _ensure_worker(self):
+        """Inicia a tarefa de processamento no loop atual, se necessário."""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+            logger.info(f"Agrupador de embeddings iniciado: max_batch_size={self.max_batch_size}, "
+                        f"janela={self.max_wait * 1000:.1f}ms")
+
+    async def get_embedding(self, text: str) -> List[float]:
+        """
+        Obtém o embedding de um texto, agrupando-o com pedidos concorrentes.
+
+        Args:
+            text: Texto para gerar embedding
+
+        Returns:
+            Lista de floats representando o embedding
+        """
+        self.total_requests += 1
+        if self.use_cache:
+            cached = self.embedding_service.get_cached_embedding(text)
+            if cached is not None:
+                self.cache_hits += 1
+                return cached
+
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        # O rastro da requisição acompanha o pedido, já que o lote roda na tarefa do agrupador
+        await self._queue.put((text, future, time.perf_counter(), rastro_atual()))
+        return await future
+
+    async def _collect_batch(self) -> List[Tuple[str, asyncio.Future, float, Any]]:
+        """Aguarda o primeiro pedido e acumula outros até a janela ou o lote se esgotarem."""
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect_batch()
+            started = time.perf_counter()
+            texts = [text for text, _, _, _ in batch]
+            rastros = [rastro for _, _, _, rastro in batch if rastro is not None]
+            for _, _, enqueued_at, rastro in batch:
+                if rastro is not None:
+                    rastro.adicionar("embedding.fila", enqueued_at, started)
+
+            try:
+                # Tokenização e forward registrados no rastro de todas as requisições do lote
+                with usar_rastro(RastroLote(rastros) if rastros else None), span("embedding.lote", textos=len(texts)):
+                    embeddings = await asyncio.to_thread(
+                        self.embedding_service.get_batch_embeddings, texts, self.use_cache
+                    )
+            except Exception as e:
+                logger.error(f"Erro ao gerar lote de embeddings: {str(e)}")
+                for _, future, _, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            forward_time = time.perf_counter() - started
+            self.total_batches += 1
+            self._batch_sizes.append(len(batch))
+            self._forward_times.append(forward_time)
+            for (_, future, enqueued_at, _), embedding in zip(batch, embeddings):
+                self._queue_waits.append(started - enqueued_at)
+                if not future.done():
+                    future.set_result(embedding)
+
+    async def stop(self):
+        """Cancela a tarefa de processamento, falhando os pedidos ainda na fila."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        if self._queue is not None:
+            while not self._queue.empty():
+                _, future, _, _ = self._queue.get_nowait()
+                if not future.done():
+                    future.cancel()
+
+    @staticmethod
+    def _summary(samples) -> Dict[str, float]:
+        if not samples:
+            return {"media": 0.0, "p50": 0.0, "p99": 0.0, "max": 0.0}
+        ordered = sorted(samples)
+        return {
+            "media": sum(ordered) / len(ordered),
+            "p50": ordered[int(0.50 * (len(ordered) - 1))],
+            "p99": ordered[int(0.99 * (len(ordered) - 1))],
+            "max": ordered[-1]
+        }
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Retorna métricas de tamanho de lote, espera na fila e tempo de forward (ms)."""
+        to_ms = lambda summary: {k: round(v * 1000, 3) for k, v in summary.items()}
+        return {
+            "requisicoes": self.total_requests,
+            "acertos_cache": self.cache_hits,
+            "lotes": self.total_batches,
+            "fila_atual": self._queue.qsize() if self._queue is not None else 0,
+            "tamanho_lote": {k: round(v, 2) for k, v in self._summary(self._batch_sizes).items()},
+            "espera_fila_ms": to_ms(self._summary(self._queue_waits)),
+            "forward_ms": to_ms(self._summary(self._forward_times))
+        }
@@ -0,0 +1,307 @@
+import json
+import logging
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger("embedding_cache")
+
+# Registro do índice: hash MD5 (16 bytes) + linha na matriz + CRC32 do vetor
+INDEX_RECORD = struct.Struct("<16sII")
+
+
+class EmbeddingCache:
+    """
+    Cache persistente de embeddings em formato binário.
+
+    Os vetores ficam em uma matriz float32 mapeada em memória (`embeddings.f32`),
+    e o mapeamento hash→linha em um log de índice somente-anexação
+    (`embeddings.idx`). Novas entradas nunca reescrevem o arquivo inteiro; quando
+    o limite é atingido, a entrada menos usada recentemente (LRU) é descartada e
+    sua linha é reaproveitada.
+
+    Cada registro do índice guarda o CRC32 do vetor; uma linha sobrescrita antes
+    de o índice ser gravado (queda do processo entre as duas escritas) é
+    detectada na leitura e tratada como ausência no cache.
+    """
+
+    DATA_FILE = "embeddings.f32"
+    INDEX_FILE = "embeddings.idx"
+    META_FILE = "embeddings.meta.json"
+    LEGACY_FILE = "embedding_cache.json"
+
+    def __init__(self, cache_dir: str, max_entries: int = 100_000, max_bytes: Optional[int] = None,
+                 flush_every: int = 64):
+        """
+        Abre (ou cria) o cache no diretório indicado.
+
+        Args:
+            cache_dir: Diretório dos arquivos do cache
+            max_entries: Número máximo de embeddings mantidos
+            max_bytes: Limite opcional do tamanho da matriz em bytes
+            flush_every: Número de inserções entre gravações automáticas do índice
+        """
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.flush_every = flush_every
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.RLock()
+        self._entries: "OrderedDict[bytes, int]" = OrderedDict()
+        self._crcs: Dict[bytes, int] = {}
+        self._free_rows: List[int] = []
+        self._pending: List[bytes] = []
+        self._index_records = 0
+        self._dim: Optional[int] = None
+        self._capacity = 0
+        self._next_row = 0
+        self._matrix: Optional[np.memmap] = None
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.cache_dir, name)
+
+    def _limit(self) -> int:
+        """Número máximo de linhas considerando os limites de entradas e de bytes."""
+        limit = self.max_entries
+        if self.max_bytes is not None and self._dim:
+            limit = min(limit, max(1, self.max_bytes // (self._dim * 4)))
+        return limit
+
+    def _load(self):
+        meta_path = self._path(self.META_FILE)
+        if os.path.exists(meta_path):
+            try:
+                with open(meta_path, "r") as f:
+                    self._dim = json.load(f)["dim"]
+                self._open_matrix()
+                self._replay_index()
+                logger.info(f"Cache de embeddings carregado: {len(self._entries)} entradas")
+            except Exception as e:
+                logger.error(f"Erro ao carregar cache binário, recriando: {str(e)}")
+                self._reset_files()
+
+        legacy_path = self._path(self.LEGACY_FILE)
+        if os.path.exists(legacy_path):
+            self._migrate_legacy(legacy_path)
+
+    def _open_matrix(self):
+        data_path = self._path(self.DATA_FILE)
+        size = os.path.getsize(data_path) if os.path.exists(data_path) else 0
+        self._capacity = size // (self._dim * 4)
+        self._matrix = None
+        if self._capacity:
+            self._matrix = np.memmap(data_path, dtype=np.float32, mode="r+", shape=(self._capacity, self._dim))
+
+    def _replay_index(self):
+        """Reconstrói o mapeamento a partir do log, ignorando um registro final incompleto."""
+        index_path = self._path(self.INDEX_FILE)
+        if not os.path.exists(index_path):
+            return
+        with open(index_path, "rb") as f:
+            raw = f.read()
+        complete = len(raw) - len(raw) % INDEX_RECORD.size
+        if complete != len(raw):
+            logger.warning("Registro incompleto no índice do cache descartado")
+            with open(index_path, "r+b") as f:
+                f.truncate(complete)
+
+        row_owner: Dict[int, bytes] = {}
+        for key, row, crc in INDEX_RECORD.iter_unpack(raw[:complete]):
+            if row >= self._capacity:
+                continue
+            previous = row_owner.get(row)
+            if previous is not None and previous != key:
+                # A linha foi reaproveitada por outra chave após uma remoção LRU
+                self._entries.pop(previous, None)
+                self._crcs.pop(previous, None)
+            old_row = self._entries.pop(key, None)
+            if old_row is not None and old_row != row:
+                row_owner.pop(old_row, None)
+            self._entries[key] = row
+            self._crcs[key] = crc
+            row_owner[row] = key
+        self._index_records = complete // INDEX_RECORD.size
+
+        used = set(self._entries.values())
+        self._next_row = max(used) + 1 if used else 0
+        self._free_rows = [r for r in range(self._next_row) if r not in used]
+
+        while len(self._entries) > self._limit():
+            self._evict()
+        if self._index_records > 2 * len(self._entries) + 1024:
+            self._compact_index()
+
+    def _migrate_legacy(self, legacy_path: str):
+        """Importa o antigo cache JSON e o renomeia para não ser lido novamente."""
+        try:
+            with open(legacy_path, "r") as f:
+                legacy = json.load(f)
+            for text_hash, embedding in legacy.items():
+                self.put(text_hash, embedding)
+            self.flush()
+            os.replace(legacy_path, legacy_path + ".migrado")
+            logger.info(f"Cache JSON legado migrado: {len(legacy)} entradas")
+        except Exception as e:
+            logger.error(f"Erro ao migrar cache JSON legado: {str(e)}")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, text_hash: str) -> bool:
+        return bytes.fromhex(text_hash) in self._entries
+
+    def get(self, text_hash: str, contar_ausencia: bool = True) -> Optional[List[float]]:
+        """Retorna o embedding como lista de floats, ou None se ausente."""
+        vector = self.get_array(text_hash, contar_ausencia)
+        return vector.tolist() if vector is not None else None
+
+    def get_array(self, text_hash: str, contar_ausencia: bool = True) -> Optional[np.ndarray]:
+        """
+        Retorna uma cópia float32 do embedding, ou None se ausente.
+
+        Com contar_ausencia=False a ausência não entra em `misses`, para consultas
+        prévias cujo texto ausente ainda será buscado (e contado) no caminho normal.
+        """
+        key = bytes.fromhex(text_hash)
+        with self._lock:
+            row = self._entries.get(key)
+            if row is None:
+                if contar_ausencia:
+                    self.misses += 1
+                return None
+            vector = np.array(self._matrix[row])
+            if zlib.crc32(vector.tobytes()) != self._crcs[key]:
+                logger.warning("Entrada inconsistente no cache de embeddings descartada")
+                self._entries.pop(key)
+                self._crcs.pop(key)
+                self._free_rows.append(row)
+                if contar_ausencia:
+                    self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, text_hash: str, embedding):
+        """Insere ou atualiza um embedding, removendo a entrada LRU se o limite for atingido."""
+        vector = np.asarray(embedding, dtype=np.float32)
+        key = bytes.fromhex(text_hash)
+        with self._lock:
+            if self._dim is None:
+                self._dim = int(vector.shape[0])
+                with open(self._path(self.META_FILE), "w") as f:
+                    json.dump({"dim": self._dim}, f)
+            elif vector.shape[0] != self._dim:
+                raise ValueError(f"Dimensão {vector.shape[0]} incompatível com o cache ({self._dim})")
+
+            row = self._entries.get(key)
+            if row is None:
+                if len(self._entries) >= self._limit():
+                    self._evict()
+                row = self._allocate_row()
+
+            self._matrix[row] = vector
+            crc = zlib.crc32(vector.tobytes())
+            self._entries[key] = row
+            self._entries.move_to_end(key)
+            self._crcs[key] = crc
+            self._pending.append(INDEX_RECORD.pack(key, row, crc))
+
+            if len(self._pending) >= self.flush_every:
+                self.flush()
+
+    def _evict(self):
+        key, row = self._entries.popitem(last=False)
+        self._crcs.pop(key, None)
+        self._free_rows.append(row)
+
+    def _allocate_row(self) -> int:
+        if self._free_rows:
+            return self._free_rows.pop()
+        if self._next_row >= self._capacity:
+            self._grow()
+        row = self._next_row
+        self._next_row += 1
+        return row
+
+    def _grow(self):
+        """Aumenta a matriz em disco (dobrando a capacidade, até o limite)."""
+        new_capacity = min(max(1024, self._capacity * 2), max(self._limit(), self._capacity + 1))
+        if self._matrix is not None:
+            self._matrix.flush()
+        self._matrix = None
+        with open(self._path(self.DATA_FILE), "ab") as f:
+            f.truncate(new_capacity * self._dim * 4)
+        self._capacity = new_capacity
+        self._matrix = np.memmap(self._path(self.DATA_FILE), dtype=np.float32, mode="r+",
+                                 shape=(self._capacity, self._dim))
+
+    def flush(self):
+        """
+        Grava as alterações pendentes de forma segura contra quedas.
+
+        A matriz é sincronizada antes de os registros do índice serem anexados,
+        para que um registro nunca aponte para um vetor ainda não gravado.
+        """
+        with self._lock:
+            if not self._pending:
+                return
+            try:
+                self._matrix.flush()
+                with open(self._path(self.INDEX_FILE), "ab") as f:
+                    f.write(b"".join(self._pending))
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._index_records += len(self._pending)
+                self._pending = []
+                if self._index_records > 2 * len(self._entries) + 1024:
+                    self._compact_index()
+            except Exception as e:
+                logger.error(f"Erro ao salvar cache: {str(e)}")
+
+    def _compact_index(self):
+        """Reescreve o log do índice só com as entradas vivas, substituindo-o atomicamente."""
+        index_path = self._path(self.INDEX_FILE)
+        tmp_path = index_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(b"".join(INDEX_RECORD.pack(key, row, self._crcs[key]) for key, row in self._entries.items()))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, index_path)
+        self._index_records = len(self._entries)
+        logger.info(f"Índice do cache de embeddings compactado: {self._index_records} registros")
+
+    def _reset_files(self):
+        self._matrix = None
+        for name in (self.DATA_FILE, self.INDEX_FILE, self.META_FILE):
+            if os.path.exists(self._path(name)):
+                os.remove(self._path(name))
+        self._entries.clear()
+        self._crcs.clear()
+        self._free_rows = []
+        self._pending = []
+        self._index_records = 0
+        self._dim = None
+        self._capacity = 0
+        self._next_row = 0
+
+    def clear(self):
+        """Remove todas as entradas e os arquivos do cache."""
+        with self._lock:
+            self._reset_files()
+
+    def close(self):
+        """Grava as alterações pendentes e libera o mapeamento em memória."""
+        with self._lock:
+            self.flush()
+            self._matrix = None
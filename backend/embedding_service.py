@@ -1,20 +1,14 @@
 import os
-import json
 import torch
-from transformers import AutoTokenizer, AutoModel
 import numpy as np
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Sequence
 import logging
 
-# Configurar logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("embedding_service.log"),
-        logging.StreamHandler()
-    ]
-)
+from backends_embedding import BUCKETS_PADRAO, carregar_backend, configurar_threads, largura_bucket
+from embedding_cache import EmbeddingCache
+from indice_vetorial import IndiceVetorial, normalizar
+from rastreamento import span
+
 logger = logging.getLogger("embedding_service")
 
 class EmbeddingService:
@@ -22,18 +16,36 @@ class EmbeddingService:
     Serviço otimizado para geração e gerenciamento de embeddings para o sistema de triagem.
     """
     
-    def __init__(self, model_name: str = "pucpr/biobertpt-clin", cache_dir: str = "./embedding_cache"):
+    def __init__(self, model_name: str = "pucpr/biobertpt-clin", cache_dir: str = "./embedding_cache",
+                 batch_size: int = 32, max_length: int = 512, cache_max_entries: int = 100_000,
+                 cache_max_bytes: Optional[int] = None, backend: str = "fp32", num_threads: Optional[int] = None,
+                 seq_buckets: Optional[Sequence[int]] = None):
         """
         Inicializa o serviço de embeddings.
         
         Args:
             model_name: Nome do modelo de embeddings a ser utilizado
             cache_dir: Diretório para cache de embeddings
+            batch_size: Tamanho padrão dos lotes em get_batch_embeddings
+            max_length: Número máximo de tokens por texto
+            cache_max_entries: Número máximo de embeddings mantidos no cache (LRU)
+            cache_max_bytes: Limite opcional do tamanho do cache em bytes
+            backend: Backend de inferência: "fp32", "int8" ou "torchscript" (ver backends_embedding)
+            num_threads: Threads do PyTorch para a inferência (padrão: definido pelo PyTorch)
+            seq_buckets: Larguras para as quais cada lote é arredondado (padrão: BUCKETS_PADRAO
+                no torchscript e a largura exata do lote nos demais backends; [] desativa)
         """
         self.model_name = model_name
         self.cache_dir = cache_dir
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.cache_max_entries = cache_max_entries
+        self.cache_max_bytes = cache_max_bytes
+        if seq_buckets is None:
+            seq_buckets = BUCKETS_PADRAO if backend == "torchscript" else ()
+        self.seq_buckets = tuple(sorted(b for b in seq_buckets if b <= max_length))
+        configurar_threads(num_threads)
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        self.embedding_cache = {}
         
         # Criar diretório de cache se não existir
         if not os.path.exists(cache_dir):
@@ -45,11 +57,10 @@ class EmbeddingService:
         
         # Inicializar modelo e tokenizer
         try:
-            logger.info(f"Carregando modelo {model_name}...")
-            self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-            self.model = AutoModel.from_pretrained(model_name)
-            self.model = self.model.to(self.device)
-            self.model.eval()  # Modo de avaliação para inferência
+            logger.info(f"Carregando modelo {model_name} (backend {backend})...")
+            self.tokenizer, self.model = carregar_backend(model_name, backend, self.device)
+            if backend == "int8":
+                self.device = torch.device("cpu")
             logger.info(f"Modelo carregado com sucesso no dispositivo: {self.device}")
         except Exception as e:
             logger.error(f"Erro ao carregar modelo: {str(e)}")
@@ -58,31 +69,39 @@ class EmbeddingService:
             raise
     
     def _load_cache(self):
-        """Carrega o cache de embeddings do disco."""
-        cache_file = os.path.join(self.cache_dir, "embedding_cache.json")
-        if os.path.exists(cache_file):
-            try:
-                with open(cache_file, 'r') as f:
-                    # O cache armazena apenas os hashes dos textos, não os textos completos
-                    self.embedding_cache = json.load(f)
-                logger.info(f"Cache de embeddings carregado: {len(self.embedding_cache)} entradas")
-            except Exception as e:
-                logger.error(f"Erro ao carregar cache: {str(e)}")
-                self.embedding_cache = {}
+        """Abre o cache binário de embeddings (migrando o antigo cache JSON, se existir)."""
+        self.embedding_cache = EmbeddingCache(
+            self.cache_dir,
+            max_entries=self.cache_max_entries,
+            max_bytes=self.cache_max_bytes
+        )
     
     def _save_cache(self):
-        """Salva o cache de embeddings no disco."""
-        cache_file = os.path.join(self.cache_dir, "embedding_cache.json")
-        try:
-            with open(cache_file, 'w') as f:
-                json.dump(self.embedding_cache, f)
-            logger.info(f"Cache de embeddings salvo: {len(self.embedding_cache)} entradas")
-        except Exception as e:
-            logger.error(f"Erro ao salvar cache: {str(e)}")
+        """Grava no disco as entradas do cache ainda pendentes."""
+        self.embedding_cache.flush()
+    
+    @property
+    def backend(self) -> Optional[str]:
+        """Backend de inferência em uso (pode ser fp32 se a exportação do grafo falhou)."""
+        return self.model.backend if self.model else None
+    
+    def get_info(self) -> Dict[str, Any]:
+        """Configuração de inferência ativa, para /api/status."""
+        return {
+            "modelo": self.model_name,
+            "backend": self.backend,
+            "dispositivo": str(self.device),
+            "threads": torch.get_num_threads(),
+            "max_length": self.max_length,
+            "seq_buckets": list(self.seq_buckets)
+        }
     
     def _get_text_hash(self, text: str) -> str:
         """Gera um hash para o texto para uso como chave de cache."""
         import hashlib
+        # Backends diferentes do fp32 têm entradas próprias no cache (as chaves do fp32 não mudam)
+        if self.backend not in (None, "fp32"):
+            text = f"{self.backend}\x00{text}"
         return hashlib.md5(text.encode()).hexdigest()
     
     def get_embedding(self, text: str, use_cache: bool = True) -> List[float]:
@@ -102,54 +121,129 @@ class EmbeddingService:
         
         # Verificar cache
         text_hash = self._get_text_hash(text)
-        if use_cache and text_hash in self.embedding_cache:
-            logger.debug(f"Embedding encontrado no cache para: {text[:30]}...")
-            return self.embedding_cache[text_hash]
+        if use_cache:
+            cached = self.embedding_cache.get(text_hash)
+            if cached is not None:
+                logger.debug("Embedding encontrado no cache para: %.30s...", text)
+                return cached
         
         # Gerar novo embedding
         try:
-            logger.debug(f"Gerando novo embedding para: {text[:30]}...")
-            inputs = self.tokenizer(
-                text, 
-                return_tensors="pt", 
-                padding=True, 
-                truncation=True, 
-                max_length=512
-            ).to(self.device)
-            
-            with torch.no_grad():
-                outputs = self.model(**inputs)
-                # Usar a representação do token [CLS] como embedding do texto
-                embedding = outputs.last_hidden_state[:, 0, :].cpu().numpy()[0].tolist()
+            logger.debug("Gerando novo embedding para: %.30s...", text)
+            embedding = self._encode([text])[0]
             
-            # Salvar no cache
+            # Salvar no cache (a gravação em disco é feita em blocos pelo próprio cache)
             if use_cache:
-                self.embedding_cache[text_hash] = embedding
-                # Salvar cache periodicamente (a cada 10 novos embeddings)
-                if len(self.embedding_cache) % 10 == 0:
-                    self._save_cache()
+                self.embedding_cache.put(text_hash, embedding)
             
             return embedding
         except Exception as e:
             logger.error(f"Erro ao gerar embedding: {str(e)}")
             raise
     
-    def get_batch_embeddings(self, texts: List[str], use_cache: bool = True) -> List[List[float]]:
+    def get_cached_embedding(self, text: str) -> Optional[List[float]]:
+        """
+        Retorna o embedding do texto se já estiver em cache, sem executar o modelo.
+
+        A ausência não é contada como miss: quem consulta antes (o EmbeddingBatcher)
+        segue para get_batch_embeddings, que conta o miss uma única vez.
+        """
+        return self.embedding_cache.get(self._get_text_hash(text), contar_ausencia=False)
+    
+    def get_batch_embeddings(self, texts: List[str], use_cache: bool = True,
+                             batch_size: Optional[int] = None) -> List[List[float]]:
         """
         Gera embeddings para uma lista de textos em lote.
         
+        Apenas os textos ausentes do cache são processados pelo modelo, em uma única
+        chamada ao tokenizer seguida de forward passes em lotes ordenados por
+        comprimento, o que reduz o desperdício com padding.
+        
         Args:
             texts: Lista de textos para gerar embeddings
             use_cache: Se deve utilizar cache
+            batch_size: Tamanho dos lotes do forward pass (padrão: self.batch_size)
             
         Returns:
-            Lista de embeddings
+            Lista de embeddings, na mesma ordem de `texts`
         """
-        embeddings = []
-        for text in texts:
-            embeddings.append(self.get_embedding(text, use_cache))
+        if not self.model or not self.tokenizer:
+            logger.error("Modelo não inicializado")
+            raise ValueError("Modelo não inicializado")
+        
+        hashes = [self._get_text_hash(text) for text in texts]
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+        
+        # Separar acertos de cache e textos pendentes (sem duplicatas)
+        pending: Dict[str, str] = {}
+        for i, (text, text_hash) in enumerate(zip(texts, hashes)):
+            cached = self.embedding_cache.get(text_hash) if use_cache else None
+            if cached is not None:
+                embeddings[i] = cached
+            else:
+                pending.setdefault(text_hash, text)
+        
+        if pending:
+            logger.info(f"Gerando {len(pending)} embeddings em lote ({len(texts) - len(pending)} do cache)")
+            try:
+                computed = dict(zip(pending.keys(), self._encode(list(pending.values()), batch_size)))
+            except Exception as e:
+                logger.error(f"Erro ao gerar embeddings em lote: {str(e)}")
+                raise
+            
+            for i, text_hash in enumerate(hashes):
+                if embeddings[i] is None:
+                    embeddings[i] = computed[text_hash]
+            
+            if use_cache:
+                for text_hash, embedding in computed.items():
+                    self.embedding_cache.put(text_hash, embedding)
+                self._save_cache()
+        
         return embeddings
     
+    def _encode(self, texts: List[str], batch_size: Optional[int] = None) -> List[List[float]]:
+        """
+        Executa o modelo sobre os textos, sem consultar o cache.
+        
+        Os textos são tokenizados de uma só vez, ordenados por número de tokens e
+        agrupados em lotes; cada lote recebe padding apenas até o maior texto do lote
+        (arredondado para o bucket seguinte, se houver buckets configurados).
+        
+        Args:
+            texts: Textos para gerar embeddings
+            batch_size: Tamanho máximo de cada lote
+            
+        Returns:
+            Embeddings (token [CLS]) na mesma ordem de `texts`
+        """
+        batch_size = batch_size or self.batch_size
+        with span("embedding.tokenizacao", textos=len(texts)):
+            encoded = self.tokenizer(texts, truncation=True, max_length=self.max_length)
+        order = sorted(range(len(texts)), key=lambda i: len(encoded["input_ids"][i]))
+        pad_id = self.tokenizer.pad_token_id or 0
+        
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        for start in range(0, len(order), batch_size):
+            chunk = order[start:start + batch_size]
+            width = largura_bucket(len(encoded["input_ids"][chunk[-1]]), self.seq_buckets)
+            inputs = {}
+            for key in encoded.keys():
+                fill = pad_id if key == "input_ids" else 0
+                inputs[key] = torch.tensor(
+                    [encoded[key][i] + [fill] * (width - len(encoded[key][i])) for i in chunk],
+                    device=self.device
+                )
+            
+            # Usar a representação do token [CLS] como embedding do texto
+            with span("embedding.forward", lote=len(chunk), largura=width):
+                cls = self.model(inputs)[:, 0, :].float().cpu().numpy()
+            
+            for row, i in enumerate(chunk):
+                results[i] = cls[row].tolist()
+        
+        return results
+    
     def compute_similarity(self, text1: str, text2: str) -> float:
         """
         Calcula a similaridade de cosseno entre dois textos.
@@ -161,18 +255,23 @@ class EmbeddingService:
         Returns:
             Valor de similaridade entre 0 e 1
         """
-        emb1 = self.get_embedding(text1)
-        emb2 = self.get_embedding(text2)
-        
-        # Converter para arrays numpy
-        emb1_np = np.array(emb1)
-        emb2_np = np.array(emb2)
+        emb1, emb2 = normalizar(self.get_batch_embeddings([text1, text2]))
+        return float(np.dot(emb1, emb2))
+    
+    def build_index(self, corpus: List[str]) -> IndiceVetorial:
+        """
+        Cria um índice vetorial com os embeddings do corpus (chave = posição no corpus).
         
-        # Calcular similaridade de cosseno
-        similarity = np.dot(emb1_np, emb2_np) / (np.linalg.norm(emb1_np) * np.linalg.norm(emb2_np))
-        return float(similarity)
+        O índice pode ser reaproveitado em várias chamadas de find_similar_texts,
+        e aceita novas entradas (adicionar) e remoções (remover).
+        """
+        indice = IndiceVetorial(capacidade_inicial=max(1, len(corpus)))
+        if corpus:
+            indice.adicionar(list(range(len(corpus))), self.get_batch_embeddings(corpus))
+        return indice
     
-    def find_similar_texts(self, query_text: str, corpus: List[str], top_k: int = 3) -> List[Dict[str, Any]]:
+    def find_similar_texts(self, query_text: str, corpus: List[str], top_k: int = 3,
+                           index: Optional[IndiceVetorial] = None) -> List[Dict[str, Any]]:
         """
         Encontra os textos mais similares a um texto de consulta em um corpus.
         
@@ -180,38 +279,25 @@ class EmbeddingService:
             query_text: Texto de consulta
             corpus: Lista de textos para comparar
             top_k: Número de resultados similares a retornar
+            index: Índice já criado por build_index(corpus), para não recalcular a matriz do corpus
             
         Returns:
             Lista de dicionários com texto e similaridade
         """
-        query_embedding = self.get_embedding(query_text)
-        
-        similarities = []
-        for i, text in enumerate(corpus):
-            text_embedding = self.get_embedding(text)
-            
-            # Converter para arrays numpy
-            query_np = np.array(query_embedding)
-            text_np = np.array(text_embedding)
-            
-            # Calcular similaridade de cosseno
-            similarity = np.dot(query_np, text_np) / (np.linalg.norm(query_np) * np.linalg.norm(text_np))
-            similarities.append({
-                "index": i,
-                "text": text,
-                "similarity": float(similarity)
-            })
-        
-        # Ordenar por similaridade (decrescente)
-        similarities.sort(key=lambda x: x["similarity"], reverse=True)
-        
-        # Retornar os top_k mais similares
-        return similarities[:top_k]
+        if index is None:
+            index = self.build_index(corpus)
+        return [
+            {"index": i, "text": corpus[i], "similarity": similarity}
+            for i, similarity in index.buscar(self.get_embedding(query_text), top_k)
+        ]
+    
+    def close(self):
+        """Grava o cache pendente e libera os arquivos mapeados em memória."""
+        self.embedding_cache.close()
     
     def clear_cache(self):
         """Limpa o cache de embeddings."""
-        self.embedding_cache = {}
-        self._save_cache()
+        self.embedding_cache.clear()
         logger.info("Cache de embeddings limpo")
 
 # Exemplo de uso
@@ -0,0 +1,265 @@
+"""
+Estatísticas de triagem mantidas incrementalmente em uma tabela de agregados.
+
+A tabela `estatisticas_triagem` guarda, por dimensão e chave, o número de
+triagens e de validações:
+
+    geral       ''                    totais do sistema
+    classificacao  'VERMELHO', ...    por cor do Protocolo de Manchester
+    dia         'AAAA-MM-DD'          por dia da triagem
+    hora        'AAAA-MM-DD HH'       por hora da triagem
+    validador   nome do validador     triagens validadas por cada profissional
+
+Os contadores são atualizados na mesma transação que insere, valida ou exclui a
+triagem, então os painéis leem poucas linhas em vez de varrer validacao_triagem.
+`reconstruir_estatisticas` recalcula tudo a partir da tabela base.
+
+Uso:
+    python estatisticas.py --verificar     # compara os agregados com a tabela base
+    python estatisticas.py --reconstruir   # recalcula os agregados
+"""
+import argparse
+import logging
+import sys
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("estatisticas")
+
+SEM_CLASSIFICACAO = "NAO_CLASSIFICADA"
+
+CRIAR_TABELA = '''
+CREATE TABLE IF NOT EXISTS estatisticas_triagem (
+    dimensao TEXT NOT NULL,
+    chave TEXT NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    validadas INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (dimensao, chave)
+)
+'''
+
+_INCREMENTAR = '''
+INSERT INTO estatisticas_triagem (dimensao, chave, total, validadas) VALUES (?, ?, ?, ?)
+ON CONFLICT (dimensao, chave) DO UPDATE SET
+    total = total + excluded.total,
+    validadas = validadas + excluded.validadas
+'''
+
+
+def _chave_classificacao(classificacao: Optional[str]) -> str:
+    return (classificacao or "").strip().upper() or SEM_CLASSIFICACAO
+
+
+def _chaves_triagem(data_hora: str, classificacao: Optional[str]) -> List[Tuple[str, str]]:
+    """Dimensões em que uma triagem é contada (exceto o validador)."""
+    return [("geral", ""), ("classificacao", _chave_classificacao(classificacao)),
+            ("dia", data_hora[:10]), ("hora", data_hora[:13])]
+
+
+def _incrementar(conn, chaves: List[Tuple[str, str]], total: int, validadas: int):
+    conn.executemany(_INCREMENTAR, [(dimensao, chave, total, validadas) for dimensao, chave in chaves])
+
+
+def registrar_triagem(conn, data_hora: str, classificacao: Optional[str]):
+    """Conta uma nova triagem pendente. Deve ser chamada na transação do INSERT."""
+    _incrementar(conn, _chaves_triagem(data_hora, classificacao), 1, 0)
+
+
+def registrar_importacao(conn, triagens: List[Tuple[str, Optional[str], bool, Optional[str]]]):
+    """
+    Conta um lote de triagens inseridas de uma vez (importação), com um único
+    incremento por chave. Deve ser chamada na transação dos INSERTs.
+
+    Args:
+        triagens: (data_hora, classificacao, validado, validado_por) de cada triagem inserida
+    """
+    contadores: Dict[Tuple[str, str], List[int]] = {}
+    for data_hora, classificacao, validado, validado_por in triagens:
+        chaves = _chaves_triagem(data_hora, classificacao)
+        if validado:
+            chaves.append(("validador", validado_por or ""))
+        for chave in chaves:
+            contador = contadores.setdefault(chave, [0, 0])
+            contador[0] += 1
+            contador[1] += 1 if validado else 0
+    conn.executemany(_INCREMENTAR, [(dimensao, chave, total, validadas)
+                                    for (dimensao, chave), (total, validadas) in contadores.items()])
+
+
+def registrar_validacao(conn, anterior: Optional[Tuple], validado_por: str):
+    """
+    Conta a validação de uma triagem. Deve ser chamada na transação do UPDATE.
+
+    Args:
+        conn: Conexão com a transação em andamento
+        anterior: Linha (data_hora, classificacao, validado, validado_por) lida antes do UPDATE,
+            ou None se a triagem não existe
+        validado_por: Novo validador
+    """
+    if anterior is None:
+        return
+    data_hora, classificacao, validado, validador_anterior = anterior
+    if validado:
+        # Revalidação: a triagem já foi contada como validada, só o validador pode mudar
+        if validador_anterior == validado_por:
+            return
+        _incrementar(conn, [("validador", validador_anterior or "")], -1, -1)
+    else:
+        _incrementar(conn, _chaves_triagem(data_hora, classificacao), 0, 1)
+    _incrementar(conn, [("validador", validado_por or "")], 1, 1)
+
+
+def registrar_reclassificacao(conn, anterior: Optional[Tuple], classificacao: Optional[str]):
+    """Move a triagem para a nova cor (ex.: após o reprocessamento de uma classificação provisória)."""
+    if anterior is None:
+        return
+    data_hora, classificacao_anterior, validado, _ = anterior
+    antiga, nova = _chave_classificacao(classificacao_anterior), _chave_classificacao(classificacao)
+    if antiga == nova:
+        return
+    validadas = 1 if validado else 0
+    _incrementar(conn, [("classificacao", antiga)], -1, -validadas)
+    _incrementar(conn, [("classificacao", nova)], 1, validadas)
+
+
+def registrar_exclusao(conn, anterior: Optional[Tuple]):
+    """Desconta uma triagem excluída (mesmo formato de `anterior` de registrar_validacao)."""
+    if anterior is None:
+        return
+    data_hora, classificacao, validado, validado_por = anterior
+    _incrementar(conn, _chaves_triagem(data_hora, classificacao), -1, -1 if validado else 0)
+    if validado:
+        _incrementar(conn, [("validador", validado_por or "")], -1, -1)
+
+
+def ler_triagem(conn, triagem_id: str) -> Optional[Tuple]:
+    """Lê os campos usados pelos agregados, no formato esperado por registrar_validacao."""
+    return conn.execute(
+        "SELECT data_hora, classificacao, validado, validado_por FROM validacao_triagem WHERE id = ?",
+        (triagem_id,)
+    ).fetchone()
+
+
+def reconstruir_estatisticas(conn):
+    """Recalcula todos os agregados a partir de validacao_triagem (na transação do chamador)."""
+    conn.execute(CRIAR_TABELA)
+    conn.execute("DELETE FROM estatisticas_triagem")
+    conn.execute('''
+        INSERT INTO estatisticas_triagem (dimensao, chave, total, validadas)
+        SELECT 'geral', '', COUNT(*), COALESCE(SUM(validado = 1), 0) FROM validacao_triagem
+    ''')
+    conn.execute(f'''
+        INSERT INTO estatisticas_triagem (dimensao, chave, total, validadas)
+        SELECT 'classificacao', COALESCE(NULLIF(UPPER(TRIM(classificacao)), ''), '{SEM_CLASSIFICACAO}'),
+               COUNT(*), SUM(validado = 1)
+        FROM validacao_triagem GROUP BY 2
+    ''')
+    conn.execute('''
+        INSERT INTO estatisticas_triagem (dimensao, chave, total, validadas)
+        SELECT 'dia', substr(data_hora, 1, 10), COUNT(*), SUM(validado = 1) FROM validacao_triagem GROUP BY 2
+    ''')
+    conn.execute('''
+        INSERT INTO estatisticas_triagem (dimensao, chave, total, validadas)
+        SELECT 'hora', substr(data_hora, 1, 13), COUNT(*), SUM(validado = 1) FROM validacao_triagem GROUP BY 2
+    ''')
+    conn.execute('''
+        INSERT INTO estatisticas_triagem (dimensao, chave, total, validadas)
+        SELECT 'validador', IFNULL(validado_por, ''), COUNT(*), COUNT(*)
+        FROM validacao_triagem WHERE validado = 1 GROUP BY 2
+    ''')
+
+
+def _linhas(conn, dimensao: str, limite: Optional[int] = None) -> Dict[str, Dict[str, int]]:
+    query = "SELECT chave, total, validadas FROM estatisticas_triagem WHERE dimensao = ? AND total != 0 ORDER BY chave DESC"
+    params: List[Any] = [dimensao]
+    if limite is not None:
+        query += " LIMIT ?"
+        params.append(limite)
+    return {chave: {"total": total, "validadas": validadas}
+            for chave, total, validadas in conn.execute(query, params)}
+
+
+def obter_estatisticas(conn, dias: int = 30, horas: int = 48) -> Dict[str, Any]:
+    """
+    Lê os agregados: totais, quebras por cor, dia, hora e validador, e idade do backlog.
+
+    Args:
+        conn: Conexão com o banco
+        dias: Número de dias mais recentes na quebra por dia
+        horas: Número de horas mais recentes na quebra por hora
+    """
+    geral = _linhas(conn, "geral").get("", {"total": 0, "validadas": 0})
+    # MIN sobre o índice (validado, data_hora) lê uma única entrada
+    mais_antiga = conn.execute("SELECT MIN(data_hora) FROM validacao_triagem WHERE validado = 0").fetchone()[0]
+    idade = None
+    if mais_antiga:
+        idade = int((datetime.now() - datetime.strptime(mais_antiga, "%Y-%m-%d %H:%M:%S")).total_seconds())
+
+    return {
+        "total": geral["total"],
+        "validadas": geral["validadas"],
+        "pendentes": geral["total"] - geral["validadas"],
+        "por_classificacao": _linhas(conn, "classificacao"),
+        "por_dia": _linhas(conn, "dia", dias),
+        "por_hora": _linhas(conn, "hora", horas),
+        "por_validador": {chave: valores["validadas"] for chave, valores in _linhas(conn, "validador").items()},
+        "backlog": {"pendente_mais_antiga": mais_antiga, "idade_segundos": idade}
+    }
+
+
+def verificar_estatisticas() -> List[str]:
+    """
+    Compara os agregados mantidos incrementalmente com um recálculo a partir da tabela base.
+
+    Returns:
+        Lista de divergências (vazia se os agregados estão consistentes)
+    """
+    from repositorio import conexao
+
+    with conexao() as conn:
+        atuais = {(d, c): (t, v) for d, c, t, v in
+                  conn.execute("SELECT dimensao, chave, total, validadas FROM estatisticas_triagem WHERE total != 0")}
+        # Recalcula dentro de uma transação desfeita em seguida, sem alterar o banco
+        conn.execute("BEGIN")
+        try:
+            reconstruir_estatisticas(conn)
+            esperados = {(d, c): (t, v) for d, c, t, v in
+                         conn.execute("SELECT dimensao, chave, total, validadas FROM estatisticas_triagem WHERE total != 0")}
+        finally:
+            conn.rollback()
+
+    divergencias = []
+    for chave in sorted(set(atuais) | set(esperados)):
+        if atuais.get(chave) != esperados.get(chave):
+            divergencias.append(f"{chave[0]}={chave[1]!r}: agregado {atuais.get(chave)} != base {esperados.get(chave)}")
+    return divergencias
+
+
+def main():
+    from repositorio import transacao
+    from migracoes import aplicar_migracoes
+
+    parser = argparse.ArgumentParser(description="Verifica ou reconstrói as estatísticas de triagem")
+    parser.add_argument("--reconstruir", action="store_true", help="Recalcula os agregados a partir da tabela base")
+    parser.add_argument("--verificar", action="store_true", help="Compara os agregados com a tabela base")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    aplicar_migracoes()
+
+    if args.reconstruir:
+        with transacao() as conn:
+            reconstruir_estatisticas(conn)
+        print("Estatísticas reconstruídas")
+
+    if args.verificar or not args.reconstruir:
+        divergencias = verificar_estatisticas()
+        for divergencia in divergencias:
+            print(f"DIVERGÊNCIA - {divergencia}")
+        if divergencias:
+            sys.exit(1)
+        print("Estatísticas consistentes com a tabela base")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,423 @@
+"""
+Importação em massa de triagens históricas (CSV ou JSONL) para validacao_triagem
+e para a coleção do ChromaDB, sem passar pelo modelo.
+
+O arquivo é lido em streaming, registro a registro, e gravado em transações de
+`lote` linhas. Os casos validados de cada transação são indexados em seguida,
+com embeddings gerados em lotes pelo EmbeddingService e upsert em blocos na
+coleção (a mesma rotina da sincronização de casos validados).
+
+Campos de cada registro (cabeçalho do CSV ou chaves do JSON):
+
+    sintomas         obrigatório
+    data_hora        obrigatório (AAAA-MM-DD HH:MM:SS, ISO 8601 ou AAAA-MM-DD)
+    classificacao    VERMELHO, LARANJA, AMARELO, VERDE ou AZUL (opcional)
+    justificativa, condutas, resposta, feedback, validado_por, data_validacao
+    validado         0/1, true/false (padrão: o da importação)
+    id               opcional; sem ele, o id é derivado do conteúdo do registro
+
+Como o id é determinístico, reimportar o mesmo arquivo não duplica triagens. A
+linha do último lote gravado fica em um arquivo de checkpoint
+(<arquivo>.importacao.json), e uma importação interrompida recomeça dali.
+
+Uso:
+    python importacao_triagens.py historico.csv
+    python importacao_triagens.py historico.jsonl --lote 10000 --sem-indexacao
+"""
+import argparse
+import asyncio
+import codecs
+import csv
+import json
+import logging
+import os
+import queue
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import estatisticas
+from indexacao_casos import indexar_casos
+from repositorio import transacao
+
+logger = logging.getLogger("importacao_triagens")
+
+FORMATOS = ("csv", "jsonl")
+CLASSIFICACOES = ("VERMELHO", "LARANJA", "AMARELO", "VERDE", "AZUL")
+# Namespace dos ids derivados do conteúdo (uuid5)
+NAMESPACE_IMPORTACAO = uuid.UUID("5b0c3f4e-6a51-4c1e-9a43-2f7d1e0b8c21")
+FORMATOS_DATA = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M",
+                 "%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%Y-%m-%d", "%d/%m/%Y")
+MAX_ERROS_REGISTRADOS = 20
+
+INSERIR = '''
+INSERT INTO validacao_triagem (id, sintomas, resposta, data_hora, validado, feedback, validado_por,
+                               data_validacao, classificacao, justificativa, condutas)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+
+class RegistroInvalido(ValueError):
+    pass
+
+
+@dataclass
+class RelatorioImportacao:
+    linhas_lidas: int = 0
+    linhas_puladas: int = 0
+    inseridas: int = 0
+    ja_existentes: int = 0
+    invalidas: int = 0
+    indexadas: int = 0
+    duracao_s: float = 0.0
+    erros: List[str] = field(default_factory=list)
+
+    @property
+    def linhas_por_segundo(self) -> float:
+        return (self.linhas_lidas - self.linhas_puladas) / self.duracao_s if self.duracao_s else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), "duracao_s": round(self.duracao_s, 2),
+                "linhas_por_segundo": round(self.linhas_por_segundo, 1)}
+
+
+def detectar_formato(caminho: str) -> str:
+    extensao = os.path.splitext(caminho)[1].lower().lstrip(".")
+    if extensao in ("jsonl", "ndjson", "json"):
+        return "jsonl"
+    if extensao in ("csv", "txt"):
+        return "csv"
+    raise ValueError(f"Formato não reconhecido pela extensão: {caminho} (use --formato)")
+
+
+def ler_registros(linhas: Iterable[str], formato: str) -> Iterator[Optional[Dict[str, Any]]]:
+    """
+    Registros do arquivo, um por vez. Linhas JSON malformadas viram None (contadas como inválidas).
+
+    Args:
+        linhas: Linhas de texto (com a quebra de linha, como as de um arquivo aberto com newline="")
+        formato: "csv" ou "jsonl"
+    """
+    if formato == "csv":
+        yield from csv.DictReader(linhas)
+    elif formato == "jsonl":
+        for linha in linhas:
+            if not linha.strip():
+                continue
+            try:
+                registro = json.loads(linha)
+            except json.JSONDecodeError:
+                yield None
+                continue
+            yield registro if isinstance(registro, dict) else None
+    else:
+        raise ValueError(f"Formato inválido: {formato} (opções: {', '.join(FORMATOS)})")
+
+
+def _texto(registro: Dict[str, Any], campo: str) -> str:
+    valor = registro.get(campo)
+    return "" if valor is None else str(valor).strip()
+
+
+def _normalizar_data(valor: str, campo: str) -> str:
+    for formato in FORMATOS_DATA:
+        try:
+            return datetime.strptime(valor, formato).strftime("%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            continue
+    raise RegistroInvalido(f"{campo} inválida: {valor!r}")
+
+
+def _booleano(valor: str, padrao: bool) -> bool:
+    if not valor:
+        return padrao
+    return valor.lower() in ("1", "true", "sim", "s", "yes", "y", "t")
+
+
+def _montar_resposta(classificacao: str, justificativa: str, condutas: str) -> str:
+    """Resposta no formato do modelo, para que parse_response funcione nos registros importados."""
+    return (f"CLASSIFICAÇÃO: {classificacao}\n\nANÁLISE CLÍNICA:\n{justificativa}\n\n"
+            f"CONDUTAS RECOMENDADAS:\n{condutas}")
+
+
+def converter_registro(registro: Optional[Dict[str, Any]], validado_padrao: bool = True,
+                       validado_por_padrao: str = "importacao") -> Tuple:
+    """
+    Converte um registro do arquivo na tupla de INSERIR.
+
+    Raises:
+        RegistroInvalido: Se faltar um campo obrigatório ou algum valor não puder ser interpretado
+    """
+    if registro is None:
+        raise RegistroInvalido("linha malformada")
+    sintomas = _texto(registro, "sintomas")
+    if not sintomas:
+        raise RegistroInvalido("sintomas ausentes")
+    if not _texto(registro, "data_hora"):
+        raise RegistroInvalido("data_hora ausente")
+    data_hora = _normalizar_data(_texto(registro, "data_hora"), "data_hora")
+
+    classificacao = _texto(registro, "classificacao").upper()
+    if classificacao and classificacao not in CLASSIFICACOES:
+        raise RegistroInvalido(f"classificação inválida: {classificacao!r}")
+    justificativa = _texto(registro, "justificativa")
+    condutas = _texto(registro, "condutas")
+    resposta = _texto(registro, "resposta") or _montar_resposta(classificacao, justificativa, condutas)
+
+    validado = _booleano(_texto(registro, "validado"), validado_padrao)
+    validado_por = data_validacao = None
+    if validado:
+        validado_por = _texto(registro, "validado_por") or validado_por_padrao
+        data_validacao = (_normalizar_data(_texto(registro, "data_validacao"), "data_validacao")
+                          if _texto(registro, "data_validacao") else data_hora)
+
+    triagem_id = _texto(registro, "id") or str(uuid.uuid5(
+        NAMESPACE_IMPORTACAO, "\x00".join((sintomas, data_hora, classificacao, resposta))))
+    return (triagem_id, sintomas, resposta, data_hora, int(validado), _texto(registro, "feedback") or None,
+            validado_por, data_validacao, classificacao, justificativa, condutas)
+
+
+class ImportadorTriagens:
+    def __init__(self, embedding_service=None, collection=None, lote: int = 5000, lote_embeddings: int = 64,
+                 validado_padrao: bool = True, validado_por_padrao: str = "importacao"):
+        """
+        Args:
+            embedding_service: EmbeddingService para indexar os casos validados (None: não indexa;
+                a sincronização na inicialização da API indexa depois)
+            collection: Coleção do ChromaDB
+            lote: Linhas por transação no banco
+            lote_embeddings: Casos por lote de embedding/upsert
+            validado_padrao: Se os registros sem a coluna `validado` entram como validados
+            validado_por_padrao: Validador dos registros validados sem `validado_por`
+        """
+        self.embedding_service = embedding_service
+        self.collection = collection
+        self.lote = lote
+        self.lote_embeddings = lote_embeddings
+        self.validado_padrao = validado_padrao
+        self.validado_por_padrao = validado_por_padrao
+
+    @property
+    def indexa(self) -> bool:
+        return self.embedding_service is not None and self.collection is not None
+
+    def _gravar_lote(self, linhas: List[Tuple], relatorio: RelatorioImportacao):
+        """Insere as triagens novas do lote em uma transação e indexa as validadas."""
+        # Chaves repetidas no próprio lote ficam com a primeira ocorrência
+        por_id = {}
+        for linha in linhas:
+            por_id.setdefault(linha[0], linha)
+        ids = list(por_id)
+        with transacao() as conn:
+            existentes = set()
+            for inicio in range(0, len(ids), 500):
+                bloco = ids[inicio:inicio + 500]
+                existentes.update(row[0] for row in conn.execute(
+                    f"SELECT id FROM validacao_triagem WHERE id IN ({','.join('?' * len(bloco))})", bloco))
+            novas = [linha for triagem_id, linha in por_id.items() if triagem_id not in existentes]
+            conn.executemany(INSERIR, novas)
+            estatisticas.registrar_importacao(conn, [(l[3], l[8], bool(l[4]), l[6]) for l in novas])
+        relatorio.inseridas += len(novas)
+        relatorio.ja_existentes += len(linhas) - len(novas)
+
+        validadas = [(l[0], l[1], l[2], l[8], l[7] or "") for l in novas if l[4]]
+        if validadas and self.indexa:
+            relatorio.indexadas += indexar_casos(self.collection, self.embedding_service, validadas,
+                                                 self.lote_embeddings)
+
+    def importar(self, registros: Iterable[Optional[Dict[str, Any]]], pular: int = 0,
+                 ao_gravar: Optional[Callable[[RelatorioImportacao], None]] = None) -> RelatorioImportacao:
+        """
+        Importa os registros em lotes.
+
+        Args:
+            registros: Registros de ler_registros
+            pular: Registros iniciais já importados (retomada), lidos mas não processados
+            ao_gravar: Chamada após cada lote gravado, com o relatório parcial (checkpoint)
+        """
+        relatorio = RelatorioImportacao(linhas_lidas=pular, linhas_puladas=pular)
+        inicio = time.perf_counter()
+        pendentes: List[Tuple] = []
+        for numero, registro in enumerate(registros, start=1):
+            if numero <= pular:
+                continue
+            relatorio.linhas_lidas = numero
+            try:
+                pendentes.append(converter_registro(registro, self.validado_padrao, self.validado_por_padrao))
+            except RegistroInvalido as e:
+                relatorio.invalidas += 1
+                if len(relatorio.erros) < MAX_ERROS_REGISTRADOS:
+                    relatorio.erros.append(f"registro {numero}: {e}")
+            if len(pendentes) >= self.lote:
+                self._gravar_lote(pendentes, relatorio)
+                pendentes = []
+                relatorio.duracao_s = time.perf_counter() - inicio
+                logger.info(f"Importação: {relatorio.linhas_lidas} registros, "
+                            f"{relatorio.linhas_por_segundo:.0f} registros/s")
+                if ao_gravar is not None:
+                    ao_gravar(relatorio)
+
+        if pendentes:
+            self._gravar_lote(pendentes, relatorio)
+        relatorio.duracao_s = time.perf_counter() - inicio
+        if ao_gravar is not None:
+            ao_gravar(relatorio)
+        logger.info(f"Importação concluída: {relatorio.to_dict()}")
+        return relatorio
+
+
+def caminho_checkpoint(caminho: str) -> str:
+    return caminho + ".importacao.json"
+
+
+def importar_arquivo(caminho: str, importador: ImportadorTriagens, formato: Optional[str] = None,
+                     recomecar: bool = False) -> RelatorioImportacao:
+    """
+    Importa um arquivo, retomando do checkpoint de uma importação anterior interrompida.
+
+    O checkpoint só é usado se o tamanho do arquivo não mudou; ao terminar, ele é removido.
+    """
+    formato = formato or detectar_formato(caminho)
+    checkpoint = caminho_checkpoint(caminho)
+    tamanho = os.path.getsize(caminho)
+    pular = 0
+    if not recomecar and os.path.exists(checkpoint):
+        with open(checkpoint, "r", encoding="utf-8") as f:
+            anterior = json.load(f)
+        if anterior.get("tamanho") == tamanho:
+            pular = anterior["linhas_gravadas"]
+            logger.info(f"Retomando importação de {caminho} a partir do registro {pular + 1}")
+        else:
+            logger.warning("Checkpoint descartado: o arquivo mudou desde a importação anterior")
+
+    def salvar_checkpoint(relatorio: RelatorioImportacao):
+        temporario = checkpoint + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump({"tamanho": tamanho, "linhas_gravadas": relatorio.linhas_lidas,
+                       "atualizado_em": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}, f)
+        os.replace(temporario, checkpoint)
+
+    with open(caminho, "r", encoding="utf-8-sig", newline="") as f:
+        relatorio = importador.importar(ler_registros(f, formato), pular=pular, ao_gravar=salvar_checkpoint)
+    os.remove(checkpoint)
+    return relatorio
+
+
+class ImportacaoInterrompida(Exception):
+    """O corpo da requisição terminou antes do fim (ex.: o cliente desconectou)."""
+
+
+# Marcador posto na fila quando a leitura do corpo falha; None marca o fim normal
+_INTERROMPIDA = object()
+
+
+def _linhas_da_fila(fila: "queue.Queue[Any]") -> Iterator[str]:
+    while True:
+        bloco = fila.get()
+        if bloco is None:
+            return
+        if bloco is _INTERROMPIDA:
+            raise ImportacaoInterrompida("Corpo da requisição interrompido")
+        yield from bloco
+
+
+async def importar_corpo(partes: AsyncIterator[bytes], formato: str, importador: ImportadorTriagens,
+                         pular: int = 0) -> RelatorioImportacao:
+    """
+    Importa um corpo de requisição recebido em partes (ex.: Request.stream()).
+
+    As partes são decodificadas e divididas em linhas no loop de eventos e passadas,
+    por uma fila limitada, à importação que roda em uma thread: o corpo nunca fica
+    inteiro na memória, e a leitura da rede espera quando o banco ou os embeddings
+    ficam para trás.
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato inválido: {formato} (opções: {', '.join(FORMATOS)})")
+    fila: "queue.Queue[Any]" = queue.Queue(maxsize=64)
+    tarefa = asyncio.ensure_future(asyncio.to_thread(
+        importador.importar, ler_registros(_linhas_da_fila(fila), formato), pular))
+
+    async def enviar(bloco: Any) -> bool:
+        # Não bloqueia o loop com a fila cheia; desiste se a importação terminou (erro)
+        while not tarefa.done():
+            try:
+                fila.put_nowait(bloco)
+                return True
+            except queue.Full:
+                await asyncio.sleep(0.01)
+        return False
+
+    decodificador = codecs.getincrementaldecoder("utf-8-sig")()
+    resto = ""
+    completo = False
+    try:
+        async for parte in partes:
+            texto = resto + decodificador.decode(parte)
+            corte = texto.rfind("\n") + 1
+            resto = texto[corte:]
+            # Divide só em "\n" (str.splitlines também quebraria em U+2028 dentro de strings JSON)
+            if corte and not await enviar([linha + "\n" for linha in texto[:corte - 1].split("\n")]):
+                break
+        resto += decodificador.decode(b"", final=True)
+        if resto:
+            await enviar([resto])
+        completo = True
+    finally:
+        # O marcador final vai sempre: sem ele, a thread da importação (do executor padrão,
+        # compartilhado com os embeddings) ficaria presa em fila.get() se o cliente desconectar
+        await enviar(None if completo else _INTERROMPIDA)
+        if not completo:
+            # Os lotes já gravados ficam; a importação para no próximo registro lido
+            try:
+                await tarefa
+            except Exception:
+                pass
+    return await tarefa
+
+
+def _carregar_indexacao():
+    import chromadb
+    from embedding_service import EmbeddingService
+
+    collection = chromadb.PersistentClient(path="./chroma_db").get_or_create_collection(name="triagem_hci")
+    return EmbeddingService(), collection
+
+
+def main():
+    from migracoes import aplicar_migracoes
+
+    parser = argparse.ArgumentParser(description="Importa triagens históricas de um arquivo CSV ou JSONL")
+    parser.add_argument("arquivo")
+    parser.add_argument("--formato", choices=FORMATOS, help="Padrão: detectado pela extensão")
+    parser.add_argument("--lote", type=int, default=5000, help="Registros por transação")
+    parser.add_argument("--lote-embeddings", type=int, default=64, help="Casos por lote de embedding/upsert")
+    parser.add_argument("--nao-validadas", action="store_true",
+                        help="Registros sem a coluna `validado` entram como pendentes de validação")
+    parser.add_argument("--validado-por", default="importacao", help="Validador dos registros validados sem `validado_por`")
+    parser.add_argument("--sem-indexacao", action="store_true",
+                        help="Não gera embeddings (os casos são indexados na próxima inicialização da API)")
+    parser.add_argument("--recomecar", action="store_true", help="Ignora o checkpoint de uma importação anterior")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    aplicar_migracoes()
+
+    embedding_service = collection = None
+    if not args.sem_indexacao:
+        embedding_service, collection = _carregar_indexacao()
+    importador = ImportadorTriagens(embedding_service, collection, lote=args.lote,
+                                    lote_embeddings=args.lote_embeddings,
+                                    validado_padrao=not args.nao_validadas,
+                                    validado_por_padrao=args.validado_por)
+    try:
+        relatorio = importar_arquivo(args.arquivo, importador, args.formato, args.recomecar)
+    finally:
+        if embedding_service is not None:
+            embedding_service.close()
+    print(json.dumps(relatorio.to_dict(), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Sincronização incremental dos casos validados com a coleção do ChromaDB.
+
+Cada triagem validada é indexada com o seu próprio UUID como id no ChromaDB.
+A coluna `data_indexacao` guarda o valor de `data_validacao` que foi indexado,
+funcionando como marca d'água por linha: só são (re)indexadas as triagens
+validadas ainda não indexadas ou validadas novamente desde a última indexação.
+
+Nenhuma conexão do pool fica emprestada durante o embedding e o upsert, que
+levam segundos por lote na CPU: os casos pendentes são lidos e a conexão é
+devolvida, e a marca d'água é gravada depois em uma transação curta.
+"""
+import logging
+from typing import List, Optional, Tuple
+
+from repositorio import conexao, transacao
+
+logger = logging.getLogger("indexacao_casos")
+
+LEGACY_ID_PREFIX = "validated_case_"
+
+QUERY_PENDENTES = """
+    SELECT id, sintomas, resposta, classificacao, IFNULL(data_validacao, '')
+    FROM validacao_triagem
+    WHERE validado = 1 AND (data_indexacao IS NULL OR data_indexacao != IFNULL(data_validacao, ''))
+"""
+
+
+def _metadados(sintomas: str, resposta: str, classificacao: Optional[str]) -> dict:
+    return {"content": sintomas, "resposta": resposta, "classificacao": classificacao or ""}
+
+
+def _indexar_lote(collection, embedding_service, casos: List[Tuple]) -> int:
+    """Gera os embeddings do lote, faz upsert na coleção e registra a indexação."""
+    embeddings = embedding_service.get_batch_embeddings([caso[1] for caso in casos])
+    collection.upsert(
+        ids=[caso[0] for caso in casos],
+        embeddings=embeddings,
+        metadatas=[_metadados(caso[1], caso[2], caso[3]) for caso in casos]
+    )
+    # Só marca como indexada se a triagem não foi revalidada durante o processamento
+    with transacao() as conn:
+        conn.executemany(
+            "UPDATE validacao_triagem SET data_indexacao = ? WHERE id = ? AND IFNULL(data_validacao, '') = ?",
+            [(caso[4], caso[0], caso[4]) for caso in casos]
+        )
+    return len(casos)
+
+
+def indexar_casos(collection, embedding_service, casos: List[Tuple], batch_size: int = 64) -> int:
+    """
+    Indexa casos já lidos do banco, em lotes de embedding/upsert.
+
+    Args:
+        casos: Tuplas no formato de QUERY_PENDENTES (id, sintomas, resposta, classificacao, data_validacao)
+    """
+    total = 0
+    for inicio in range(0, len(casos), batch_size):
+        total += _indexar_lote(collection, embedding_service, casos[inicio:inicio + batch_size])
+    return total
+
+
+def remover_ids_legados(collection) -> int:
+    """Remove da coleção os casos inseridos com ids posicionais (validated_case_{i})."""
+    ids = [i for i in collection.get(include=[])["ids"] if i.startswith(LEGACY_ID_PREFIX)]
+    if ids:
+        collection.delete(ids=ids)
+        logger.info(f"Ids posicionais legados removidos do ChromaDB: {len(ids)}")
+    return len(ids)
+
+
+def sincronizar_casos_validados(collection, embedding_service, batch_size: int = 64) -> int:
+    """
+    Indexa no ChromaDB apenas as triagens validadas novas ou alteradas.
+
+    Args:
+        collection: Coleção do ChromaDB
+        embedding_service: Instância de EmbeddingService
+        batch_size: Número de casos por lote de embedding/upsert
+
+    Returns:
+        Número de casos indexados
+    """
+    with conexao() as conn:
+        ja_indexados = conn.execute(
+            "SELECT COUNT(*) FROM validacao_triagem WHERE data_indexacao IS NOT NULL"
+        ).fetchone()[0]
+    # Primeira sincronização: descartar os ids posicionais da versão anterior
+    if ja_indexados == 0:
+        remover_ids_legados(collection)
+
+    total = 0
+    while True:
+        with conexao() as conn:
+            casos = conn.execute(QUERY_PENDENTES + " ORDER BY data_validacao LIMIT ?", (batch_size,)).fetchall()
+        if not casos:
+            break
+        indexados = _indexar_lote(collection, embedding_service, casos)
+        total += indexados
+        if indexados < batch_size:
+            break
+
+    logger.info(f"Sincronização de casos validados concluída: {total} casos indexados")
+    return total
+
+
+def indexar_caso(collection, embedding_service, triagem_id: str) -> bool:
+    """
+    Indexa imediatamente uma triagem recém-validada.
+
+    Returns:
+        True se a triagem foi indexada, False se não está validada ou já estava indexada
+    """
+    with conexao() as conn:
+        casos = conn.execute(QUERY_PENDENTES + " AND id = ?", (triagem_id,)).fetchall()
+    if not casos:
+        return False
+    _indexar_lote(collection, embedding_service, casos)
+    logger.info(f"Caso validado indexado no ChromaDB: id={triagem_id}")
+    return True
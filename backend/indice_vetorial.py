@@ -0,0 +1,158 @@
+"""
+Índice vetorial em memória para busca dos vizinhos mais próximos por similaridade de cosseno.
+
+Os vetores são normalizados (norma L2 = 1) na inserção e guardados em uma única
+matriz float32 contígua, então a similaridade de cosseno de uma consulta contra
+todo o índice é um único produto matriz-vetor, e os k melhores são separados com
+`argpartition` (O(n)) antes de ordenar só esses k.
+
+A matriz cresce por duplicação da capacidade; a remoção move a última linha para
+a posição removida, sem deslocar as demais. Não é thread-safe: quem compartilha
+um índice entre threads deve serializar as escritas.
+"""
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def normalizar(vetores) -> np.ndarray:
+    """Converte para float32 e normaliza cada linha (vetores nulos permanecem nulos)."""
+    matriz = np.array(vetores, dtype=np.float32, ndmin=2)
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    np.divide(matriz, normas, out=matriz, where=normas > 0)
+    return matriz
+
+
+class IndiceVetorial:
+    def __init__(self, dimensao: Optional[int] = None, capacidade_inicial: int = 1024):
+        """
+        Args:
+            dimensao: Dimensão dos vetores (padrão: definida pela primeira inserção)
+            capacidade_inicial: Número de linhas reservadas inicialmente
+        """
+        self.dimensao = dimensao
+        self._capacidade_inicial = max(1, capacidade_inicial)
+        self._matriz: Optional[np.ndarray] = None
+        self._chaves: List[Hashable] = []
+        self._posicoes: Dict[Hashable, int] = {}
+        if dimensao is not None:
+            self._matriz = np.empty((self._capacidade_inicial, dimensao), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self._chaves)
+
+    def __contains__(self, chave: Hashable) -> bool:
+        return chave in self._posicoes
+
+    @property
+    def matriz(self) -> np.ndarray:
+        """Vetores normalizados das entradas, na ordem de `chaves` (visão, sem cópia)."""
+        if self._matriz is None:
+            return np.empty((0, self.dimensao or 0), dtype=np.float32)
+        return self._matriz[:len(self._chaves)]
+
+    @property
+    def chaves(self) -> List[Hashable]:
+        return list(self._chaves)
+
+    def _reservar(self, total: int):
+        if self._matriz is None:
+            self._matriz = np.empty((max(self._capacidade_inicial, total), self.dimensao), dtype=np.float32)
+        elif total > len(self._matriz):
+            capacidade = len(self._matriz)
+            while capacidade < total:
+                capacidade *= 2
+            nova = np.empty((capacidade, self.dimensao), dtype=np.float32)
+            nova[:len(self._chaves)] = self._matriz[:len(self._chaves)]
+            self._matriz = nova
+
+    def adicionar(self, chaves: Sequence[Hashable], vetores) -> None:
+        """
+        Insere (ou substitui, se a chave já existe) os vetores no índice.
+
+        Args:
+            chaves: Identificadores das entradas, um por vetor
+            vetores: Matriz (n, dimensao) ou sequência de vetores
+        """
+        matriz = normalizar(vetores)
+        if len(chaves) != len(matriz):
+            raise ValueError(f"{len(chaves)} chaves para {len(matriz)} vetores")
+        if self.dimensao is None:
+            self.dimensao = matriz.shape[1]
+        elif matriz.shape[1] != self.dimensao:
+            raise ValueError(f"Dimensão {matriz.shape[1]} diferente da do índice ({self.dimensao})")
+
+        # Chaves repetidas no mesmo lote ficam com o último vetor
+        ultimas = {chave: linha for linha, chave in enumerate(chaves)}
+        self._reservar(len(self._chaves) + sum(1 for chave in ultimas if chave not in self._posicoes))
+        posicoes = []
+        for chave in ultimas:
+            posicao = self._posicoes.get(chave)
+            if posicao is None:
+                posicao = len(self._chaves)
+                self._chaves.append(chave)
+                self._posicoes[chave] = posicao
+            posicoes.append(posicao)
+        self._matriz[posicoes] = matriz[list(ultimas.values())]
+
+    def remover(self, chave: Hashable) -> bool:
+        """Remove a entrada, movendo a última linha para o seu lugar. Retorna False se não existe."""
+        posicao = self._posicoes.pop(chave, None)
+        if posicao is None:
+            return False
+        ultima = len(self._chaves) - 1
+        if posicao != ultima:
+            self._matriz[posicao] = self._matriz[ultima]
+            chave_movida = self._chaves[ultima]
+            self._chaves[posicao] = chave_movida
+            self._posicoes[chave_movida] = posicao
+        self._chaves.pop()
+        return True
+
+    def limpar(self):
+        self._chaves.clear()
+        self._posicoes.clear()
+
+    def similaridades(self, consulta) -> np.ndarray:
+        """Similaridade de cosseno da consulta com todas as entradas, na ordem de `chaves`."""
+        return self.matriz @ normalizar(consulta)[0]
+
+    @staticmethod
+    def _melhores(similaridades: np.ndarray, k: int) -> np.ndarray:
+        """Posições das k maiores similaridades, em ordem decrescente."""
+        if k < len(similaridades):
+            candidatas = np.argpartition(-similaridades, k - 1)[:k]
+        else:
+            candidatas = np.arange(len(similaridades))
+        return candidatas[np.argsort(-similaridades[candidatas], kind="stable")]
+
+    def buscar(self, consulta, k: int = 3) -> List[Tuple[Hashable, float]]:
+        """
+        As k entradas mais similares à consulta.
+
+        Returns:
+            Lista de (chave, similaridade de cosseno), da mais para a menos similar
+        """
+        if not self._chaves or k <= 0:
+            return []
+        similaridades = self.similaridades(consulta)
+        return [(self._chaves[i], float(similaridades[i])) for i in self._melhores(similaridades, k)]
+
+    def buscar_lote(self, consultas, k: int = 3) -> List[List[Tuple[Hashable, float]]]:
+        """Como `buscar`, para várias consultas de uma vez (um único produto matriz-matriz)."""
+        consultas = normalizar(consultas)
+        if not self._chaves or k <= 0:
+            return [[] for _ in range(len(consultas))]
+        similaridades = consultas @ self.matriz.T
+        k = min(k, len(self._chaves))
+        # Seleção dos k melhores de todas as consultas de uma vez
+        if k < len(self._chaves):
+            candidatas = np.argpartition(-similaridades, k - 1, axis=1)[:, :k]
+        else:
+            candidatas = np.broadcast_to(np.arange(len(self._chaves)), similaridades.shape)
+        valores = np.take_along_axis(similaridades, candidatas, axis=1)
+        ordem = np.argsort(-valores, axis=1, kind="stable")
+        candidatas = np.take_along_axis(candidatas, ordem, axis=1)
+        valores = np.take_along_axis(valores, ordem, axis=1)
+        return [[(self._chaves[i], float(v)) for i, v in zip(linha_i, linha_v)]
+                for linha_i, linha_v in zip(candidatas.tolist(), valores.tolist())]
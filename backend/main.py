@@ -1,72 +1,118 @@
-from fastapi import FastAPI, HTTPException, Depends, status, Request, Form
+from fastapi import FastAPI, HTTPException, Depends, status, Request, Form, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
-import sqlite3
 import uuid
+import base64
+import hmac
 from datetime import datetime
 import os
-import torch
-import chromadb
+import asyncio
+import time
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 import json
+import csv
+import io
 import logging
 
-# Importar serviços otimizados
-from embedding_service import EmbeddingService
+# Importar serviços otimizados (torch, transformers e chromadb são importados
+# apenas no carregamento em segundo plano, para não atrasar a inicialização)
+from embedding_batcher import EmbeddingBatcher
+from indexacao_casos import sincronizar_casos_validados, indexar_caso
+from importacao_triagens import ImportadorTriagens, importar_corpo
 from ollama_service import OllamaService
+from saude_ollama import ABERTO, FECHADO, MEIO_ABERTO, CircuitBreaker, MonitorSaude
+from construtor_prompt import ConstrutorPrompt
+from mock_response import get_provisional_response
+from motor_regras import pre_triagem
+from cache_respostas import CacheRespostas, calcular_fingerprint
+import repositorio
+from repositorio import conexao, transacao, executar
+from migracoes import aplicar_migracoes
+import estatisticas
+import metricas
+from metricas import MiddlewareMetricas, histograma, valor_coletado
+from rastreamento import ExportadorArquivo, MiddlewareRastreamento, span
+from configuracao_logs import configurar_logs
+from perfilamento import Perfilador
+from servicos import RegistroServicos, ServicoIndisponivel, CARREGANDO, PRONTO
 
 # Importar módulos de usuários
 from rotas_usuarios import router as usuarios_router
 
-# Configurar logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("triagem_api.log"),
-        logging.StreamHandler()
-    ]
-)
+# Configurar logging (fila + thread de gravação, JSON com rotação; ver configuracao_logs.py)
+configurar_logs()
 logger = logging.getLogger("triagem_api")
 
-# Initialize FastAPI app
-app = FastAPI(
-    title="Sistema de Triagem API",
-    description="API para o Sistema de Triagem baseado no Protocolo de Manchester",
-    version="1.0.0"
-)
+# Serviços carregados em segundo plano pelo lifespan
+registro_servicos = RegistroServicos()
+embedding_service = None
+embedding_batcher = None
+ollama_service = None
+collection = None
+cache_respostas = None
+monitor_saude = None
 
-# Add CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Métricas do pipeline de triagem, expostas em GET /metrics
+ETAPAS_TRIAGEM = histograma("triagem_etapa_segundos", "Duração de cada etapa da triagem", rotulos=("etapa",))
+DURACAO_TRIAGEM = histograma("triagem_duracao_segundos", "Duração total de /api/triagem, por origem da resposta",
+                             rotulos=("origem",))
 
-# Incluir rotas de usuários
-app.include_router(usuarios_router)
+def _cache_embeddings():
+    return embedding_service.embedding_cache if embedding_service is not None else None
+
+def _taxa_acerto_embeddings():
+    cache = _cache_embeddings()
+    if cache is None:
+        return None
+    consultas = cache.hits + cache.misses
+    return cache.hits / consultas if consultas else 0.0
+
+valor_coletado("embedding_cache_acertos_total", "Embeddings encontrados no cache",
+               lambda: _cache_embeddings().hits, tipo="counter")
+valor_coletado("embedding_cache_falhas_total", "Embeddings ausentes do cache (calculados pelo modelo)",
+               lambda: _cache_embeddings().misses, tipo="counter")
+valor_coletado("embedding_cache_taxa_acerto", "Fração das consultas ao cache de embeddings com acerto",
+               _taxa_acerto_embeddings)
+valor_coletado("cache_respostas_taxa_acerto", "Fração das triagens respondidas pelo cache de respostas",
+               lambda: cache_respostas.get_metrics()["taxa_acerto"])
+valor_coletado("ollama_circuito_aberto", "1 enquanto o circuit breaker do Ollama recusa chamadas",
+               lambda: int(ollama_service.circuit_breaker.aberto))
+valor_coletado("ollama_circuito_estado", "1 no estado atual do circuit breaker do Ollama, 0 nos demais",
+               lambda: {(estado,): int(estado == ollama_service.circuit_breaker.estado)
+                        for estado in (FECHADO, ABERTO, MEIO_ABERTO)},
+               rotulos=("estado",))
+valor_coletado("ollama_circuito_transicoes_total", "Transições do circuit breaker do Ollama, por estado de origem e destino",
+               lambda: ollama_service.circuit_breaker.contagem_transicoes(), tipo="counter", rotulos=("de", "para"))
+
+# Rastreamento por requisição (Server-Timing, detalhamento no log, exportação JSONL opcional)
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "true").lower() == "true"
+exportador_rastros = ExportadorArquivo(os.getenv("TRACE_EXPORT_PATH")) if os.getenv("TRACE_EXPORT_PATH") else None
+# Perfilamento de requisições amostradas, ligado pela rota administrativa (exige ADMIN_TOKEN)
+perfilador = Perfilador(os.getenv("PROFILE_DIR", "./perfis"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
 
-# Inicializar serviços
-try:
-    embedding_service = EmbeddingService()
-    logger.info("Serviço de embeddings inicializado com sucesso")
-except Exception as e:
-    logger.error(f"Erro ao inicializar serviço de embeddings: {str(e)}")
-    embedding_service = None
-
-try:
-    ollama_service = OllamaService()
-    logger.info("Serviço Ollama inicializado com sucesso")
-except Exception as e:
-    logger.error(f"Erro ao inicializar serviço Ollama: {str(e)}")
-    ollama_service = None
-
-# Initialize ChromaDB
-try:
+# Tempo máximo (s) que um endpoint aguarda um serviço ainda em carregamento antes de responder 503
+SERVICE_WAIT_TIMEOUT = float(os.getenv("SERVICE_WAIT_TIMEOUT", "10"))
+# Prazo total (s) de uma requisição de /api/triagem antes de responder com a classificação provisória
+TRIAGEM_SLA_S = float(os.getenv("TRIAGEM_SLA_S", "20"))
+
+def _carregar_embedding_service():
+    from embedding_service import EmbeddingService
+    buckets = os.getenv("EMBEDDING_SEQ_BUCKETS")
+    return EmbeddingService(
+        model_name=os.getenv("EMBEDDING_MODEL", "pucpr/biobertpt-clin"),
+        cache_max_entries=int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "100000")),
+        max_length=int(os.getenv("EMBEDDING_MAX_LENGTH", "512")),
+        backend=os.getenv("EMBEDDING_BACKEND", "fp32"),
+        num_threads=int(os.getenv("EMBEDDING_THREADS", "0")) or None,
+        seq_buckets=None if buckets is None else [int(b) for b in buckets.split(",") if b.strip()]
+    )
+
+def _carregar_chromadb():
+    import chromadb
     chroma_client = chromadb.PersistentClient(path="./chroma_db")
     collection_name = "triagem_hci"
     
@@ -83,9 +129,146 @@ try:
         except:
             collection = chroma_client.get_collection(name=collection_name)
             logger.info(f"Coleção ChromaDB '{collection_name}' carregada com sucesso após erro")
-except Exception as e:
-    logger.error(f"Erro ao inicializar ChromaDB: {str(e)}")
-    collection = None
+    return collection
+
+async def _carregar_em_segundo_plano(nome, carregar, ao_carregar=None):
+    """
+    Executa `carregar` em uma thread e registra o resultado no registro de serviços.
+    
+    `ao_carregar`, se informado, recebe a instância antes de o serviço ser marcado como pronto.
+    """
+    try:
+        instancia = await asyncio.to_thread(carregar)
+        if ao_carregar is not None:
+            ao_carregar(instancia)
+        registro_servicos.definir_pronto(nome, instancia)
+        return instancia
+    except Exception as e:
+        registro_servicos.definir_falha(nome, e)
+        return None
+
+def _configurar_embeddings(servico):
+    global embedding_service, embedding_batcher
+    embedding_service = servico
+    # Agrupador de pedidos concorrentes de embedding em lotes
+    embedding_batcher = EmbeddingBatcher(
+        servico,
+        max_batch_size=int(os.getenv("EMBEDDING_MAX_BATCH", "16")),
+        max_wait_ms=float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5"))
+    )
+
+def _configurar_chromadb(colecao):
+    global collection
+    collection = colecao
+
+async def _aquecer_servicos():
+    """Carrega os serviços pesados sem bloquear o atendimento das demais rotas."""
+    await asyncio.gather(
+        _carregar_em_segundo_plano("embedding_service", _carregar_embedding_service, _configurar_embeddings),
+        _carregar_em_segundo_plano("chromadb", _carregar_chromadb, _configurar_chromadb)
+    )
+    
+    # Indexar no ChromaDB apenas os casos validados novos ou alterados
+    if embedding_service is not None and collection is not None:
+        await _carregar_em_segundo_plano(
+            "indexacao_casos", lambda: sincronizar_casos_validados(collection, embedding_service)
+        )
+    else:
+        registro_servicos.definir_falha("indexacao_casos", RuntimeError("dependências indisponíveis"))
+
+def _fingerprint_geracao():
+    """Impressão digital do modelo e das instruções do prompt, usada para invalidar o cache de respostas."""
+    return calcular_fingerprint(ollama_service.model, ollama_service.construtor_prompt.prefixo)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global ollama_service, cache_respostas, monitor_saude
+    init_validation_db()
+    
+    registro_servicos.registrar("ollama_service")
+    try:
+        ollama_service = OllamaService(
+            url=os.getenv("OLLAMA_URL", "http://localhost:11434"),
+            model=os.getenv("OLLAMA_MODEL", "mistral"),
+            connect_timeout=float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5")),
+            read_timeout=float(os.getenv("OLLAMA_READ_TIMEOUT", "60")),
+            construtor_prompt=ConstrutorPrompt(orcamento_tokens=int(os.getenv("PROMPT_TOKEN_BUDGET", "1536"))),
+            num_predict=int(os.getenv("OLLAMA_NUM_PREDICT", "320")),
+            circuit_breaker=CircuitBreaker(
+                limiar_falhas=int(os.getenv("OLLAMA_BREAKER_FAILURES", "3")),
+                tempo_abertura_s=float(os.getenv("OLLAMA_BREAKER_OPEN_S", "30"))
+            )
+        )
+        registro_servicos.definir_pronto("ollama_service", ollama_service)
+        # Verificação periódica da disponibilidade do Ollama, que também alimenta o circuito
+        monitor_saude = MonitorSaude(
+            ollama_service,
+            ollama_service.circuit_breaker,
+            intervalo_s=float(os.getenv("OLLAMA_HEALTH_INTERVAL_S", "10"))
+        )
+        monitor_saude.iniciar()
+        cache_respostas = CacheRespostas(
+            fingerprint=_fingerprint_geracao(),
+            ttl_s=float(os.getenv("RESPONSE_CACHE_TTL_S", "900")),
+            max_entradas=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000")),
+            # Sem RESPONSE_CACHE_SIMILARITY (calibrado com calibracao_cache.py), só acertos exatos
+            limiar_similaridade=float(os.environ["RESPONSE_CACHE_SIMILARITY"])
+            if os.getenv("RESPONSE_CACHE_SIMILARITY") else None,
+            permitir_semantico_grave=os.getenv("RESPONSE_CACHE_ALLOW_SEVERE_FUZZY", "false").lower() == "true"
+        )
+    except Exception as e:
+        registro_servicos.definir_falha("ollama_service", e)
+    
+    for nome in ("embedding_service", "chromadb", "indexacao_casos"):
+        registro_servicos.registrar(nome)
+    aquecimento = asyncio.create_task(_aquecer_servicos())
+    
+    yield
+    
+    # Encerrar o monitor de saúde, o agrupador de embeddings, gravar o cache e fechar o pool HTTP do Ollama
+    if not aquecimento.done():
+        aquecimento.cancel()
+    if monitor_saude is not None:
+        await monitor_saude.parar()
+    if embedding_batcher is not None:
+        await embedding_batcher.stop()
+    if embedding_service is not None:
+        embedding_service.close()
+    if ollama_service is not None:
+        await ollama_service.aclose()
+    if exportador_rastros is not None:
+        exportador_rastros.fechar()
+    repositorio.fechar()
+
+# Initialize FastAPI app
+app = FastAPI(
+    title="Sistema de Triagem API",
+    description="API para o Sistema de Triagem baseado no Protocolo de Manchester",
+    version="1.0.0",
+    lifespan=lifespan
+)
+
+# Add CORS middleware
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+# Requisições em andamento e atendidas por rota
+app.add_middleware(MiddlewareMetricas)
+if TRACE_ENABLED:
+    app.add_middleware(
+        MiddlewareRastreamento,
+        exportador=exportador_rastros,
+        perfilador=perfilador,
+        log_min_ms=float(os.getenv("TRACE_LOG_MIN_MS", "0"))
+    )
+
+# Incluir rotas de usuários
+app.include_router(usuarios_router)
 
 # Pydantic models
 class TriagemRequest(BaseModel):
@@ -105,6 +288,8 @@ class TriagemResponse(BaseModel):
     justificativa: str
     condutas: str
     data_hora: str
+    provisoria: bool = False
+    pre_triagem: Optional[dict] = None
 
 class ValidationRequest(BaseModel):
     triagem_id: str
@@ -117,133 +302,243 @@ class ValidationResponse(BaseModel):
 
 # Database functions
 def init_validation_db():
-    conn = sqlite3.connect('./validacao_triagem.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS validacao_triagem (
-        id TEXT PRIMARY KEY,
-        sintomas TEXT NOT NULL,
-        resposta TEXT NOT NULL,
-        data_hora TEXT NOT NULL,
-        validado INTEGER DEFAULT 0,
-        feedback TEXT,
-        validado_por TEXT,
-        data_validacao TEXT,
-        classificacao TEXT,
-        justificativa TEXT,
-        condutas TEXT
-    )
-    ''')
-    conn.commit()
-    conn.close()
-    logger.info("Banco de dados de validação inicializado")
-
-def salvar_para_validacao(sintomas, resposta, classificacao="", justificativa="", condutas=""):
-    conn = sqlite3.connect('./validacao_triagem.db')
-    cursor = conn.cursor()
+    # O esquema canônico é mantido pelas migrações versionadas (migracoes.py)
+    aplicadas = aplicar_migracoes()
+    logger.info(f"Banco de dados de validação inicializado ({aplicadas} migrações aplicadas)")
+
+def salvar_para_validacao(sintomas, resposta, classificacao="", justificativa="", condutas="", reprocessar=False):
     triagem_id = str(uuid.uuid4())
     data_hora = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    cursor.execute(
-        "INSERT INTO validacao_triagem (id, sintomas, resposta, data_hora, classificacao, justificativa, condutas) VALUES (?, ?, ?, ?, ?, ?, ?)",
-        (triagem_id, sintomas, str(resposta), data_hora, classificacao, justificativa, condutas)
-    )
-    conn.commit()
-    conn.close()
+    with transacao() as conn:
+        conn.execute(
+            "INSERT INTO validacao_triagem (id, sintomas, resposta, data_hora, classificacao, justificativa, condutas, reprocessar) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (triagem_id, sintomas, str(resposta), data_hora, classificacao, justificativa, condutas, int(reprocessar))
+        )
+        estatisticas.registrar_triagem(conn, data_hora, classificacao)
     logger.info(f"Triagem salva para validação: id={triagem_id}")
     return triagem_id
 
 def carregar_casos_validados():
     try:
-        conn = sqlite3.connect('./validacao_triagem.db')
-        cursor = conn.cursor()
-        cursor.execute("SELECT sintomas, resposta FROM validacao_triagem WHERE validado = 1")
-        casos = cursor.fetchall()
-        conn.close()
+        with conexao() as conn:
+            casos = conn.execute("SELECT sintomas, resposta FROM validacao_triagem WHERE validado = 1").fetchall()
         logger.info(f"Casos validados carregados: {len(casos)} casos")
         return casos
     except Exception as e:
         logger.error(f"Erro ao carregar casos validados: {str(e)}")
         return []
 
-def obter_triagens(filtro="todas"):
-    conn = sqlite3.connect('./validacao_triagem.db')
-    cursor = conn.cursor()
-    
-    # CORREÇÃO: Incluir classificacao, justificativa e condutas na query
-    query = "SELECT id, sintomas, resposta, data_hora, validado, feedback, validado_por, data_validacao, classificacao, justificativa, condutas FROM validacao_triagem"
+# Colunas que podem ser selecionadas em /api/triagens (id e data_hora são sempre incluídos)
+CAMPOS_TRIAGEM = ["id", "sintomas", "resposta", "data_hora", "validado", "feedback", "validado_por",
+                  "data_validacao", "classificacao", "justificativa", "condutas", "reprocessar"]
+LIMITE_MAXIMO_PAGINA = 500
+
+def _codificar_cursor(data_hora, triagem_id):
+    return base64.urlsafe_b64encode(json.dumps([data_hora, triagem_id]).encode()).decode()
+
+def _decodificar_cursor(cursor):
+    try:
+        data_hora, triagem_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(data_hora), str(triagem_id)
+    except Exception:
+        raise ValueError("Cursor inválido")
+
+def _selecionar_campos(campos):
+    """Valida a lista de campos solicitada, mantendo a ordem canônica das colunas."""
+    if not campos:
+        return list(CAMPOS_TRIAGEM)
+    solicitados = {campo.strip() for campo in campos.split(",") if campo.strip()}
+    invalidos = solicitados - set(CAMPOS_TRIAGEM)
+    if invalidos:
+        raise ValueError(f"Campos inválidos: {', '.join(sorted(invalidos))}")
+    return [campo for campo in CAMPOS_TRIAGEM if campo in solicitados or campo in ("id", "data_hora")]
+
+def _montar_filtros_triagens(filtro="todas", classificacao=None, validado_por=None,
+                             data_inicio=None, data_fim=None):
+    """Monta a cláusula WHERE (e seus parâmetros) dos filtros de listagem de triagens."""
+    condicoes = []
+    params = []
     
     if filtro == "pendentes":
-        query += " WHERE validado = 0"
+        condicoes.append("validado = 0")
     elif filtro == "validadas":
-        query += " WHERE validado = 1"
-        
-    query += " ORDER BY data_hora DESC"
+        condicoes.append("validado = 1")
     
-    cursor.execute(query)
-    triagens = cursor.fetchall()
-    conn.close()
+    if classificacao:
+        condicoes.append("classificacao = ?")
+        params.append(classificacao.upper())
+    if validado_por:
+        condicoes.append("validado_por = ?")
+        params.append(validado_por)
+    if data_inicio:
+        condicoes.append("data_hora >= ?")
+        params.append(data_inicio)
+    if data_fim:
+        # Uma data sem horário inclui o dia inteiro
+        condicoes.append("data_hora <= ?")
+        params.append(f"{data_fim} 23:59:59" if len(data_fim) == 10 else data_fim)
+    
+    return condicoes, params
+
+def obter_triagens(filtro="todas", limit=None, cursor=None, classificacao=None, validado_por=None,
+                   data_inicio=None, data_fim=None, campos=None):
+    """
+    Lista triagens ordenadas da mais recente para a mais antiga.
     
-    result = []
-    for triagem in triagens:
-        result.append({
-            "id": triagem[0],
-            "sintomas": triagem[1],
-            "resposta": triagem[2],
-            "data_hora": triagem[3],
-            "validado": triagem[4],
-            "feedback": triagem[5],
-            "validado_por": triagem[6],
-            "data_validacao": triagem[7],
-            # CORREÇÃO: Adicionar campos que estavam faltando
-            "classificacao": triagem[8],
-            "justificativa": triagem[9],
-            "condutas": triagem[10]
-        })
+    Com `limit`, a listagem é paginada por keyset sobre (data_hora, id): cada página
+    continua a partir do `cursor` devolvido pela anterior, com custo independente
+    do tamanho da tabela. Sem `limit`, todas as triagens do filtro são retornadas.
+    
+    Returns:
+        Tupla (triagens, proximo_cursor); proximo_cursor é None na última página
+    """
+    colunas = _selecionar_campos(campos)
+    condicoes, params = _montar_filtros_triagens(filtro, classificacao, validado_por, data_inicio, data_fim)
+    
+    if cursor:
+        data_hora, triagem_id = _decodificar_cursor(cursor)
+        condicoes.append("(data_hora, id) < (?, ?)")
+        params.extend([data_hora, triagem_id])
+    
+    query = f"SELECT {', '.join(colunas)} FROM validacao_triagem"
+    if condicoes:
+        query += " WHERE " + " AND ".join(condicoes)
+    query += " ORDER BY data_hora DESC, id DESC"
+    
+    if limit is not None:
+        limit = max(1, min(int(limit), LIMITE_MAXIMO_PAGINA))
+        # Uma linha a mais indica se existe próxima página
+        query += " LIMIT ?"
+        params.append(limit + 1)
+    
+    with conexao() as conn:
+        triagens = conn.execute(query, params).fetchall()
+    
+    proximo_cursor = None
+    if limit is not None and len(triagens) > limit:
+        triagens = triagens[:limit]
+        ultima = dict(zip(colunas, triagens[-1]))
+        proximo_cursor = _codificar_cursor(ultima["data_hora"], ultima["id"])
+    
+    result = [dict(zip(colunas, triagem)) for triagem in triagens]
     
     logger.info(f"Triagens obtidas: {len(result)} triagens (filtro: {filtro})")
-    return result
+    return result, proximo_cursor
+
+# Linhas lidas por consulta na exportação
+BLOCO_EXPORTACAO = 2000
+
+def obter_bloco_exportacao(colunas, condicoes, params, apos=None, limite=BLOCO_EXPORTACAO):
+    """
+    Lê um bloco da exportação, continuando por keyset a partir de `apos` = (data_hora, id).
+    
+    Cada bloco é uma consulta curta com a conexão devolvida ao pool em seguida, então a
+    exportação não prende uma conexão nem um snapshot de leitura durante o download inteiro.
+    """
+    condicoes = list(condicoes)
+    params = list(params)
+    if apos is not None:
+        condicoes.append("(data_hora, id) < (?, ?)")
+        params.extend(apos)
+    query = f"SELECT {', '.join(colunas)} FROM validacao_triagem"
+    if condicoes:
+        query += " WHERE " + " AND ".join(condicoes)
+    query += " ORDER BY data_hora DESC, id DESC LIMIT ?"
+    params.append(limite)
+    with conexao() as conn:
+        return conn.execute(query, params).fetchall()
 
 def validar_triagem(triagem_id, validado_por, feedback):
-    conn = sqlite3.connect('./validacao_triagem.db')
-    cursor = conn.cursor()
     data_validacao = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    cursor.execute(
-        "UPDATE validacao_triagem SET validado = 1, feedback = ?, validado_por = ?, data_validacao = ? WHERE id = ?",
-        (feedback, validado_por, data_validacao, triagem_id)
-    )
-    conn.commit()
-    conn.close()
+    with transacao() as conn:
+        # Lock de escrita antes da leitura, para que validações simultâneas não sejam contadas duas vezes
+        conn.execute("BEGIN IMMEDIATE")
+        anterior = estatisticas.ler_triagem(conn, triagem_id)
+        conn.execute(
+            "UPDATE validacao_triagem SET validado = 1, reprocessar = 0, feedback = ?, validado_por = ?, data_validacao = ? WHERE id = ?",
+            (feedback, validado_por, data_validacao, triagem_id)
+        )
+        estatisticas.registrar_validacao(conn, anterior, validado_por)
     logger.info(f"Triagem validada: id={triagem_id}, validado_por={validado_por}")
     return True
 
-# Initialize database
-init_validation_db()
+def obter_triagens_reprocessar(limite=10):
+    """Triagens com classificação provisória ainda não validadas, das mais antigas às mais recentes."""
+    with conexao() as conn:
+        return conn.execute(
+            "SELECT id, sintomas FROM validacao_triagem WHERE reprocessar = 1 AND validado = 0 ORDER BY data_hora LIMIT ?",
+            (limite,)
+        ).fetchall()
 
-# Load validated cases
-casos_validados = carregar_casos_validados()
+def atualizar_triagem_reprocessada(triagem_id, resposta, classificacao, justificativa, condutas):
+    """Substitui a classificação provisória pela resposta do modelo, se a triagem não foi validada nesse meio tempo."""
+    with transacao() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        anterior = estatisticas.ler_triagem(conn, triagem_id)
+        cursor = conn.execute(
+            "UPDATE validacao_triagem SET resposta = ?, classificacao = ?, justificativa = ?, condutas = ?, reprocessar = 0 "
+            "WHERE id = ? AND reprocessar = 1 AND validado = 0",
+            (resposta, classificacao, justificativa, condutas, triagem_id)
+        )
+        if cursor.rowcount == 0:
+            return False
+        estatisticas.registrar_reclassificacao(conn, anterior, classificacao)
+    logger.info(f"Triagem reprocessada: id={triagem_id}, classificação={classificacao}")
+    return True
 
-# Insert validated cases into vector database
-if collection is not None and embedding_service is not None:
-    for i, (sintomas, resposta) in enumerate(casos_validados):
-        case_id = f"validated_case_{i}"
-        try:
-            embedding = embedding_service.get_embedding(sintomas)
-            collection.add(
-                embeddings=[embedding],
-                ids=[case_id],
-                metadatas=[{"content": sintomas, "resposta": resposta}]
-            )
-            logger.info(f"Caso validado adicionado ao ChromaDB: case_id={case_id}")
-        except Exception as e:
-            logger.error(f"Erro ao processar caso validado {case_id}: {str(e)}")
+def contar_triagens(dias=30, horas=48):
+    with conexao() as conn:
+        return estatisticas.obter_estatisticas(conn, dias, horas)
 
 # API endpoints
 @app.get("/")
 async def root():
     return {"message": "Sistema de Triagem API"}
 
+async def _verificar_servicos_triagem():
+    """Aguarda os serviços usados pela triagem, respondendo 503 se não ficarem prontos a tempo."""
+    for nome, descricao in (("embedding_service", "Serviço de embeddings"),
+                            ("ollama_service", "Serviço Ollama"),
+                            ("chromadb", "Serviço de banco de dados vetorial")):
+        try:
+            await registro_servicos.aguardar(nome, SERVICE_WAIT_TIMEOUT)
+        except ServicoIndisponivel as e:
+            situacao = "em carregamento" if e.estado == CARREGANDO else "não disponível"
+            logger.error(f"{descricao} {situacao}")
+            raise HTTPException(
+                status_code=503,
+                detail=f"{descricao} {situacao}",
+                headers={"Retry-After": "5"} if e.estado == CARREGANDO else None
+            )
+
+async def _gerar_embedding_consulta(sintomas):
+    # Convert symptoms to embedding (agrupado com requisições concorrentes)
+    with ETAPAS_TRIAGEM.medir("embedding"), span("embedding"):
+        query_embedding = await embedding_batcher.get_embedding(sintomas)
+    logger.info("Embedding gerado com sucesso")
+    return query_embedding
+
+async def _buscar_casos_similares(sintomas, query_embedding=None):
+    """Consulta no ChromaDB os casos similares aos sintomas (gerando o embedding se não informado)."""
+    if query_embedding is None:
+        query_embedding = await _gerar_embedding_consulta(sintomas)
+    
+    # Query vector database for similar cases
+    with ETAPAS_TRIAGEM.medir("chroma"), span("chroma.query", n_results=3):
+        results = collection.query(query_embeddings=[query_embedding], n_results=3)
+    
+    # Extract similar cases (sintomas e classificação validada, em ordem de relevância)
+    similar_cases = [
+        {"sintomas": metadata["content"], "classificacao": metadata.get("classificacao", "")}
+        for metadata in results['metadatas'][0]
+    ]
+    logger.info(f"Casos similares encontrados: {len(similar_cases)}")
+    return similar_cases
+
 @app.post("/api/triagem", response_model=TriagemResponse)
 async def realizar_triagem(request: TriagemProcessar):
+    inicio = time.perf_counter()
+    deadline = time.monotonic() + TRIAGEM_SLA_S
     try:
         # Check if symptoms are provided
         if not request.sintomas:
@@ -252,50 +547,74 @@ async def realizar_triagem(request: TriagemProcessar):
         
         logger.info(f"Iniciando triagem: {request.sintomas[:50]}...")
         
-        # Verificar se os serviços estão disponíveis
-        if embedding_service is None:
-            logger.error("Serviço de embeddings não disponível")
-            raise HTTPException(status_code=503, detail="Serviço de embeddings não disponível")
-        
-        if ollama_service is None:
-            logger.error("Serviço Ollama não disponível")
-            raise HTTPException(status_code=503, detail="Serviço Ollama não disponível")
-        
-        if collection is None:
-            logger.error("ChromaDB não disponível")
-            raise HTTPException(status_code=503, detail="Serviço de banco de dados vetorial não disponível")
-        
-        # Convert symptoms to embedding
-        query_embedding = embedding_service.get_embedding(request.sintomas)
-        logger.info("Embedding gerado com sucesso")
+        # Classificação provisória por regras, disponível antes de qualquer chamada ao modelo
+        resultado_regras = pre_triagem(request.sintomas)
+        logger.info(f"Pré-triagem por regras: {resultado_regras.cor} ({resultado_regras.duracao_us:.0f}us)")
         
-        # Query vector database for similar cases
-        results = collection.query(query_embeddings=[query_embedding], n_results=3)
+        # Verificar se os serviços estão disponíveis
+        await _verificar_servicos_triagem()
         
-        # Extract similar cases
-        similar_cases = [metadata["content"] for metadata in results['metadatas'][0]]
-        logger.info(f"Casos similares encontrados: {len(similar_cases)}")
+        # Respostas recentes para a mesma queixa (texto normalizado) dispensam embedding e geração
+        cache_respostas.definir_fingerprint(_fingerprint_geracao())
+        resultado_cache = cache_respostas.buscar_exato(request.sintomas)
         
-        # Formatar prompt com casos similares
-        prompt = ollama_service.format_prompt(request.sintomas, similar_cases)
+        query_embedding = None
+        if resultado_cache is None:
+            query_embedding = await _gerar_embedding_consulta(request.sintomas)
+            resultado_cache = cache_respostas.buscar_semelhante(query_embedding, resultado_regras.cor)
         
-        # Call Ollama API with optimized service
-        response_text = await ollama_service.generate_response(prompt)
-        logger.info(f"Resposta gerada: {len(response_text)} caracteres")
+        provisoria = False
+        if resultado_cache is not None:
+            response_text = resultado_cache.resposta
+            logger.info(f"Resposta obtida do cache ({resultado_cache.tipo}, similaridade={resultado_cache.similaridade:.3f})")
+        elif ollama_service.circuit_breaker.aberto:
+            # Ollama sabidamente fora do ar: nem busca casos similares nem espera pelas tentativas
+            response_text = get_provisional_response(request.sintomas, resultado_regras)
+            provisoria = True
+            logger.warning("Circuito do Ollama aberto: classificação provisória por regras")
+        else:
+            similar_cases = await _buscar_casos_similares(request.sintomas, query_embedding)
+            
+            # Formatar prompt com casos similares
+            with ETAPAS_TRIAGEM.medir("prompt"):
+                prompt = ollama_service.format_prompt(request.sintomas, similar_cases)
+            
+            # Call Ollama API with optimized service (limitado ao prazo da requisição)
+            with ETAPAS_TRIAGEM.medir("llm"):
+                resultado = await ollama_service.generate(prompt, deadline=deadline)
+            if resultado.sucesso:
+                response_text = resultado.texto
+                logger.info(f"Resposta gerada: {len(response_text)} caracteres")
+            else:
+                # Classificação provisória por regras locais, marcada para reprocessamento pelo modelo
+                response_text = get_provisional_response(request.sintomas, resultado_regras)
+                provisoria = True
+                logger.warning(f"Modelo sem resposta ({resultado.motivo}, {resultado.tentativas} tentativas, "
+                               f"{resultado.duracao_s:.1f}s): classificação provisória por regras")
         
         # Process the response with optimized service
-        classificacao, justificativa, condutas = ollama_service.process_response(response_text)
+        with ETAPAS_TRIAGEM.medir("parse"):
+            classificacao, justificativa, condutas = ollama_service.process_response(response_text)
         logger.info(f"Resposta processada: classificação={classificacao}")
         
+        # Respostas de fallback não são armazenadas, para não mascarar a recuperação do Ollama
+        if resultado_cache is None and not provisoria and not ollama_service.is_fallback_response(response_text):
+            cache_respostas.armazenar(request.sintomas, response_text, classificacao, query_embedding)
+        
         # Save to validation database
-        triagem_id = salvar_para_validacao(
-            request.sintomas, 
-            response_text,
-            classificacao,
-            justificativa,
-            condutas
-        )
+        with ETAPAS_TRIAGEM.medir("persistencia"):
+            triagem_id = await executar(
+                salvar_para_validacao,
+                request.sintomas, 
+                response_text,
+                classificacao,
+                justificativa,
+                condutas,
+                provisoria
+            )
         
+        origem = "cache" if resultado_cache is not None else "provisoria" if provisoria else "modelo"
+        DURACAO_TRIAGEM.observar(time.perf_counter() - inicio, origem)
         return {
             "id": triagem_id,
             "sintomas": request.sintomas,
@@ -303,7 +622,9 @@ async def realizar_triagem(request: TriagemProcessar):
             "classificacao": classificacao,
             "justificativa": justificativa,
             "condutas": condutas,
-            "data_hora": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            "data_hora": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "provisoria": provisoria,
+            "pre_triagem": resultado_regras.to_dict()
         }
     except HTTPException as e:
         # Repassar exceções HTTP
@@ -312,20 +633,222 @@ async def realizar_triagem(request: TriagemProcessar):
         logger.error(f"Erro ao processar triagem: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erro ao processar triagem: {str(e)}")
 
+@app.post("/api/triagens/importar")
+async def importar_triagens(request: Request, formato: str = "csv", pular: int = 0, indexar: bool = True,
+                            validadas: bool = True, validado_por: str = "importacao", lote: int = 5000):
+    """
+    Importa triagens históricas enviadas no corpo da requisição (CSV com cabeçalho ou JSONL),
+    lido em streaming. Reenviar o mesmo arquivo não duplica triagens; `pular` descarta os
+    registros iniciais já importados por um envio interrompido.
+    """
+    if indexar:
+        try:
+            await registro_servicos.aguardar("embedding_service", SERVICE_WAIT_TIMEOUT)
+            await registro_servicos.aguardar("chromadb", SERVICE_WAIT_TIMEOUT)
+        except ServicoIndisponivel as e:
+            raise HTTPException(status_code=503, detail=f"Indexação indisponível ({e.nome}); use indexar=false")
+    importador = ImportadorTriagens(
+        embedding_service if indexar else None,
+        collection if indexar else None,
+        lote=max(1, min(lote, 50000)),
+        validado_padrao=validadas,
+        validado_por_padrao=validado_por
+    )
+    try:
+        relatorio = await importar_corpo(request.stream(), formato, importador, pular=max(0, pular))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Erro na importação de triagens: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Erro na importação de triagens: {str(e)}")
+    return relatorio.to_dict()
+
+@app.post("/api/triagens/reprocessar")
+async def reprocessar_triagens(limite: int = 10):
+    """
+    Gera novamente, com o modelo, as triagens que receberam classificação provisória
+    por estourar o prazo. Triagens já validadas por um profissional não são alteradas.
+    """
+    await _verificar_servicos_triagem()
+    pendentes = await executar(obter_triagens_reprocessar, max(1, min(limite, 100)))
+    
+    reprocessadas = 0
+    for triagem_id, sintomas in pendentes:
+        similar_cases = await _buscar_casos_similares(sintomas)
+        resultado = await ollama_service.generate(ollama_service.format_prompt(sintomas, similar_cases))
+        if not resultado.sucesso:
+            logger.warning(f"Reprocessamento interrompido: modelo sem resposta ({resultado.motivo})")
+            break
+        classificacao, justificativa, condutas = ollama_service.process_response(resultado.texto)
+        if await executar(atualizar_triagem_reprocessada, triagem_id, resultado.texto,
+                          classificacao, justificativa, condutas):
+            reprocessadas += 1
+    
+    return {"reprocessadas": reprocessadas, "selecionadas": len(pendentes)}
+
+@app.post("/api/triagem/stream")
+async def realizar_triagem_stream(request: TriagemProcessar):
+    """
+    Variante em streaming de /api/triagem (NDJSON, um evento JSON por linha).
+
+    Eventos emitidos:
+    - {"evento": "pre_triagem", ...} primeiro, com a classificação provisória por regras
+    - {"evento": "classificacao", "classificacao": ...} assim que a linha CLASSIFICAÇÃO é lida
+    - {"evento": "token", "texto": ...} para cada fragmento gerado pelo modelo
+    - {"evento": "concluido", ...} com o registro final salvo para validação
+    - {"evento": "erro", "detalhe": ...} se a geração for interrompida
+    """
+    if not request.sintomas:
+        logger.warning("Requisição de triagem sem sintomas")
+        raise HTTPException(status_code=400, detail="Sintomas não fornecidos")
+    
+    logger.info(f"Iniciando triagem em streaming: {request.sintomas[:50]}...")
+    resultado_regras = pre_triagem(request.sintomas)
+    # Se o modelo falhar, a resposta provisória por regras é emitida no lugar da geração
+    resposta_provisoria = get_provisional_response(request.sintomas, resultado_regras)
+    await _verificar_servicos_triagem()
+    
+    try:
+        # Com o circuito aberto, generate_stream emite direto a resposta provisória
+        similar_cases = [] if ollama_service.circuit_breaker.aberto else await _buscar_casos_similares(request.sintomas)
+        prompt = ollama_service.format_prompt(request.sintomas, similar_cases)
+    except Exception as e:
+        logger.error(f"Erro ao preparar triagem: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Erro ao processar triagem: {str(e)}")
+    
+    async def eventos():
+        partes = []
+        classificacao_emitida = None
+        yield json.dumps({"evento": "pre_triagem", **resultado_regras.to_dict()}, ensure_ascii=False) + "\n"
+        try:
+            async for token in ollama_service.generate_stream(prompt, fallback=resposta_provisoria):
+                partes.append(token)
+                yield json.dumps({"evento": "token", "texto": token}, ensure_ascii=False) + "\n"
+                
+                if classificacao_emitida is None:
+                    classificacao_emitida = ollama_service.extract_classification("".join(partes))
+                    if classificacao_emitida is not None:
+                        logger.info(f"Classificação antecipada: {classificacao_emitida}")
+                        yield json.dumps({"evento": "classificacao", "classificacao": classificacao_emitida}) + "\n"
+            
+            response_text = "".join(partes)
+            provisoria = response_text == resposta_provisoria
+            classificacao, justificativa, condutas = ollama_service.process_response(response_text)
+            triagem_id = await executar(
+                salvar_para_validacao,
+                request.sintomas,
+                response_text,
+                classificacao,
+                justificativa,
+                condutas,
+                provisoria
+            )
+            yield json.dumps({
+                "evento": "concluido",
+                "id": triagem_id,
+                "sintomas": request.sintomas,
+                "resposta": response_text,
+                "classificacao": classificacao,
+                "justificativa": justificativa,
+                "condutas": condutas,
+                "data_hora": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "provisoria": provisoria
+            }, ensure_ascii=False) + "\n"
+        except Exception as e:
+            logger.error(f"Erro durante triagem em streaming: {str(e)}")
+            yield json.dumps({"evento": "erro", "detalhe": f"Erro ao processar triagem: {str(e)}"}, ensure_ascii=False) + "\n"
+    
+    return StreamingResponse(eventos(), media_type="application/x-ndjson")
+
 @app.get("/api/triagens")
-async def listar_triagens(filtro: str = "todas"):
+async def listar_triagens(filtro: str = "todas", limit: Optional[int] = None, cursor: Optional[str] = None,
+                          classificacao: Optional[str] = None, validado_por: Optional[str] = None,
+                          data_inicio: Optional[str] = None, data_fim: Optional[str] = None,
+                          campos: Optional[str] = None):
+    """
+    Lista triagens com filtros opcionais.
+    
+    Para paginar, informe `limit` (máximo 500) e repita a chamada com o `proximo_cursor`
+    retornado. `campos` seleciona as colunas (separadas por vírgula), permitindo omitir
+    textos longos como resposta, justificativa e condutas.
+    """
     try:
-        triagens = obter_triagens(filtro)
-        return {"triagens": triagens}
+        triagens, proximo_cursor = await executar(
+            obter_triagens, filtro, limit, cursor, classificacao, validado_por, data_inicio, data_fim, campos
+        )
+        resposta = {"triagens": triagens}
+        if limit is not None:
+            resposta["proximo_cursor"] = proximo_cursor
+        return resposta
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Erro ao listar triagens: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erro ao listar triagens: {str(e)}")
 
+FORMATOS_EXPORTACAO = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+
+async def _exportar_triagens(formato, colunas, condicoes, params):
+    """Gera a exportação bloco a bloco; a memória usada não depende do número de triagens."""
+    posicao_data, posicao_id = colunas.index("data_hora"), colunas.index("id")
+    if formato == "csv":
+        saida = io.StringIO()
+        escritor = csv.writer(saida)
+        escritor.writerow(colunas)
+        yield saida.getvalue()
+    apos = None
+    total = 0
+    while True:
+        linhas = await executar(obter_bloco_exportacao, colunas, condicoes, params, apos)
+        if not linhas:
+            break
+        if formato == "csv":
+            saida.seek(0)
+            saida.truncate()
+            escritor.writerows(linhas)
+            yield saida.getvalue()
+        else:
+            yield "".join(json.dumps(dict(zip(colunas, linha)), ensure_ascii=False) + "\n" for linha in linhas)
+        total += len(linhas)
+        if len(linhas) < BLOCO_EXPORTACAO:
+            break
+        apos = (linhas[-1][posicao_data], linhas[-1][posicao_id])
+    logger.info(f"Exportação concluída: {total} triagens ({formato})")
+
+@app.get("/api/triagens/exportar")
+async def exportar_triagens(formato: str = "csv", filtro: str = "todas", classificacao: Optional[str] = None,
+                            validado_por: Optional[str] = None, data_inicio: Optional[str] = None,
+                            data_fim: Optional[str] = None, campos: Optional[str] = None):
+    """
+    Exporta o histórico de triagens em CSV ou NDJSON, em streaming, com os mesmos filtros
+    e a mesma seleção de campos de /api/triagens, da mais recente para a mais antiga.
+    """
+    if formato not in FORMATOS_EXPORTACAO:
+        raise HTTPException(status_code=400, detail=f"Formato inválido: {formato} (opções: csv, ndjson)")
+    try:
+        colunas = _selecionar_campos(campos)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    condicoes, params = _montar_filtros_triagens(filtro, classificacao, validado_por, data_inicio, data_fim)
+    
+    nome = f"triagens_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{formato}"
+    return StreamingResponse(
+        _exportar_triagens(formato, colunas, condicoes, params),
+        media_type=FORMATOS_EXPORTACAO[formato],
+        headers={"Content-Disposition": f'attachment; filename="{nome}"'}
+    )
+
 @app.post("/api/validar", response_model=ValidationResponse)
 async def validar(request: ValidationRequest):
     try:
-        success = validar_triagem(request.triagem_id, request.validado_por, request.feedback)
+        success = await executar(validar_triagem, request.triagem_id, request.validado_por, request.feedback)
         if success:
+            # Disponibilizar o caso validado para a busca de similares imediatamente
+            if collection is not None and embedding_service is not None:
+                try:
+                    await asyncio.to_thread(indexar_caso, collection, embedding_service, request.triagem_id)
+                except Exception as e:
+                    logger.error(f"Erro ao indexar triagem validada {request.triagem_id}: {str(e)}")
             return {"success": True, "message": "Triagem validada com sucesso"}
         else:
             return {"success": False, "message": "Erro ao validar triagem"}
@@ -334,49 +857,100 @@ async def validar(request: ValidationRequest):
         raise HTTPException(status_code=500, detail=f"Erro ao validar triagem: {str(e)}")
 
 @app.get("/api/estatisticas")
-async def estatisticas():
+async def obter_estatisticas(dias: int = 30, horas: int = 48):
+    """Totais e quebras por cor, dia, hora e validador, lidos da tabela de agregados"""
     try:
-        conn = sqlite3.connect('./validacao_triagem.db')
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM validacao_triagem")
-        total = cursor.fetchone()[0]
-        cursor.execute("SELECT COUNT(*) FROM validacao_triagem WHERE validado = 1")
-        validadas = cursor.fetchone()[0]
-        cursor.execute("SELECT COUNT(*) FROM validacao_triagem WHERE validado = 0")
-        pendentes = cursor.fetchone()[0]
-        conn.close()
-        
-        return {
-            "total": total,
-            "validadas": validadas,
-            "pendentes": pendentes
-        }
+        return await executar(contar_triagens, dias, horas)
     except Exception as e:
         logger.error(f"Erro ao obter estatísticas: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erro ao obter estatísticas: {str(e)}")
 
+@app.get("/api/embeddings/metricas")
+async def metricas_embeddings():
+    """Métricas do agrupamento de embeddings: tamanho de lote, espera na fila e tempo de forward"""
+    if embedding_batcher is None:
+        raise HTTPException(status_code=503, detail="Serviço de embeddings não disponível")
+    return embedding_batcher.get_metrics()
+
+@app.get("/api/cache/metricas")
+async def metricas_cache_respostas():
+    """Métricas do cache de respostas: acertos exatos e semânticos, falhas e bloqueios por gravidade"""
+    if cache_respostas is None:
+        raise HTTPException(status_code=503, detail="Cache de respostas não disponível")
+    return cache_respostas.get_metrics()
+
+@app.get("/api/ollama/saude")
+async def saude_ollama():
+    """Última verificação de saúde do Ollama e estado do circuit breaker (estado, transições, chamadas recusadas)"""
+    if monitor_saude is None:
+        raise HTTPException(status_code=503, detail="Serviço Ollama não disponível")
+    return monitor_saude.get_metrics()
+
+class PerfilamentoRequest(BaseModel):
+    ativo: bool
+    modo: Optional[str] = None
+    taxa: Optional[float] = None
+    maximo: Optional[int] = None
+    intervalo_ms: Optional[float] = None
+
+def _exigir_admin(x_admin_token: Optional[str] = Header(None)):
+    """Rotas administrativas: exigem o cabeçalho X-Admin-Token igual a ADMIN_TOKEN (desativadas sem ele)."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Rotas administrativas desativadas: defina ADMIN_TOKEN")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Token administrativo inválido")
+
+@app.get("/api/admin/perfilamento", dependencies=[Depends(_exigir_admin)])
+async def obter_perfilamento():
+    """Estado do perfilamento e os últimos perfis gravados"""
+    return perfilador.estado()
+
+@app.post("/api/admin/perfilamento", dependencies=[Depends(_exigir_admin)])
+async def configurar_perfilamento(request: PerfilamentoRequest):
+    """
+    Liga ou desliga o perfilamento de uma fração das requisições (`taxa`), no modo
+    `amostragem` (pilhas agregadas, .folded) ou `cprofile` (.prof), até `maximo` perfis.
+    """
+    if request.ativo and not TRACE_ENABLED:
+        raise HTTPException(status_code=409, detail="Perfilamento requer o rastreamento (TRACE_ENABLED=true)")
+    try:
+        return perfilador.configurar(request.ativo, request.modo, request.taxa, request.maximo, request.intervalo_ms)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/metrics", include_in_schema=False)
+async def exportar_metricas():
+    """Métricas no formato de texto do Prometheus (latência por etapa, Ollama, caches, pool SQLite)"""
+    return PlainTextResponse(metricas.exportar(), media_type=metricas.TIPO_CONTEUDO)
+
 @app.get("/api/status")
 async def status():
-    """Endpoint para verificar o status dos serviços"""
+    """Endpoint para verificar o status dos serviços (loading, ready ou failed)"""
     try:
+        online = lambda nome: "online" if registro_servicos.estado(nome) == PRONTO else registro_servicos.estado(nome)
         status_data = {
             "api": "online",
-            "embedding_service": "online" if embedding_service is not None else "offline",
-            "ollama_service": "online" if ollama_service is not None else "offline",
-            "chromadb": "online" if collection is not None else "offline",
-            "database": "online"  # Assumimos que o banco SQLite está sempre disponível
+            "embedding_service": online("embedding_service"),
+            "ollama_service": online("ollama_service"),
+            "chromadb": online("chromadb"),
+            "database": "online",  # Assumimos que o banco SQLite está sempre disponível
+            "servicos": registro_servicos.resumo()
         }
         
-        # Verificar se o Ollama está realmente disponível
-        if ollama_service is not None:
-            status_data["ollama_available"] = ollama_service._is_ollama_available()
+        # Disponibilidade do Ollama segundo a última verificação do monitor de saúde (sem chamada de rede)
+        if monitor_saude is not None:
+            status_data["ollama_available"] = monitor_saude.disponivel
+            status_data["ollama_circuit"] = ollama_service.circuit_breaker.estado
+        if embedding_service is not None:
+            status_data["embedding_backend"] = embedding_service.get_info()
         
         return status_data
     except Exception as e:
         logger.error(f"Erro ao verificar status: {str(e)}")
         return {
             "api": "degraded",
-            "error": str(e)
+            "error": str(e),
+            "servicos": registro_servicos.resumo()
         }
 
 if __name__ == "__main__":
@@ -0,0 +1,297 @@
+"""
+Métricas da API no formato de texto do Prometheus (GET /metrics), sem dependências externas.
+
+O registro no caminho quente não usa locks: cada thread acumula os valores em um
+fragmento próprio (threading.local), e os fragmentos só são somados na coleta. O
+lock de cada métrica é usado apenas quando uma thread registra o primeiro valor,
+para incluir o fragmento dela na lista da coleta.
+
+    ETAPAS = histograma("triagem_etapa_segundos", "Duração de cada etapa", rotulos=("etapa",))
+    with ETAPAS.medir("embedding"):
+        ...
+    exportar()  # texto para o endpoint /metrics
+"""
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Limites (s) dos histogramas de latência: de 0,5 ms até a duração de uma geração longa
+LIMITES_LATENCIA = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                    1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+# Limites (s) da espera por uma conexão do pool SQLite, normalmente de microssegundos
+LIMITES_ESPERA = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _formatar_numero(valor: float) -> str:
+    if valor == float("inf"):
+        return "+Inf"
+    if float(valor).is_integer():
+        return str(int(valor))
+    return repr(float(valor))
+
+
+def _formatar_rotulos(nomes: Sequence[str], valores: Sequence, extra: str = "") -> str:
+    pares = [f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+class _Metrica:
+    """Base das métricas acumuladas por thread: `_fragmento()` retorna o dicionário da thread atual."""
+
+    tipo = "untyped"
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Sequence[str] = ()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._local = threading.local()
+        self._fragmentos: List[dict] = []
+        self._lock = threading.Lock()
+
+    def _fragmento(self) -> dict:
+        try:
+            return self._local.valores
+        except AttributeError:
+            valores = {}
+            with self._lock:
+                self._fragmentos.append(valores)
+            self._local.valores = valores
+            return valores
+
+    def _chave(self, rotulos: tuple) -> tuple:
+        if len(rotulos) != len(self.rotulos):
+            raise ValueError(f"{self.nome} espera os rótulos {self.rotulos}, recebeu {rotulos}")
+        return rotulos
+
+    def _copias(self) -> List[List[Tuple[tuple, object]]]:
+        # list(dict.items()) roda sem liberar o GIL: cópia consistente mesmo com a thread dona escrevendo
+        with self._lock:
+            fragmentos = list(self._fragmentos)
+        return [list(fragmento.items()) for fragmento in fragmentos]
+
+    def _cabecalho(self) -> List[str]:
+        return [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} {self.tipo}"]
+
+    def exportar(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Contador(_Metrica):
+    """Contador monotônico, opcionalmente com rótulos."""
+
+    tipo = "counter"
+
+    def inc(self, *rotulos, valor: float = 1):
+        fragmento = self._fragmento()
+        chave = self._chave(rotulos)
+        fragmento[chave] = fragmento.get(chave, 0) + valor
+
+    def valores(self) -> Dict[tuple, float]:
+        """Total por combinação de rótulos, somando os fragmentos de todas as threads."""
+        totais: Dict[tuple, float] = {}
+        for itens in self._copias():
+            for chave, valor in itens:
+                totais[chave] = totais.get(chave, 0) + valor
+        return totais
+
+    def exportar(self) -> List[str]:
+        linhas = self._cabecalho()
+        for chave, valor in sorted(self.valores().items()):
+            linhas.append(f"{self.nome}{_formatar_rotulos(self.rotulos, chave)} {_formatar_numero(valor)}")
+        return linhas
+
+
+class Medidor(Contador):
+    """Valor que sobe e desce (ex.: requisições em andamento), acumulado por incrementos."""
+
+    tipo = "gauge"
+
+    def dec(self, *rotulos, valor: float = 1):
+        self.inc(*rotulos, valor=-valor)
+
+
+class _Cronometro:
+    __slots__ = ("histograma", "rotulos", "inicio")
+
+    def __init__(self, histograma: "Histograma", rotulos: tuple):
+        self.histograma = histograma
+        self.rotulos = rotulos
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histograma.observar(time.perf_counter() - self.inicio, *self.rotulos)
+        return False
+
+
+class Histograma(_Metrica):
+    """Histograma com limites fixos; cada fragmento guarda as contagens por faixa e a soma."""
+
+    tipo = "histogram"
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Sequence[str] = (),
+                 limites: Sequence[float] = LIMITES_LATENCIA):
+        super().__init__(nome, ajuda, rotulos)
+        self.limites = tuple(sorted(limites))
+
+    def observar(self, valor: float, *rotulos):
+        fragmento = self._fragmento()
+        chave = self._chave(rotulos)
+        contagens = fragmento.get(chave)
+        if contagens is None:
+            # Uma posição por limite, uma para +Inf e a última para a soma
+            contagens = fragmento[chave] = [0] * (len(self.limites) + 1) + [0.0]
+        contagens[bisect_left(self.limites, valor)] += 1
+        contagens[-1] += valor
+
+    def medir(self, *rotulos) -> _Cronometro:
+        """Context manager que observa a duração do bloco, em segundos."""
+        return _Cronometro(self, rotulos)
+
+    def valores(self) -> Dict[tuple, List[float]]:
+        """Contagens não cumulativas por faixa (e a soma no final), por combinação de rótulos."""
+        totais: Dict[tuple, List[float]] = {}
+        for itens in self._copias():
+            for chave, contagens in itens:
+                contagens = list(contagens)
+                acumulado = totais.get(chave)
+                if acumulado is None:
+                    totais[chave] = contagens
+                else:
+                    for i, valor in enumerate(contagens):
+                        acumulado[i] += valor
+        return totais
+
+    def exportar(self) -> List[str]:
+        linhas = self._cabecalho()
+        for chave, contagens in sorted(self.valores().items()):
+            acumulado = 0
+            for limite, contagem in zip(self.limites + (float("inf"),), contagens):
+                acumulado += contagem
+                rotulos = _formatar_rotulos(self.rotulos, chave, f'le="{_formatar_numero(limite)}"')
+                linhas.append(f"{self.nome}_bucket{rotulos} {acumulado}")
+            rotulos = _formatar_rotulos(self.rotulos, chave)
+            linhas.append(f"{self.nome}_sum{rotulos} {_formatar_numero(contagens[-1])}")
+            linhas.append(f"{self.nome}_count{rotulos} {acumulado}")
+        return linhas
+
+
+class ValorColetado(_Metrica):
+    """
+    Valor lido só na coleta (ex.: contadores já mantidos por outro serviço); None omite a amostra.
+
+    Com rótulos, a função retorna um dicionário {valores dos rótulos: valor}, uma amostra por item.
+    """
+
+    def __init__(self, nome: str, ajuda: str, funcao: Callable[[], Any], tipo: str = "gauge",
+                 rotulos: Sequence[str] = ()):
+        super().__init__(nome, ajuda, rotulos)
+        self.funcao = funcao
+        self.tipo = tipo
+
+    def exportar(self) -> List[str]:
+        valor = self.funcao()
+        if valor is None:
+            return []
+        if not self.rotulos:
+            return self._cabecalho() + [f"{self.nome} {_formatar_numero(valor)}"]
+        linhas = self._cabecalho()
+        for chave, amostra in sorted(valor.items()):
+            linhas.append(f"{self.nome}{_formatar_rotulos(self.rotulos, self._chave(chave))} "
+                          f"{_formatar_numero(amostra)}")
+        return linhas
+
+
+class RegistroMetricas:
+    """Conjunto de métricas exportadas juntas, na ordem de registro."""
+
+    def __init__(self):
+        self._metricas: Dict[str, _Metrica] = {}
+
+    def registrar(self, metrica: _Metrica) -> _Metrica:
+        # Registrar de novo o mesmo nome substitui a métrica (ex.: módulo recarregado)
+        self._metricas[metrica.nome] = metrica
+        return metrica
+
+    def exportar(self) -> str:
+        linhas = []
+        for metrica in list(self._metricas.values()):
+            try:
+                linhas.extend(metrica.exportar())
+            except Exception:
+                # Um valor coletado indisponível não impede a exportação das demais métricas
+                continue
+        return "\n".join(linhas) + "\n"
+
+
+REGISTRO = RegistroMetricas()
+TIPO_CONTEUDO = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def contador(nome: str, ajuda: str, rotulos: Sequence[str] = ()) -> Contador:
+    return REGISTRO.registrar(Contador(nome, ajuda, rotulos))
+
+
+def medidor(nome: str, ajuda: str, rotulos: Sequence[str] = ()) -> Medidor:
+    return REGISTRO.registrar(Medidor(nome, ajuda, rotulos))
+
+
+def histograma(nome: str, ajuda: str, rotulos: Sequence[str] = (),
+               limites: Sequence[float] = LIMITES_LATENCIA) -> Histograma:
+    return REGISTRO.registrar(Histograma(nome, ajuda, rotulos, limites))
+
+
+def valor_coletado(nome: str, ajuda: str, funcao: Callable[[], Any], tipo: str = "gauge",
+                   rotulos: Sequence[str] = ()) -> ValorColetado:
+    return REGISTRO.registrar(ValorColetado(nome, ajuda, funcao, tipo, rotulos))
+
+
+def exportar() -> str:
+    """Todas as métricas do registro padrão, no formato de texto do Prometheus."""
+    return REGISTRO.exportar()
+
+
+HTTP_EM_ANDAMENTO = medidor("http_requisicoes_em_andamento", "Requisições HTTP sendo atendidas")
+HTTP_REQUISICOES = contador("http_requisicoes_total", "Requisições HTTP atendidas, por método, rota e status",
+                            rotulos=("metodo", "rota", "status"))
+
+
+class MiddlewareMetricas:
+    """
+    Middleware ASGI que conta as requisições em andamento e as atendidas por rota.
+
+    Implementado direto sobre ASGI (sem BaseHTTPMiddleware) para não envolver o
+    corpo das respostas em streaming. A rota é o modelo do caminho (ex.:
+    /api/triagens/{id}), para não criar uma série por URL.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = 500
+
+        async def enviar(mensagem):
+            nonlocal status
+            if mensagem["type"] == "http.response.start":
+                status = mensagem["status"]
+            await send(mensagem)
+
+        HTTP_EM_ANDAMENTO.inc()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            HTTP_EM_ANDAMENTO.dec()
+            rota = scope.get("route")
+            HTTP_REQUISICOES.inc(scope["method"], getattr(rota, "path", "desconhecida"), str(status))
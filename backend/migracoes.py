@@ -0,0 +1,233 @@
+"""
+Migrações versionadas do esquema da tabela validacao_triagem.
+
+A versão aplicada fica em `PRAGMA user_version`. Cada migração é idempotente
+(bancos criados pelas versões anteriores de main.py ou database.py podem já ter
+parte das colunas) e é aplicada em uma transação junto com a atualização da
+versão, de modo que um banco nunca fica em um estado intermediário.
+
+Uso:
+    python migracoes.py              # aplica as migrações pendentes
+    python migracoes.py --verificar  # aplica e confere esquema e planos de consulta (EXPLAIN QUERY PLAN)
+
+Com --verificar, qualquer problema termina o processo com código 1, o que permite
+usar a verificação como etapa de integração contínua sobre um banco descartável:
+
+    TRIAGEM_DB_PATH=$(mktemp -d)/ci.db python migracoes.py --verificar
+"""
+import argparse
+import logging
+import sys
+from typing import Callable, List, Tuple
+
+from estatisticas import reconstruir_estatisticas
+from repositorio import conexao
+
+logger = logging.getLogger("migracoes")
+
+
+def _colunas(conn, tabela: str) -> List[str]:
+    return [coluna[1] for coluna in conn.execute(f"PRAGMA table_info({tabela})")]
+
+
+def _adicionar_colunas(conn, tabela: str, colunas: List[Tuple[str, str]]):
+    existentes = _colunas(conn, tabela)
+    for nome, tipo in colunas:
+        if nome not in existentes:
+            conn.execute(f"ALTER TABLE {tabela} ADD COLUMN {nome} {tipo}")
+
+
+def _criar_tabela(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS validacao_triagem (
+        id TEXT PRIMARY KEY,
+        sintomas TEXT NOT NULL,
+        resposta TEXT NOT NULL,
+        data_hora TEXT NOT NULL,
+        validado INTEGER DEFAULT 0,
+        feedback TEXT,
+        validado_por TEXT,
+        data_validacao TEXT
+    )
+    ''')
+
+
+def _adicionar_classificacao(conn):
+    # Colunas que só existiam nos bancos criados por main.py
+    _adicionar_colunas(conn, "validacao_triagem",
+                       [("classificacao", "TEXT"), ("justificativa", "TEXT"), ("condutas", "TEXT")])
+
+
+def _adicionar_data_indexacao(conn):
+    _adicionar_colunas(conn, "validacao_triagem", [("data_indexacao", "TEXT")])
+
+
+def _criar_indices(conn):
+    # Listagem paginada por (data_hora, id), com e sem o filtro de validação
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_triagem_data_hora ON validacao_triagem (data_hora, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_triagem_validado_data ON validacao_triagem (validado, data_hora, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_triagem_classificacao ON validacao_triagem (classificacao, data_hora, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_triagem_validado_por ON validacao_triagem (validado_por, data_hora, id)")
+
+
+def _criar_estatisticas(conn):
+    # Agregados mantidos incrementalmente, populados a partir das triagens existentes
+    reconstruir_estatisticas(conn)
+
+
+def _adicionar_reprocessamento(conn):
+    # Triagens com classificação provisória (modelo fora do prazo) aguardando nova geração
+    _adicionar_colunas(conn, "validacao_triagem", [("reprocessar", "INTEGER DEFAULT 0")])
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_triagem_reprocessar ON validacao_triagem (data_hora) "
+                 "WHERE reprocessar = 1")
+
+
+def _recriar_indice_reprocessamento(conn):
+    # A fila de reprocessamento filtra também por validado = 0; com o índice só em data_hora,
+    # o planejador preferia idx_triagem_validado_data e percorria todas as triagens pendentes
+    conn.execute("DROP INDEX IF EXISTS idx_triagem_reprocessar")
+    conn.execute("CREATE INDEX idx_triagem_reprocessar ON validacao_triagem (validado, data_hora) "
+                 "WHERE reprocessar = 1")
+
+
+# (versão, descrição, função); a lista só pode crescer no final
+MIGRACOES: List[Tuple[int, str, Callable]] = [
+    (1, "tabela validacao_triagem", _criar_tabela),
+    (2, "colunas de classificação", _adicionar_classificacao),
+    (3, "coluna data_indexacao", _adicionar_data_indexacao),
+    (4, "índices de listagem e filtros", _criar_indices),
+    (5, "tabela de estatísticas agregadas", _criar_estatisticas),
+    (6, "marcação de reprocessamento", _adicionar_reprocessamento),
+    (7, "índice parcial da fila de reprocessamento com validado", _recriar_indice_reprocessamento),
+]
+
+VERSAO_ATUAL = MIGRACOES[-1][0]
+
+
+def versao_esquema(conn) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def aplicar_migracoes() -> int:
+    """
+    Leva o banco até VERSAO_ATUAL aplicando as migrações pendentes em ordem.
+
+    Returns:
+        Número de migrações aplicadas
+    """
+    aplicadas = 0
+    with conexao() as conn:
+        for versao, descricao, migrar in MIGRACOES:
+            # BEGIN IMMEDIATE serializa processos que iniciam ao mesmo tempo
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if versao_esquema(conn) >= versao:
+                    conn.rollback()
+                    continue
+                migrar(conn)
+                conn.execute(f"PRAGMA user_version = {versao}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            aplicadas += 1
+            logger.info(f"Migração {versao} aplicada: {descricao}")
+    return aplicadas
+
+
+# Consultas críticas e o índice que cada uma deve usar
+CONSULTAS_VERIFICADAS = [
+    ("listagem de todas as triagens",
+     "SELECT id FROM validacao_triagem ORDER BY data_hora DESC, id DESC LIMIT 50",
+     "idx_triagem_data_hora"),
+    ("página seguinte (keyset)",
+     "SELECT id FROM validacao_triagem WHERE (data_hora, id) < ('2024-01-01 00:00:00', 'x') "
+     "ORDER BY data_hora DESC, id DESC LIMIT 50",
+     "idx_triagem_data_hora"),
+    ("listagem de pendentes",
+     "SELECT id FROM validacao_triagem WHERE validado = 0 ORDER BY data_hora DESC, id DESC LIMIT 50",
+     "idx_triagem_validado_data"),
+    ("listagem de validadas",
+     "SELECT id FROM validacao_triagem WHERE validado = 1 ORDER BY data_hora DESC, id DESC LIMIT 50",
+     "idx_triagem_validado_data"),
+    ("filtro por classificação",
+     "SELECT id FROM validacao_triagem WHERE classificacao = 'VERMELHO' ORDER BY data_hora DESC, id DESC LIMIT 50",
+     "idx_triagem_classificacao"),
+    ("filtro por validador",
+     "SELECT id FROM validacao_triagem WHERE validado_por = 'admin' ORDER BY data_hora DESC, id DESC LIMIT 50",
+     "idx_triagem_validado_por"),
+    ("contagem de validadas",
+     "SELECT COUNT(*) FROM validacao_triagem WHERE validado = 1",
+     "idx_triagem_validado_data"),
+    ("triagens aguardando reprocessamento",
+     "SELECT id FROM validacao_triagem WHERE reprocessar = 1 AND validado = 0 ORDER BY data_hora LIMIT 10",
+     "idx_triagem_reprocessar"),
+    ("triagem pendente mais antiga",
+     "SELECT MIN(data_hora) FROM validacao_triagem WHERE validado = 0",
+     "idx_triagem_validado_data"),
+]
+
+
+def verificar_esquema() -> List[str]:
+    """
+    Confere que o banco está em VERSAO_ATUAL, que reaplicar as migrações não faz
+    nada e que todos os índices esperados pelas consultas críticas existem.
+
+    Returns:
+        Lista de problemas encontrados (vazia se o esquema está correto)
+    """
+    problemas = []
+    with conexao() as conn:
+        versao = versao_esquema(conn)
+        indices = {linha[0] for linha in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    if versao != VERSAO_ATUAL:
+        problemas.append(f"versão do esquema {versao}, esperada {VERSAO_ATUAL}")
+    reaplicadas = aplicar_migracoes()
+    if reaplicadas:
+        problemas.append(f"{reaplicadas} migrações aplicadas de novo em um banco já atualizado")
+    for indice in sorted({indice for _, _, indice in CONSULTAS_VERIFICADAS} - indices):
+        problemas.append(f"índice {indice} ausente")
+    return problemas
+
+
+def verificar_planos_consulta() -> List[str]:
+    """
+    Confere com EXPLAIN QUERY PLAN que as consultas críticas usam o índice
+    esperado e não ordenam em árvore temporária.
+
+    Returns:
+        Lista de problemas encontrados (vazia se todos os planos estão corretos)
+    """
+    problemas = []
+    with conexao() as conn:
+        for descricao, consulta, indice in CONSULTAS_VERIFICADAS:
+            plano = " | ".join(linha[3] for linha in conn.execute(f"EXPLAIN QUERY PLAN {consulta}"))
+            if indice not in plano:
+                problemas.append(f"{descricao}: índice {indice} não utilizado ({plano})")
+            elif "TEMP B-TREE" in plano:
+                problemas.append(f"{descricao}: ordenação em árvore temporária ({plano})")
+    return problemas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aplica as migrações do banco de triagens")
+    parser.add_argument("--verificar", action="store_true",
+                        help="Confere o esquema e os planos de consulta após aplicar as migrações (código 1 se falhar)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    aplicadas = aplicar_migracoes()
+    print(f"Migrações aplicadas: {aplicadas} (versão do esquema: {VERSAO_ATUAL})")
+
+    if args.verificar:
+        problemas = verificar_esquema() + verificar_planos_consulta()
+        for problema in problemas:
+            print(f"FALHA - {problema}")
+        if problemas:
+            sys.exit(1)
+        print(f"Esquema na versão {VERSAO_ATUAL} e planos de consulta verificados: "
+              f"{len(CONSULTAS_VERIFICADAS)} consultas OK")
+
+
+if __name__ == "__main__":
+    main()
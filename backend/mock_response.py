@@ -1,22 +1,13 @@
 """
 Módulo para fornecer respostas simuladas quando o Ollama não estiver disponível
+
+A cor é decidida pelo motor de regras (motor_regras.py), que reconhece os
+discriminadores do Protocolo de Manchester com tratamento de acentos e negações.
 """
+from motor_regras import pre_triagem
 
-def get_mock_response(sintomas):
-    """
-    Retorna uma resposta simulada baseada nos sintomas
-    
-    Args:
-        sintomas: String com os sintomas do paciente
-        
-    Returns:
-        String com a resposta simulada
-    """
-    sintomas_lower = sintomas.lower()
-    
-    # Caso de emergência (vermelho)
-    if any(termo in sintomas_lower for termo in ["parada", "inconsciente", "choque", "não responde", "sangramento intenso"]):
-        return """Classificação
+RESPOSTAS = {
+    "VERMELHO": """Classificação
 vermelho
 
 Justificativa
@@ -27,11 +18,9 @@ Condutas
 - Monitorização contínua de sinais vitais
 - Avaliação médica imediata (tempo zero)
 - Preparo para suporte avançado de vida
-- Exames laboratoriais de emergência (gasometria, eletrólitos, hemograma)"""
+- Exames laboratoriais de emergência (gasometria, eletrólitos, hemograma)""",
 
-    # Caso muito urgente (laranja)
-    elif any(termo in sintomas_lower for termo in ["dor torácica", "dispneia grave", "confusão", "convulsão"]):
-        return """Classificação
+    "LARANJA": """Classificação
 laranja
 
 Justificativa
@@ -43,11 +32,9 @@ Condutas
 - ECG de 12 derivações em até 10 minutos
 - Avaliação médica em até 10 minutos
 - Coleta de enzimas cardíacas
-- Administração de AAS conforme protocolo"""
+- Administração de AAS conforme protocolo""",
 
-    # Caso urgente (amarelo)
-    elif any(termo in sintomas_lower for termo in ["febre alta", "vômitos", "desidratação", "dor moderada"]):
-        return """Classificação
+    "AMARELO": """Classificação
 amarelo
 
 Justificativa
@@ -57,11 +44,9 @@ Condutas
 - Verificar sinais vitais completos
 - Solicitar hemograma completo e PCR
 - Administrar antitérmico se necessário
-- Reavaliação médica em até 60 minutos"""
+- Reavaliação médica em até 60 minutos""",
 
-    # Caso pouco urgente (verde)
-    elif any(termo in sintomas_lower for termo in ["dor leve", "tosse", "resfriado", "mal estar"]):
-        return """Classificação
+    "VERDE": """Classificação
 verde
 
 Justificativa
@@ -71,11 +56,9 @@ Condutas
 - Verificar sinais vitais
 - Avaliação médica em até 120 minutos
 - Orientações sobre sintomáticos
-- Retorno se piora ou persistência dos sintomas"""
+- Retorno se piora ou persistência dos sintomas""",
 
-    # Caso não urgente (azul)
-    elif any(termo in sintomas_lower for termo in ["renovação", "atestado", "crônico", "consulta de rotina"]):
-        return """Classificação
+    "AZUL": """Classificação
 azul
 
 Justificativa
@@ -86,10 +69,10 @@ Condutas
 - Encaminhar para atendimento ambulatorial
 - Orientar sobre agendamento de consulta eletiva
 - Avaliação médica conforme disponibilidade do serviço"""
+}
 
-    # Caso padrão (amarelo)
-    else:
-        return """Classificação
+# Resposta usada quando nenhum discriminador é reconhecido
+RESPOSTA_PADRAO = """Classificação
 amarelo
 
 Justificativa
@@ -100,4 +83,52 @@ Condutas
 - Avaliação médica em até 60 minutos
 - Exames laboratoriais conforme avaliação médica
 - Medicação sintomática conforme prescrição
-- Orientar retorno imediato se piora dos sintomas"""
\ No newline at end of file
+- Orientar retorno imediato se piora dos sintomas"""
+
+
+def get_mock_response(sintomas, resultado=None):
+    """
+    Retorna uma resposta simulada baseada nos sintomas
+    
+    Args:
+        sintomas: String com os sintomas do paciente
+        resultado: Resultado de pre_triagem já calculado para os sintomas (opcional)
+        
+    Returns:
+        String com a resposta simulada
+    """
+    resultado = resultado or pre_triagem(sintomas)
+    if not resultado.por_regra:
+        return RESPOSTA_PADRAO
+    return RESPOSTAS[resultado.cor]
+
+
+def get_provisional_response(sintomas, resultado=None):
+    """
+    Converte a resposta simulada para o formato usado pelo modelo
+    (CLASSIFICAÇÃO / ANÁLISE CLÍNICA / CONDUTAS RECOMENDADAS), para servir de
+    classificação provisória quando o modelo não responde dentro do prazo.
+
+    Args:
+        sintomas: String com os sintomas do paciente
+        resultado: Resultado de pre_triagem já calculado para os sintomas (opcional)
+
+    Returns:
+        String com a resposta provisória
+    """
+    resultado = resultado or pre_triagem(sintomas)
+    secoes = get_mock_response(sintomas, resultado).split("\n\n")
+    justificativa = secoes[1].split("\n", 1)[1].strip()
+    condutas = [linha.lstrip("- ").strip() for linha in secoes[2].split("\n")[1:] if linha.strip()]
+    analise = ["Classificação provisória por regras locais, pendente de reprocessamento pelo modelo"]
+    if resultado.discriminadores:
+        analise.append("Discriminadores: " + ", ".join(d["descricao"] for d in resultado.discriminadores))
+    analise.append(justificativa)
+
+    return f"""CLASSIFICAÇÃO: {resultado.cor}
+
+ANÁLISE CLÍNICA:
+""" + "\n".join(analise) + """
+
+CONDUTAS RECOMENDADAS:
+""" + "\n".join(condutas)
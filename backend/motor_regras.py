@@ -0,0 +1,236 @@
+"""
+Pré-triagem por regras: classificação provisória a partir de discriminadores do
+Protocolo de Manchester, em microssegundos.
+
+A tabela de discriminadores (discriminadores_manchester.json) é compilada em um
+autômato de Aho-Corasick sobre palavras, que encontra, em uma única passada pelas
+palavras do texto, todos os termos de todos os discriminadores, as expressões de
+negação ("sem", "nega", "não apresenta", ...), as palavras que encerram o escopo
+de uma negação ("mas", "com", fim de frase) e as conjunções que o encerram depois
+de um discriminador já negado ("sem febre e dor no peito": só a febre é negada).
+O texto e os termos são normalizados da mesma forma: minúsculas, sem acentos e
+só com letras, dígitos, espaços e ponto final.
+
+Um discriminador negado ("nega dor torácica") não conta. Termos contidos em um
+termo mais longo encontrado no mesmo trecho ("sangramento" dentro de
+"sangramento intenso", "apresenta" dentro de "não apresenta") são descartados.
+A cor final é a mais grave entre os discriminadores encontrados, ou a cor padrão
+da tabela se nenhum for encontrado. A negação de um discriminador mais grave que
+a cor padrão nunca leva a uma cor abaixo dela.
+"""
+import json
+import logging
+import os
+import time
+import unicodedata
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("motor_regras")
+
+TABELA_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "discriminadores_manchester.json")
+
+# Da mais grave para a menos grave
+CORES = ("VERMELHO", "LARANJA", "AMARELO", "VERDE", "AZUL")
+_GRAVIDADE = {cor: i for i, cor in enumerate(CORES)}
+
+# Após a remoção dos acentos: fins de frase viram a palavra "." e os demais sinais, espaço
+_SEPARADORES = str.maketrans({
+    chr(c): (" . " if chr(c) in ".;!?\n" else " ")
+    for c in range(128) if not chr(c).isalnum()
+})
+
+# Tipos de padrão do autômato
+_DISCRIMINADOR, _NEGACAO, _QUEBRA, _CONJUNCAO = 0, 1, 2, 3
+
+
+def palavras(texto: str) -> List[str]:
+    """Palavras do texto em minúsculas e sem acentos; fins de frase viram a palavra "."."""
+    texto = unicodedata.normalize("NFKD", texto.lower()).encode("ascii", "ignore").decode("ascii")
+    return texto.translate(_SEPARADORES).split()
+
+
+@dataclass
+class ResultadoPreTriagem:
+    cor: str
+    discriminadores: List[Dict[str, str]] = field(default_factory=list)
+    negados: List[Dict[str, str]] = field(default_factory=list)
+    duracao_us: float = 0.0
+
+    @property
+    def por_regra(self) -> bool:
+        """False quando nenhum discriminador foi encontrado e a cor é a padrão."""
+        return bool(self.discriminadores)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "classificacao": self.cor,
+            "discriminadores": self.discriminadores,
+            "negados": self.negados,
+            "duracao_us": round(self.duracao_us, 1)
+        }
+
+
+class MotorRegras:
+    def __init__(self, tabela: Dict[str, Any]):
+        """
+        Compila a tabela de discriminadores.
+
+        Args:
+            tabela: Conteúdo de discriminadores_manchester.json
+        """
+        self.versao = tabela.get("versao")
+        self.cor_padrao = tabela.get("cor_padrao", "AMARELO")
+        self.janela_negacao = int(tabela.get("janela_negacao", 4))
+        self.discriminadores = {d["id"]: d for d in tabela["discriminadores"]}
+        for discriminador in tabela["discriminadores"]:
+            if discriminador["cor"] not in _GRAVIDADE:
+                raise ValueError(f"Cor inválida no discriminador {discriminador['id']}: {discriminador['cor']}")
+
+        entradas: List[Tuple[int, Optional[str], str]] = []
+        for discriminador in tabela["discriminadores"]:
+            entradas.extend((_DISCRIMINADOR, discriminador["id"], termo) for termo in discriminador["termos"])
+        entradas.extend((_NEGACAO, None, termo) for termo in tabela.get("negacoes", []))
+        entradas.extend((_QUEBRA, None, termo) for termo in list(tabela.get("quebras_escopo", [])) + ["."])
+        entradas.extend((_CONJUNCAO, None, termo) for termo in tabela.get("conjuncoes_escopo", []))
+
+        termos = [tuple(palavras(termo)) for _, _, termo in entradas]
+        # (tipo, id do discriminador, termo original, número de palavras)
+        self._padroes: List[Tuple[int, Optional[str], str, int]] = [
+            (tipo, ident, original, len(termo)) for (tipo, ident, original), termo in zip(entradas, termos)
+        ]
+        # Gravidade de cada padrão (negações, quebras e conjunções nunca são aceitas como discriminador)
+        self._gravidade = [_GRAVIDADE[self.discriminadores[ident]["cor"]] if tipo == _DISCRIMINADOR else len(CORES)
+                           for tipo, ident, _, _ in self._padroes]
+        self._compilar(termos)
+        logger.info(f"Motor de regras compilado: {len(self.discriminadores)} discriminadores, "
+                    f"{len(termos)} padrões, {len(self._transicoes)} estados")
+
+    @classmethod
+    def de_arquivo(cls, caminho: str = TABELA_PADRAO) -> "MotorRegras":
+        with open(caminho, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def _compilar(self, termos: List[Tuple[str, ...]]):
+        """
+        Constrói o autômato de Aho-Corasick sobre palavras (o alfabeto são as palavras
+        dos termos), com as transições de falha já resolvidas.
+        """
+        transicoes: List[Dict[str, int]] = [{}]
+        saidas: List[List[int]] = [[]]
+        for indice, termo in enumerate(termos):
+            estado = 0
+            for palavra in termo:
+                proximo = transicoes[estado].get(palavra)
+                if proximo is None:
+                    proximo = len(transicoes)
+                    transicoes[estado][palavra] = proximo
+                    transicoes.append({})
+                    saidas.append([])
+                estado = proximo
+            saidas[estado].append(indice)
+
+        # BFS: cada estado herda as saídas do seu estado de falha, e as transições
+        # ausentes passam a seguir as do estado de falha (autômato determinístico)
+        falha = [0] * len(transicoes)
+        fila = deque(transicoes[0].values())
+        while fila:
+            estado = fila.popleft()
+            for palavra, proximo in list(transicoes[estado].items()):
+                falha[proximo] = transicoes[falha[estado]].get(palavra, 0) if estado else 0
+                saidas[proximo] = saidas[proximo] + saidas[falha[proximo]]
+                fila.append(proximo)
+            if estado:
+                for palavra, destino in transicoes[falha[estado]].items():
+                    transicoes[estado].setdefault(palavra, destino)
+
+        self._transicoes = transicoes
+        self._saidas = [tuple(s) for s in saidas]
+
+    def _buscar(self, palavras: List[str]) -> List[Tuple[int, int, int]]:
+        """Uma passada pelas palavras do texto; retorna (palavra inicial, -(palavra final + 1), índice do padrão)."""
+        transicoes = self._transicoes
+        saidas = self._saidas
+        padroes = self._padroes
+        encontrados = []
+        estado = 0
+        for posicao, palavra in enumerate(palavras):
+            estado = transicoes[estado].get(palavra, 0)
+            for indice in saidas[estado]:
+                encontrados.append((posicao - padroes[indice][3] + 1, -(posicao + 1), indice))
+        return encontrados
+
+    def classificar(self, sintomas: str) -> ResultadoPreTriagem:
+        """Classificação provisória da queixa, com os discriminadores encontrados e os negados."""
+        inicio_us = time.perf_counter()
+        ocorrencias = self._buscar(palavras(sintomas))
+
+        # Ordena por início, com o termo mais longo primeiro: termos contidos em outro
+        # já tratado são ignorados, inclusive negações que fazem parte de um termo ("sem pulso")
+        # e quebras que fazem parte de uma negação ("não apresenta")
+        ocorrencias.sort()
+        aceitos: List[int] = []
+        negados: List[int] = []
+        negacao_ate = -1
+        negou_no_escopo = False
+        fim_coberto = -1
+        for inicio, fim, indice in ocorrencias:
+            fim = -fim
+            if fim <= fim_coberto:
+                continue
+            tipo = self._padroes[indice][0]
+            if tipo == _QUEBRA or (tipo == _CONJUNCAO and negou_no_escopo):
+                negacao_ate = -1
+            elif tipo == _NEGACAO:
+                negacao_ate = fim - 1 + self.janela_negacao
+                negou_no_escopo = False
+            elif tipo == _DISCRIMINADOR:
+                if inicio <= negacao_ate:
+                    negados.append(indice)
+                    negou_no_escopo = True
+                else:
+                    aceitos.append(indice)
+            fim_coberto = fim
+
+        padrao = _GRAVIDADE[self.cor_padrao]
+        gravidade = min(map(self._gravidade.__getitem__, aceitos)) if aceitos else padrao
+        # Uma negação mal interpretada de um discriminador grave não pode rebaixar a queixa abaixo da cor padrão
+        if negados and min(map(self._gravidade.__getitem__, negados)) < padrao:
+            gravidade = min(gravidade, padrao)
+        cor = CORES[gravidade]
+        return ResultadoPreTriagem(
+            cor=cor,
+            discriminadores=self._descrever(aceitos),
+            negados=self._descrever(negados),
+            duracao_us=(time.perf_counter() - inicio_us) * 1e6
+        )
+
+    def _descrever(self, indices: List[int]) -> List[Dict[str, str]]:
+        """Um item por discriminador, dos mais graves para os menos graves."""
+        vistos = set()
+        resultado = []
+        for indice in sorted(indices, key=self._gravidade.__getitem__):
+            _, ident, termo, _ = self._padroes[indice]
+            if ident not in vistos:
+                vistos.add(ident)
+                discriminador = self.discriminadores[ident]
+                resultado.append({"id": ident, "cor": discriminador["cor"],
+                                  "descricao": discriminador["descricao"], "termo": termo})
+        return resultado
+
+
+_motor: Optional[MotorRegras] = None
+
+
+def obter_motor() -> MotorRegras:
+    """Motor compartilhado, compilado no primeiro uso a partir de MOTOR_REGRAS_TABELA (ou da tabela padrão)."""
+    global _motor
+    if _motor is None:
+        _motor = MotorRegras.de_arquivo(os.getenv("MOTOR_REGRAS_TABELA", TABELA_PADRAO))
+    return _motor
+
+
+def pre_triagem(sintomas: str) -> ResultadoPreTriagem:
+    """Atalho para obter_motor().classificar(sintomas)."""
+    return obter_motor().classificar(sintomas)
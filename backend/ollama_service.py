@@ -1,104 +1,283 @@
-import requests
+import asyncio
+import httpx
 import json
 import logging
 import time
-from typing import Dict, Any, Tuple, Optional
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Any, List, Tuple, Optional
+
+from construtor_prompt import ConstrutorPrompt
+from metricas import contador
+from rastreamento import rastro_atual, span
+from saude_ollama import CircuitBreaker
 
-# Configurar logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("ollama_service")
-handler = logging.FileHandler("ollama_service.log")
-handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
-logger.addHandler(handler)
+
+# A resposta termina nas condutas; estas sequências cortam continuações fora do formato
+DEFAULT_STOP = ["\n\n\n", "SINTOMAS DO PACIENTE:", "[INST]", "</s>"]
+
+TENTATIVAS = contador("ollama_tentativas_total", "Chamadas ao Ollama, por modo e resultado",
+                      rotulos=("modo", "resultado"))
+RETENTATIVAS = contador("ollama_retentativas_total", "Novas tentativas após uma falha do Ollama", rotulos=("modo",))
+FALLBACKS = contador("ollama_fallback_total", "Gerações sem resposta do modelo, por modo e motivo",
+                     rotulos=("modo", "motivo"))
+TOKENS_GERADOS = contador("ollama_tokens_gerados_total", "Tokens gerados pelo modelo (eval_count)")
+
+
+@dataclass
+class GenerationResult:
+    """Resultado de uma geração: `texto` é None quando o modelo não respondeu."""
+    texto: Optional[str]
+    motivo: str  # "ok", "falha" (tentativas esgotadas), "prazo" (deadline atingido) ou "circuito_aberto"
+    tentativas: int
+    duracao_s: float
+    tokens_gerados: Optional[int] = None
+    tokens_prompt: Optional[int] = None
+
+    @property
+    def sucesso(self) -> bool:
+        return self.texto is not None
+
 
 class OllamaService:
-    def __init__(self, url: str = "http://localhost:11434", model: str = "mistral", max_retries: int = 3 ):
+    def __init__(self, url: str = "http://localhost:11434", model: str = "mistral", max_retries: int = 3,
+                 connect_timeout: float = 5.0, read_timeout: float = 60.0, max_connections: int = 10,
+                 construtor_prompt: Optional[ConstrutorPrompt] = None, num_predict: int = 320,
+                 stop: Optional[List[str]] = None, min_attempt_s: float = 2.0,
+                 circuit_breaker: Optional[CircuitBreaker] = None):
+        """
+        Args:
+            num_predict: Número máximo de tokens gerados por resposta
+            stop: Sequências que encerram a geração
+            min_attempt_s: Tempo mínimo restante até o deadline para valer a pena uma nova tentativa
+            circuit_breaker: Circuito que recusa as chamadas enquanto o Ollama está fora do ar
+        """
         self.url = url
         self.model = model
         self.max_retries = max_retries
+        self.num_predict = num_predict
+        self.stop = DEFAULT_STOP if stop is None else stop
+        self.min_attempt_s = min_attempt_s
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=30.0
+        )
+        self._client: Optional[httpx.AsyncClient] = None
+        self.construtor_prompt = construtor_prompt or ConstrutorPrompt()
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
         logger.info(f"Serviço Ollama inicializado: modelo={model}, max_retries={max_retries}")
 
-    async def generate_response(self, symptoms: str) -> str:
-        """Gera uma resposta do modelo Ollama com base nos sintomas fornecidos."""
-        prompt = self._create_prompt(symptoms)
+    def _get_client(self) -> httpx.AsyncClient:
+        """Retorna o cliente HTTP compartilhado, criando-o no primeiro uso.
+
+        O cliente mantém um pool de conexões keep-alive reutilizado por todas as
+        requisições, evitando um novo handshake TCP a cada chamada ao Ollama.
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(base_url=self.url, timeout=self.timeout, limits=self.limits)
+        return self._client
+
+    async def aclose(self):
+        """Fecha o cliente HTTP e libera as conexões do pool."""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+    async def listar_modelos(self) -> List[str]:
+        """Nomes dos modelos instalados no Ollama (/api/tags), usados na verificação de saúde."""
+        response = await self._get_client().get("/api/tags")
+        response.raise_for_status()
+        return [modelo.get("name", "") for modelo in response.json().get("models", [])]
+
+    async def generate_response(self, prompt: str) -> str:
+        """Gera uma resposta do modelo Ollama para o prompt já montado por format_prompt."""
+        result = await self.generate(prompt)
+        # Se todas as tentativas falharem, retornar uma resposta de fallback
+        return result.texto if result.sucesso else self._generate_fallback_response()
+
+    async def generate(self, prompt: str, deadline: Optional[float] = None) -> GenerationResult:
+        """
+        Gera uma resposta respeitando um deadline opcional.
+
+        Cada tentativa é limitada ao tempo restante, e a espera do backoff é
+        cancelada quando o tempo que sobraria depois dela não comporta uma nova
+        tentativa (min_attempt_s). Com o circuito aberto, retorna sem chamar o
+        Ollama. Não usa a resposta de fallback: quem chama decide o que fazer
+        quando `sucesso` é False.
+
+        Args:
+            prompt: Prompt já montado por format_prompt
+            deadline: Instante limite em time.monotonic(), ou None para usar só os timeouts do cliente
+        """
+        client = self._get_client()
+        inicio = time.monotonic()
+        
+        def restante() -> Optional[float]:
+            return None if deadline is None else deadline - time.monotonic()
         
         for attempt in range(1, self.max_retries + 1):
+            tempo = restante()
+            if tempo is not None and tempo <= 0:
+                return self._sem_resposta("prazo", attempt - 1, inicio)
+            if not self.circuit_breaker.permitir():
+                logger.warning("Circuito do Ollama aberto: chamada recusada")
+                return self._sem_resposta("circuito_aberto", attempt - 1, inicio)
+            if attempt > 1:
+                RETENTATIVAS.inc("generate")
             try:
                 logger.info(f"Enviando prompt para Ollama (tentativa {attempt}/{self.max_retries})")
-                response = requests.post(
-                    f"{self.url}/api/generate",
-                    json={
-                        "model": self.model,
-                        "prompt": prompt,
-                        "stream": False,
-                        "options": {
-                            "temperature": 0.2,
-                            "top_p": 0.9
-                        }
-                    },
-                    timeout=60
-                )
+                with span("ollama.generate", tentativa=attempt) as etapa:
+                    response = await asyncio.wait_for(
+                        client.post("/api/generate", json=self._build_payload(prompt, stream=False)),
+                        timeout=tempo
+                    )
+                    etapa.definir(status=response.status_code)
                 
                 if response.status_code == 200:
                     result = response.json()
                     response_text = result.get("response", "")
                     logger.info(f"Resposta gerada com sucesso: {len(response_text)} caracteres")
-                    return response_text
+                    self.circuit_breaker.registrar_sucesso()
+                    TENTATIVAS.inc("generate", "ok")
+                    if result.get("eval_count"):
+                        TOKENS_GERADOS.inc(valor=result["eval_count"])
+                    return GenerationResult(response_text, "ok", attempt, time.monotonic() - inicio,
+                                            result.get("eval_count"), result.get("prompt_eval_count"))
                 else:
                     logger.error(f"Erro na API Ollama: {response.status_code} - {response.text}")
+                    self.circuit_breaker.registrar_falha(f"HTTP {response.status_code}")
+                    TENTATIVAS.inc("generate", "erro_http")
+            except asyncio.TimeoutError:
+                # O prazo é da triagem, não do Ollama: o cancelamento do lado do cliente não conta
+                # como falha no circuito (timeouts de leitura do httpx caem no except abaixo)
+                logger.error(f"Deadline da triagem atingido durante a tentativa {attempt}")
+                TENTATIVAS.inc("generate", "prazo")
+                return self._sem_resposta("prazo", attempt, inicio)
             except Exception as e:
                 logger.error(f"Erro ao chamar API Ollama: {str(e)}")
+                self.circuit_breaker.registrar_falha(type(e).__name__)
+                TENTATIVAS.inc("generate", "erro")
             
             # Esperar antes de tentar novamente (backoff exponencial)
             if attempt < self.max_retries:
                 wait_time = 2 ** attempt
+                tempo = restante()
+                if tempo is not None and tempo - wait_time < self.min_attempt_s:
+                    logger.warning(f"Backoff cancelado: {tempo:.1f}s restantes não comportam nova tentativa")
+                    return self._sem_resposta("prazo", attempt, inicio)
                 logger.info(f"Aguardando {wait_time}s antes da próxima tentativa...")
-                time.sleep(wait_time)
+                with span("ollama.backoff", segundos=wait_time):
+                    await asyncio.sleep(wait_time)
         
-        # Se todas as tentativas falharem, retornar uma resposta de fallback
         logger.error("Todas as tentativas de chamar a API Ollama falharam")
-        return self._generate_fallback_response()
+        return self._sem_resposta("falha", self.max_retries, inicio)
+
+    @staticmethod
+    def _sem_resposta(motivo: str, tentativas: int, inicio: float) -> GenerationResult:
+        FALLBACKS.inc("generate", motivo)
+        return GenerationResult(None, motivo, tentativas, time.monotonic() - inicio)
+
+    async def generate_stream(self, prompt: str, fallback: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Gera a resposta do modelo Ollama em modo streaming.
+
+        Repassa os fragmentos de texto à medida que o modelo os produz. Falhas antes
+        do primeiro fragmento são tratadas com o mesmo backoff de generate_response;
+        se todas as tentativas falharem, ou com o circuito aberto, a resposta de
+        fallback é emitida inteira.
+
+        Args:
+            prompt: Prompt já montado por format_prompt
+            fallback: Texto emitido se todas as tentativas falharem (padrão: resposta genérica AMARELO)
+
+        Yields:
+            Fragmentos de texto da resposta
+        """
+        client = self._get_client()
+
+        for attempt in range(1, self.max_retries + 1):
+            if not self.circuit_breaker.permitir():
+                logger.warning("Circuito do Ollama aberto: streaming recusado")
+                FALLBACKS.inc("stream", "circuito_aberto")
+                break
+            if attempt > 1:
+                RETENTATIVAS.inc("stream")
+            emitted = False
+            inicio_tentativa = time.perf_counter()
+            try:
+                logger.info(f"Enviando prompt para Ollama em streaming (tentativa {attempt}/{self.max_retries})")
+                payload = self._build_payload(prompt, stream=True)
+                with span("ollama.stream", tentativa=attempt) as etapa:
+                    async with client.stream("POST", "/api/generate", json=payload) as response:
+                        etapa.definir(status=response.status_code)
+                        if response.status_code != 200:
+                            body = await response.aread()
+                            logger.error(f"Erro na API Ollama: {response.status_code} - {body.decode(errors='replace')}")
+                            self.circuit_breaker.registrar_falha(f"HTTP {response.status_code}")
+                            TENTATIVAS.inc("stream", "erro_http")
+                        else:
+                            async for line in response.aiter_lines():
+                                if not line:
+                                    continue
+                                chunk = json.loads(line)
+                                token = chunk.get("response", "")
+                                if token:
+                                    if not emitted:
+                                        self.circuit_breaker.registrar_sucesso()
+                                        rastro = rastro_atual()
+                                        if rastro is not None:
+                                            rastro.adicionar("ollama.primeiro_token", inicio_tentativa,
+                                                             time.perf_counter())
+                                    emitted = True
+                                    yield token
+                                if chunk.get("done"):
+                                    break
+                            logger.info("Streaming da resposta concluído")
+                            TENTATIVAS.inc("stream", "ok")
+                            return
+            except Exception as e:
+                logger.error(f"Erro no streaming da API Ollama: {str(e)}")
+                TENTATIVAS.inc("stream", "erro")
+                # Não é possível reenviar o que o cliente já recebeu
+                if emitted:
+                    raise
+                self.circuit_breaker.registrar_falha(type(e).__name__)
+
+            if attempt < self.max_retries:
+                wait_time = 2 ** attempt
+                logger.info(f"Aguardando {wait_time}s antes da próxima tentativa...")
+                with span("ollama.backoff", segundos=wait_time):
+                    await asyncio.sleep(wait_time)
+        else:
+            logger.error("Todas as tentativas de streaming da API Ollama falharam")
+            FALLBACKS.inc("stream", "falha")
+        yield fallback if fallback is not None else self._generate_fallback_response()
+
+    def _build_payload(self, prompt: str, stream: bool) -> Dict[str, Any]:
+        """Monta o corpo da requisição para /api/generate."""
+        return {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": stream,
+            "options": {
+                "temperature": 0.2,
+                "top_p": 0.9,
+                "num_predict": self.num_predict,
+                "stop": self.stop
+            }
+        }
 
     def format_prompt(self, symptoms: str, similar_cases=None) -> str:
-        """Cria um prompt estruturado para o modelo Ollama com foco em respostas concisas."""
-        return f"""Você é um sistema especializado em triagem hospitalar baseado no Protocolo de Manchester.
-        
-    Sua tarefa é analisar os sintomas do paciente e fornecer:
-    1. Uma classificação de urgência (VERMELHO, LARANJA, AMARELO, VERDE ou AZUL)
-    2. Uma análise clínica em tópicos curtos e objetivos
-    3. Condutas recomendadas em formato de lista numerada
-
-    SINTOMAS DO PACIENTE:
-    {symptoms}
-
-    PROTOCOLO DE MANCHESTER:
-    - VERMELHO (Emergência): Risco imediato à vida. Atendimento imediato.
-    - LARANJA (Muito Urgente): Risco alto. Atendimento em até 10 minutos.
-    - AMARELO (Urgente): Risco moderado. Atendimento em até 60 minutos.
-    - VERDE (Pouco Urgente): Risco baixo. Atendimento em até 120 minutos.
-    - AZUL (Não Urgente): Sem risco. Atendimento em até 240 minutos.
-
-    Forneça sua resposta no seguinte formato exato:
-
-    CLASSIFICAÇÃO: [COR]
-
-    ANÁLISE CLÍNICA:
-    [Ponto principal 1 - máximo 15 palavras]
-    [Ponto principal 2 - máximo 15 palavras]
-    [Ponto principal 3 - máximo 15 palavras]
-    [Ponto principal 4 - máximo 15 palavras]
-
-    CONDUTAS RECOMENDADAS:
-    [Conduta 1 - máximo 15 palavras]
-    [Conduta 2 - máximo 15 palavras]
-    [Conduta 3 - máximo 15 palavras]
-    [Conduta 4 - máximo 15 palavras]
-    [Conduta 5 - máximo 15 palavras]
-
-    IMPORTANTE: Seja extremamente conciso. Use apenas tópicos curtos com informações essenciais. Evite frases longas e explicações detalhadas. NÃO INCLUA MARCADORES (•, *, números) no início dos tópicos.
-    """
-
-    # Se você tiver o método _create_prompt como alias, atualize-o também
+        """
+        Monta o prompt com o prefixo fixo de instruções, os casos validados
+        semelhantes que couberem no orçamento de tokens e os sintomas do paciente.
+        """
+        prompt = self.construtor_prompt.construir(symptoms, similar_cases)
+        logger.info(f"Prompt montado: ~{prompt.tokens_estimados} tokens, {prompt.casos_incluidos} casos semelhantes")
+        return prompt.texto
+
     def _create_prompt(self, symptoms: str, similar_cases=None) -> str:
         """Alias para format_prompt para manter compatibilidade."""
         return self.format_prompt(symptoms, similar_cases)
@@ -117,23 +296,30 @@ CONDUTAS RECOMENDADAS:
 4. Documentação do caso como incidente técnico
 5. Verificação manual dos sintomas relatados"""
 
+    def is_fallback_response(self, response: str) -> bool:
+        """Indica se o texto é a resposta de fallback (que não deve ser armazenada em cache)."""
+        return response.strip() == self._generate_fallback_response().strip()
+
+    def extract_classification(self, response: str) -> Optional[str]:
+        """
+        Extrai a cor da linha CLASSIFICAÇÃO, inclusive de uma resposta ainda parcial.
+
+        Returns:
+            A cor encontrada ou None se a linha ainda não contém uma cor reconhecida
+        """
+        if "CLASSIFICAÇÃO:" not in response:
+            return None
+        classification_line = response.split("CLASSIFICAÇÃO:")[1].split("\n")[0].strip()
+        for color in ("VERMELHO", "LARANJA", "AMARELO", "VERDE", "AZUL"):
+            if color in classification_line:
+                return color
+        return None
+
     def parse_response(self, response: str) -> tuple:
         """Analisa a resposta do modelo para extrair classificação, justificativa e condutas."""
         try:
             # Extrair classificação
-            classification = ""
-            if "CLASSIFICAÇÃO:" in response:
-                classification_line = response.split("CLASSIFICAÇÃO:")[1].split("\n")[0].strip()
-                if "VERMELHO" in classification_line:
-                    classification = "VERMELHO"
-                elif "LARANJA" in classification_line:
-                    classification = "LARANJA"
-                elif "AMARELO" in classification_line:
-                    classification = "AMARELO"
-                elif "VERDE" in classification_line:
-                    classification = "VERDE"
-                elif "AZUL" in classification_line:
-                    classification = "AZUL"
+            classification = self.extract_classification(response) or ""
             
             # Extrair justificativa
             justification = ""
@@ -0,0 +1,184 @@
+"""
+Perfilamento opcional de requisições amostradas, ativado por um administrador.
+
+Dois modos:
+
+    amostragem  uma thread captura a pilha de todas as threads a cada `intervalo_ms`
+                (sys._current_frames) e grava as pilhas agregadas no formato "folded"
+                (uma pilha por linha com a contagem), lido por flamegraph.pl, speedscope
+                e Perfetto. Custo baixo, e inclui as threads de embeddings e do SQLite.
+    cprofile    cProfile na thread do loop de eventos durante a requisição, gravado
+                como .prof (pstats, snakeviz). Mais detalhado e mais caro; não vê o
+                trabalho feito em outras threads.
+
+Nos dois modos o perfil cobre o processo durante a requisição amostrada, então
+requisições concorrentes aparecem junto. Só um perfil é coletado por vez; com
+`maximo` perfis gravados, o perfilamento se desativa sozinho.
+"""
+import asyncio
+import cProfile
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger("perfilamento")
+
+MODOS = ("amostragem", "cprofile")
+
+
+class _PerfilCProfile:
+    extensao = "prof"
+
+    def __init__(self, intervalo_ms: float):
+        self._perfil = cProfile.Profile()
+
+    def iniciar(self):
+        self._perfil.enable()
+
+    def parar(self):
+        self._perfil.disable()
+
+    def gravar(self, caminho: str):
+        self._perfil.dump_stats(caminho)
+
+
+class _PerfilAmostragem:
+    extensao = "folded"
+
+    def __init__(self, intervalo_ms: float):
+        self.intervalo_s = intervalo_ms / 1000
+        self.pilhas: Counter = Counter()
+        self.amostras = 0
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._amostrar, name="perfilador", daemon=True)
+
+    def iniciar(self):
+        self._thread.start()
+
+    def _amostrar(self):
+        proprio = threading.get_ident()
+        nomes: Dict[int, str] = {}
+        while not self._parar.wait(self.intervalo_s):
+            frames = sys._current_frames()
+            if len(nomes) != len(frames):
+                nomes = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in frames.items():
+                if ident == proprio:
+                    continue
+                pilha = []
+                while frame is not None:
+                    codigo = frame.f_code
+                    pilha.append(f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})")
+                    frame = frame.f_back
+                pilha.append(nomes.get(ident, str(ident)))
+                self.pilhas[";".join(reversed(pilha))] += 1
+            self.amostras += 1
+
+    def parar(self):
+        self._parar.set()
+        self._thread.join()
+
+    def gravar(self, caminho: str):
+        with open(caminho, "w", encoding="utf-8") as f:
+            for pilha, contagem in self.pilhas.most_common():
+                f.write(f"{pilha} {contagem}\n")
+
+
+class Perfilador:
+    """Estado do perfilamento (configurado pela rota administrativa) e coleta por requisição."""
+
+    def __init__(self, diretorio: str = "./perfis", historico: int = 50):
+        self.diretorio = diretorio
+        self.ativo = False
+        self.modo = "amostragem"
+        self.taxa = 0.1
+        self.restantes = 0
+        self.intervalo_ms = 5.0
+        self.arquivos = deque(maxlen=historico)
+        self._em_uso = threading.Lock()
+
+    def configurar(self, ativo: bool, modo: Optional[str] = None, taxa: Optional[float] = None,
+                   maximo: Optional[int] = None, intervalo_ms: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Ativa ou desativa o perfilamento.
+
+        Args:
+            ativo: Liga ou desliga a amostragem de requisições
+            modo: "amostragem" ou "cprofile"
+            taxa: Fração das requisições perfiladas (0 a 1)
+            maximo: Perfis gravados antes de desativar automaticamente
+            intervalo_ms: Intervalo entre amostras de pilha no modo amostragem
+        """
+        if modo is not None:
+            if modo not in MODOS:
+                raise ValueError(f"Modo de perfilamento inválido: {modo} (opções: {', '.join(MODOS)})")
+            self.modo = modo
+        if taxa is not None:
+            if not 0 < taxa <= 1:
+                raise ValueError("A taxa de amostragem deve estar entre 0 (exclusivo) e 1")
+            self.taxa = taxa
+        if intervalo_ms is not None:
+            self.intervalo_ms = max(1.0, intervalo_ms)
+        if maximo is not None:
+            self.restantes = max(0, maximo)
+        elif ativo and self.restantes == 0:
+            self.restantes = 10
+        self.ativo = ativo and self.restantes > 0
+        if self.ativo:
+            os.makedirs(self.diretorio, exist_ok=True)
+        logger.info(f"Perfilamento {'ativado' if self.ativo else 'desativado'}: modo={self.modo}, "
+                    f"taxa={self.taxa}, restantes={self.restantes}")
+        return self.estado()
+
+    def estado(self) -> Dict[str, Any]:
+        return {
+            "ativo": self.ativo,
+            "modo": self.modo,
+            "taxa": self.taxa,
+            "restantes": self.restantes,
+            "intervalo_ms": self.intervalo_ms,
+            "diretorio": os.path.abspath(self.diretorio),
+            "arquivos": list(self.arquivos)
+        }
+
+    def iniciar(self):
+        """Sorteia a requisição atual; retorna o perfil em coleta ou None se não for amostrada."""
+        if not self.ativo or random.random() >= self.taxa:
+            return None
+        if not self._em_uso.acquire(blocking=False):
+            return None
+        self.restantes -= 1
+        if self.restantes <= 0:
+            self.ativo = False
+        perfil = (_PerfilCProfile if self.modo == "cprofile" else _PerfilAmostragem)(self.intervalo_ms)
+        try:
+            perfil.iniciar()
+        except Exception as e:
+            # Ex.: outro profiler já ativo na thread do loop de eventos
+            logger.error(f"Erro ao iniciar perfil: {str(e)}")
+            self._em_uso.release()
+            return None
+        return perfil
+
+    async def concluir(self, perfil, rastro):
+        """Encerra a coleta e grava o arquivo (fora do loop de eventos)."""
+        try:
+            perfil.parar()
+            rota = "".join(c if c.isalnum() else "_" for c in rastro.rota).strip("_")
+            nome = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{rota}_{rastro.id}.{perfil.extensao}"
+            caminho = os.path.join(self.diretorio, nome)
+            inicio = time.perf_counter()
+            await asyncio.to_thread(perfil.gravar, caminho)
+            self.arquivos.append(caminho)
+            logger.info(f"Perfil gravado: {caminho} ({rastro.duracao_ms:.0f}ms de requisição, "
+                        f"{(time.perf_counter() - inicio) * 1000:.0f}ms para gravar)")
+        except Exception as e:
+            logger.error(f"Erro ao gravar perfil: {str(e)}")
+        finally:
+            self._em_uso.release()
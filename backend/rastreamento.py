@@ -0,0 +1,312 @@
+"""
+Rastreamento por requisição: spans das etapas, cabeçalho Server-Timing, registro
+estruturado do detalhamento e exportação dos rastros para um arquivo JSONL local.
+
+O middleware abre um Rastro por requisição HTTP e o guarda em uma ContextVar. O
+`span()` só lê essa variável (não a altera), então funciona nas threads que
+herdam o contexto (asyncio.to_thread e repositorio.executar copiam o contexto) e
+entre os yields de um gerador de streaming. Sem rastro ativo, um span custa uma
+leitura da ContextVar.
+
+    with span("chroma.query", n_results=3):
+        collection.query(...)
+
+Trabalho compartilhado por várias requisições, como um lote de embeddings do
+EmbeddingBatcher, é registrado com `usar_rastro(RastroLote(rastros))`: os spans
+vão para o rastro de cada requisição do lote.
+
+Os rastros exportados (TRACE_EXPORT_PATH) podem ser convertidos para o formato
+de eventos do Chrome, aberto offline no Perfetto ou em chrome://tracing:
+
+    python rastreamento.py rastros.jsonl rastros_chrome.json
+"""
+import json
+import logging
+import queue
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger("rastreamento")
+
+_rastro_atual: ContextVar[Optional["Rastro"]] = ContextVar("rastro_atual", default=None)
+
+# Identificadores de requisição aceitos do cliente (X-Request-ID); os demais são substituídos
+_ID_VALIDO = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+@dataclass
+class Span:
+    nome: str
+    inicio_ms: float  # relativo ao início da requisição
+    duracao_ms: float
+    thread: str
+    atributos: Dict[str, Any] = field(default_factory=dict)
+
+
+class Rastro:
+    """Spans de uma requisição; `adicionar` pode ser chamado de qualquer thread."""
+
+    def __init__(self, id_requisicao: str, metodo: str = "", caminho: str = ""):
+        self.id = id_requisicao
+        self.metodo = metodo
+        self.caminho = caminho
+        self.rota = caminho
+        self.status: Optional[int] = None
+        self.inicio = time.perf_counter()
+        self.data_hora = time.time()
+        self.duracao_ms: Optional[float] = None
+        self.spans: List[Span] = []
+
+    def adicionar(self, nome: str, inicio: float, fim: float, atributos: Optional[Dict[str, Any]] = None):
+        """Registra um span a partir de instantes de time.perf_counter()."""
+        self.spans.append(Span(nome, round((inicio - self.inicio) * 1000, 3), round((fim - inicio) * 1000, 3),
+                               threading.current_thread().name, atributos or {}))
+
+    def decorrido_ms(self) -> float:
+        return (time.perf_counter() - self.inicio) * 1000
+
+    def resumo(self) -> Dict[str, float]:
+        """Tempo total (ms) por nome de span, na ordem em que cada nome apareceu."""
+        totais: Dict[str, float] = {}
+        for s in list(self.spans):
+            totais[s.nome] = totais.get(s.nome, 0.0) + s.duracao_ms
+        return {nome: round(total, 3) for nome, total in totais.items()}
+
+    def server_timing(self) -> str:
+        """Valor do cabeçalho Server-Timing com os spans já concluídos e o tempo total até agora."""
+        partes = [f"{nome};dur={total:.2f}" for nome, total in self.resumo().items()]
+        partes.append(f"total;dur={self.decorrido_ms():.2f}")
+        return ", ".join(partes)
+
+    def finalizar(self, status: int, rota: Optional[str] = None):
+        self.status = status
+        self.rota = rota or self.caminho
+        self.duracao_ms = round(self.decorrido_ms(), 3)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "metodo": self.metodo,
+            "caminho": self.caminho,
+            "rota": self.rota,
+            "status": self.status,
+            "inicio": self.data_hora,
+            "duracao_ms": self.duracao_ms,
+            "etapas": self.resumo(),
+            "spans": [asdict(s) for s in list(self.spans)]
+        }
+
+
+class RastroLote:
+    """Encaminha os spans de um trabalho compartilhado para os rastros de todas as requisições envolvidas."""
+
+    def __init__(self, rastros: Iterable[Rastro]):
+        self.rastros = list(rastros)
+
+    def adicionar(self, nome: str, inicio: float, fim: float, atributos: Optional[Dict[str, Any]] = None):
+        atributos = {**(atributos or {}), "requisicoes_no_lote": len(self.rastros)}
+        for rastro in self.rastros:
+            rastro.adicionar(nome, inicio, fim, atributos)
+
+
+def rastro_atual() -> Optional[Rastro]:
+    """Rastro da requisição em andamento no contexto atual (ou None)."""
+    return _rastro_atual.get()
+
+
+def id_requisicao_atual() -> Optional[str]:
+    rastro = _rastro_atual.get()
+    return getattr(rastro, "id", None)
+
+
+@contextmanager
+def usar_rastro(rastro):
+    """Ativa um Rastro (ou RastroLote, ou None para nenhum) no contexto atual durante o bloco."""
+    token = _rastro_atual.set(rastro)
+    try:
+        yield rastro
+    finally:
+        _rastro_atual.reset(token)
+
+
+class span:
+    """Context manager que registra a duração do bloco no rastro ativo; sem rastro, não faz nada."""
+
+    __slots__ = ("nome", "atributos", "rastro", "inicio")
+
+    def __init__(self, nome: str, **atributos):
+        self.nome = nome
+        self.atributos = atributos
+
+    def definir(self, **atributos):
+        """Acrescenta atributos conhecidos só durante o bloco (ex.: status da resposta)."""
+        self.atributos.update(atributos)
+
+    def __enter__(self):
+        self.rastro = _rastro_atual.get()
+        if self.rastro is not None:
+            self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo_excecao, excecao, tb):
+        if self.rastro is not None:
+            if tipo_excecao is not None:
+                self.atributos["erro"] = tipo_excecao.__name__
+            self.rastro.adicionar(self.nome, self.inicio, time.perf_counter(), self.atributos)
+        return False
+
+
+class ExportadorArquivo:
+    """Grava os rastros concluídos em JSONL a partir de uma thread própria, sem E/S no loop de eventos."""
+
+    def __init__(self, caminho: str, max_fila: int = 10000):
+        self.caminho = caminho
+        self.descartados = 0
+        self._fila: "queue.Queue[Optional[dict]]" = queue.Queue(maxsize=max_fila)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _iniciar(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._executar, name="exportador-rastros", daemon=True)
+                self._thread.start()
+                logger.info(f"Exportação de rastros para {self.caminho}")
+
+    def exportar(self, rastro: Rastro):
+        if self._thread is None:
+            self._iniciar()
+        try:
+            self._fila.put_nowait(rastro.to_dict())
+        except queue.Full:
+            # Com o disco lento, descarta rastros em vez de atrasar as requisições
+            self.descartados += 1
+
+    def _executar(self):
+        with open(self.caminho, "a", encoding="utf-8") as arquivo:
+            while True:
+                item = self._fila.get()
+                if item is None:
+                    break
+                arquivo.write(json.dumps(item, ensure_ascii=False) + "\n")
+                if self._fila.empty():
+                    arquivo.flush()
+
+    def fechar(self, timeout: float = 5.0):
+        """Grava os rastros pendentes e encerra a thread (reiniciada no próximo rastro)."""
+        with self._lock:
+            if self._thread is not None:
+                self._fila.put(None)
+                self._thread.join(timeout)
+                self._thread = None
+        if self.descartados:
+            logger.warning(f"{self.descartados} rastros descartados com a fila de exportação cheia")
+
+
+def _id_requisicao(scope) -> str:
+    for nome, valor in scope.get("headers", []):
+        if nome == b"x-request-id":
+            valor = valor.decode("latin-1")
+            if _ID_VALIDO.match(valor):
+                return valor
+            break
+    return uuid.uuid4().hex[:16]
+
+
+class MiddlewareRastreamento:
+    """
+    Middleware ASGI que abre um rastro por requisição.
+
+    Acrescenta à resposta os cabeçalhos X-Request-ID e Server-Timing (nas respostas
+    em streaming, só com as etapas concluídas antes do primeiro byte), registra no
+    log o detalhamento das requisições com duração >= `log_min_ms`, envia o rastro
+    ao exportador e, se configurado, amostra a requisição no perfilador.
+    """
+
+    def __init__(self, app, exportador: Optional[ExportadorArquivo] = None, perfilador=None,
+                 log_min_ms: float = 0.0, ignorar: Iterable[str] = ("/metrics",)):
+        self.app = app
+        self.exportador = exportador
+        self.perfilador = perfilador
+        self.log_min_ms = log_min_ms
+        self.ignorar = frozenset(ignorar)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.ignorar:
+            return await self.app(scope, receive, send)
+
+        rastro = Rastro(_id_requisicao(scope), scope["method"], scope["path"])
+        status = 500
+
+        async def enviar(mensagem):
+            nonlocal status
+            if mensagem["type"] == "http.response.start":
+                status = mensagem["status"]
+                cabecalhos = list(mensagem.get("headers", []))
+                cabecalhos.append((b"x-request-id", rastro.id.encode("latin-1")))
+                cabecalhos.append((b"server-timing", rastro.server_timing().encode("latin-1")))
+                mensagem = {**mensagem, "headers": cabecalhos}
+            await send(mensagem)
+
+        perfil = self.perfilador.iniciar() if self.perfilador is not None else None
+        token = _rastro_atual.set(rastro)
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            _rastro_atual.reset(token)
+            rastro.finalizar(status, getattr(scope.get("route"), "path", None))
+            if perfil is not None:
+                await self.perfilador.concluir(perfil, rastro)
+            self._registrar(rastro)
+
+    def _registrar(self, rastro: Rastro):
+        if rastro.duracao_ms >= self.log_min_ms:
+            logger.info(f"Rastro {rastro.metodo} {rastro.rota} {rastro.status} {rastro.duracao_ms:.1f}ms: "
+                        + json.dumps({"id": rastro.id, "etapas": rastro.resumo()}, ensure_ascii=False))
+        if self.exportador is not None:
+            self.exportador.exportar(rastro)
+
+
+def para_eventos_chrome(linhas: Iterable[str]) -> List[dict]:
+    """Converte rastros exportados (JSONL) em eventos "X" do formato de rastreamento do Chrome."""
+    eventos = []
+    threads: Dict[str, int] = {}
+    for pid, linha in enumerate(linhas, start=1):
+        if not linha.strip():
+            continue
+        rastro = json.loads(linha)
+        inicio_us = rastro["inicio"] * 1e6
+        eventos.append({"name": "process_name", "ph": "M", "pid": pid,
+                        "args": {"name": f"{rastro['metodo']} {rastro['rota']} ({rastro['id']})"}})
+        eventos.append({"name": "requisicao", "ph": "X", "pid": pid, "tid": 0, "ts": inicio_us,
+                        "dur": (rastro["duracao_ms"] or 0) * 1000, "args": {"status": rastro["status"]}})
+        for s in rastro["spans"]:
+            tid = threads.setdefault(s["thread"], len(threads) + 1)
+            eventos.append({"name": s["nome"], "ph": "X", "pid": pid, "tid": tid,
+                            "ts": inicio_us + s["inicio_ms"] * 1000, "dur": s["duracao_ms"] * 1000,
+                            "args": s["atributos"]})
+    pids = {evento["pid"] for evento in eventos}
+    for nome, tid in threads.items():
+        eventos.extend({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": nome}}
+                       for pid in pids)
+    return eventos
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Converte rastros JSONL para o formato de eventos do Chrome")
+    parser.add_argument("entrada", help="Arquivo JSONL gravado com TRACE_EXPORT_PATH")
+    parser.add_argument("saida", help="Arquivo JSON para o Perfetto ou chrome://tracing")
+    args = parser.parse_args()
+    with open(args.entrada, encoding="utf-8") as f:
+        eventos = para_eventos_chrome(f)
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": eventos, "displayTimeUnit": "ms"}, f)
+    print(f"{len(eventos)} eventos gravados em {args.saida}")
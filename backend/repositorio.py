@@ -0,0 +1,169 @@
+"""
+Camada de acesso ao banco SQLite compartilhada por main.py, database.py e usuarios.py.
+
+Mantém um pool limitado de conexões configuradas com WAL, synchronous=NORMAL e
+busy timeout, reaproveitando o cache de comandos preparados de cada conexão, e
+um pool de threads para executar as operações bloqueantes fora do loop de eventos.
+"""
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional, TypeVar
+
+from metricas import LIMITES_ESPERA, histograma
+from rastreamento import span
+
+logger = logging.getLogger("repositorio")
+
+DB_PATH = os.getenv("TRIAGEM_DB_PATH", "./validacao_triagem.db")
+MAX_CONNECTIONS = int(os.getenv("TRIAGEM_DB_MAX_CONNECTIONS", "8"))
+BUSY_TIMEOUT_MS = int(os.getenv("TRIAGEM_DB_BUSY_TIMEOUT_MS", "5000"))
+
+T = TypeVar("T")
+
+ESPERA_CONEXAO = histograma("sqlite_espera_conexao_segundos", "Tempo até obter uma conexão do pool SQLite",
+                            limites=LIMITES_ESPERA)
+
+
+class ConnectionPool:
+    """Pool limitado de conexões SQLite reutilizáveis entre threads."""
+
+    def __init__(self, db_path: str, max_connections: int = 8, busy_timeout_ms: int = 5000,
+                 cached_statements: int = 256):
+        """
+        Args:
+            db_path: Caminho do arquivo do banco
+            max_connections: Número máximo de conexões abertas simultaneamente
+            busy_timeout_ms: Tempo que uma escrita aguarda o lock do banco antes de falhar
+            cached_statements: Tamanho do cache de comandos preparados por conexão
+        """
+        self.db_path = db_path
+        self.max_connections = max_connections
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cached_statements = cached_statements
+        self._livres: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._criadas = 0
+        self._lock = threading.Lock()
+
+    def _criar_conexao(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,
+            cached_statements=self.cached_statements
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={self.busy_timeout_ms}")
+        return conn
+
+    def _adquirir(self) -> sqlite3.Connection:
+        inicio = time.perf_counter()
+        conn = self._obter_conexao()
+        ESPERA_CONEXAO.observar(time.perf_counter() - inicio)
+        return conn
+
+    def _obter_conexao(self) -> sqlite3.Connection:
+        try:
+            return self._livres.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._criadas < self.max_connections:
+                self._criadas += 1
+                try:
+                    return self._criar_conexao()
+                except Exception:
+                    self._criadas -= 1
+                    raise
+        return self._livres.get(timeout=self.busy_timeout_ms / 1000)
+
+    def _devolver(self, conn: sqlite3.Connection):
+        # Uma transação esquecida aberta bloquearia os próximos usuários da conexão
+        if conn.in_transaction:
+            conn.rollback()
+        self._livres.put(conn)
+
+    @contextmanager
+    def conexao(self) -> Iterator[sqlite3.Connection]:
+        """Empresta uma conexão do pool; transações não confirmadas são desfeitas na devolução."""
+        conn = self._adquirir()
+        try:
+            yield conn
+        finally:
+            self._devolver(conn)
+
+    @contextmanager
+    def transacao(self) -> Iterator[sqlite3.Connection]:
+        """Empresta uma conexão e confirma a transação ao final (ou desfaz em caso de erro)."""
+        with self.conexao() as conn:
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def fechar(self):
+        """Fecha todas as conexões livres do pool."""
+        while True:
+            try:
+                conn = self._livres.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._criadas -= 1
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=MAX_CONNECTIONS, thread_name_prefix="sqlite")
+
+
+def obter_pool() -> ConnectionPool:
+    """Retorna o pool global, criando-o no primeiro uso."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_PATH, MAX_CONNECTIONS, BUSY_TIMEOUT_MS)
+                logger.info(f"Pool SQLite inicializado: {DB_PATH} (max_connections={MAX_CONNECTIONS})")
+    return _pool
+
+
+def conexao():
+    """Atalho para obter_pool().conexao()."""
+    return obter_pool().conexao()
+
+
+def transacao():
+    """Atalho para obter_pool().transacao()."""
+    return obter_pool().transacao()
+
+
+async def executar(func: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Executa uma função bloqueante de acesso ao banco no pool de threads do repositório.
+
+    A função roda com uma cópia do contexto de quem chamou (como asyncio.to_thread),
+    preservando o rastro e o id da requisição.
+    """
+    loop = asyncio.get_running_loop()
+    contexto = contextvars.copy_context()
+    with span(f"sqlite.{getattr(func, '__name__', 'consulta')}"):
+        return await loop.run_in_executor(_executor, functools.partial(contexto.run, func, *args, **kwargs))
+
+
+def fechar():
+    """Fecha as conexões do pool global."""
+    if _pool is not None:
+        _pool.fechar()
@@ -1,9 +1,9 @@
 from fastapi import FastAPI, HTTPException, Depends, status, Request, Form, APIRouter
 from pydantic import BaseModel
 from typing import List, Optional
-import sqlite3
 from datetime import datetime
 import uuid
+from repositorio import executar
 from usuarios import Usuario, init_users_db, criar_usuario, listar_usuarios, obter_usuario, atualizar_usuario, excluir_usuario, autenticar_usuario
 
 # Criar router para usuários
@@ -53,7 +53,7 @@ async def cadastrar_usuario(usuario: UsuarioRequest):
             role=usuario.role
         )
         
-        resultado = criar_usuario(novo_usuario)
+        resultado = await executar(criar_usuario, novo_usuario)
         
         if not resultado["success"]:
             raise HTTPException(status_code=400, detail=resultado["message"])
@@ -66,7 +66,7 @@ async def cadastrar_usuario(usuario: UsuarioRequest):
 async def listar_todos_usuarios():
     """Lista todos os usuários cadastrados"""
     try:
-        usuarios = listar_usuarios()
+        usuarios = await executar(listar_usuarios)
         return {"usuarios": usuarios}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao listar usuários: {str(e)}")
@@ -75,7 +75,7 @@ async def listar_todos_usuarios():
 async def obter_detalhes_usuario(usuario_id: str):
     """Obtém os detalhes de um usuário específico"""
     try:
-        resultado = obter_usuario(usuario_id)
+        resultado = await executar(obter_usuario, usuario_id)
         
         if not resultado["success"]:
             raise HTTPException(status_code=404, detail=resultado["message"])
@@ -88,7 +88,7 @@ async def obter_detalhes_usuario(usuario_id: str):
 async def atualizar_dados_usuario(usuario_id: str, dados: UsuarioUpdateRequest):
     """Atualiza os dados de um usuário"""
     try:
-        resultado = atualizar_usuario(usuario_id, dados.dict(exclude_unset=True))
+        resultado = await executar(atualizar_usuario, usuario_id, dados.dict(exclude_unset=True))
         
         if not resultado["success"]:
             raise HTTPException(status_code=400, detail=resultado["message"])
@@ -101,7 +101,7 @@ async def atualizar_dados_usuario(usuario_id: str, dados: UsuarioUpdateRequest):
 async def excluir_usuario_sistema(usuario_id: str):
     """Exclui um usuário do sistema"""
     try:
-        resultado = excluir_usuario(usuario_id)
+        resultado = await executar(excluir_usuario, usuario_id)
         
         if not resultado["success"]:
             raise HTTPException(status_code=404, detail=resultado["message"])
@@ -122,7 +122,7 @@ async def login(request: Request):
         if not username or not password:
             return {"success": False, "message": "Usuário e senha são obrigatórios"}
         
-        resultado = autenticar_usuario(username, password)
+        resultado = await executar(autenticar_usuario, username, password)
         return resultado
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao realizar login: {str(e)}")
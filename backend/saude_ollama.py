@@ -0,0 +1,200 @@
+"""
+Disponibilidade do Ollama: circuit breaker e monitor de saúde em segundo plano.
+
+O CircuitBreaker acompanha o resultado das chamadas de geração:
+
+    fechado      chamadas liberadas; `limiar_falhas` falhas consecutivas abrem o circuito
+    aberto       chamadas recusadas sem tocar a rede (a triagem vai direto para a
+                 classificação provisória) até passar `tempo_abertura_s`
+    meio_aberto  uma chamada de teste é liberada; sucesso fecha o circuito, falha reabre
+
+O MonitorSaude consulta periodicamente a lista de modelos do Ollama (/api/tags) e
+guarda o último resultado para /api/status. Uma verificação sem resposta (ou sem o
+modelo configurado) abre o circuito imediatamente; uma verificação bem-sucedida com
+o circuito aberto antecipa o meio_aberto, sem esperar o fim de `tempo_abertura_s`.
+"""
+import asyncio
+import logging
+import time
+from collections import Counter
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger("saude_ollama")
+
+FECHADO = "fechado"
+ABERTO = "aberto"
+MEIO_ABERTO = "meio_aberto"
+
+
+class CircuitBreaker:
+    def __init__(self, limiar_falhas: int = 3, tempo_abertura_s: float = 30.0):
+        """
+        Args:
+            limiar_falhas: Falhas consecutivas que abrem o circuito
+            tempo_abertura_s: Tempo com o circuito aberto antes de liberar uma chamada de teste
+        """
+        self.limiar_falhas = limiar_falhas
+        self.tempo_abertura_s = tempo_abertura_s
+        self.estado = FECHADO
+        self.falhas_consecutivas = 0
+        self._aberto_em: Optional[float] = None
+        # Início da chamada de teste em andamento no meio_aberto (None se não há teste)
+        self._teste_em: Optional[float] = None
+        self._transicoes: Counter = Counter()
+        self._rejeitadas = 0
+
+    def _mudar_estado(self, novo: str, motivo: str):
+        if novo == self.estado:
+            return
+        self._transicoes[(self.estado, novo)] += 1
+        logger.warning(f"Circuito do Ollama: {self.estado} -> {novo} ({motivo})")
+        self.estado = novo
+        self._teste_em = None
+        self._aberto_em = time.monotonic() if novo == ABERTO else None
+
+    @property
+    def aberto(self) -> bool:
+        """True enquanto as chamadas estão sendo recusadas (não consome a chamada de teste)."""
+        if self.estado == ABERTO:
+            return time.monotonic() - self._aberto_em < self.tempo_abertura_s
+        if self.estado == MEIO_ABERTO:
+            return self._teste_em is not None and time.monotonic() - self._teste_em < self.tempo_abertura_s
+        return False
+
+    def permitir(self) -> bool:
+        """Indica se uma chamada pode ser feita agora; no meio_aberto, reserva a chamada de teste."""
+        if self.estado == ABERTO and time.monotonic() - self._aberto_em >= self.tempo_abertura_s:
+            self._mudar_estado(MEIO_ABERTO, "tempo de abertura esgotado")
+        if self.estado == FECHADO:
+            return True
+        # Um teste sem resultado há mais de tempo_abertura_s (ex.: requisição cancelada) é descartado
+        if self.estado == MEIO_ABERTO and (self._teste_em is None
+                                           or time.monotonic() - self._teste_em >= self.tempo_abertura_s):
+            self._teste_em = time.monotonic()
+            return True
+        self._rejeitadas += 1
+        return False
+
+    def registrar_sucesso(self):
+        self.falhas_consecutivas = 0
+        if self.estado != FECHADO:
+            self._mudar_estado(FECHADO, "chamada bem-sucedida")
+
+    def registrar_falha(self, motivo: str = "falha na chamada"):
+        self.falhas_consecutivas += 1
+        if self.estado == MEIO_ABERTO or (self.estado == FECHADO and self.falhas_consecutivas >= self.limiar_falhas):
+            self._mudar_estado(ABERTO, f"{motivo}, {self.falhas_consecutivas} falhas consecutivas")
+
+    def abrir(self, motivo: str):
+        """Abre o circuito sem esperar o limiar de falhas (Ollama sabidamente fora do ar)."""
+        if self.estado == ABERTO:
+            return
+        self.falhas_consecutivas = max(self.falhas_consecutivas, self.limiar_falhas)
+        self._mudar_estado(ABERTO, motivo)
+
+    def liberar_teste(self):
+        """Passa do aberto para o meio_aberto antes do fim de tempo_abertura_s."""
+        if self.estado == ABERTO:
+            self._mudar_estado(MEIO_ABERTO, "verificação de saúde bem-sucedida")
+
+    def contagem_transicoes(self) -> Dict[Tuple[str, str], int]:
+        """Número de transições por (estado de origem, estado de destino)."""
+        return dict(self._transicoes)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "estado": self.estado,
+            "falhas_consecutivas": self.falhas_consecutivas,
+            "chamadas_rejeitadas": self._rejeitadas,
+            "transicoes": {f"{de}->{para}": n for (de, para), n in self._transicoes.items()},
+            "aberto_ha_s": round(time.monotonic() - self._aberto_em, 1) if self._aberto_em is not None else None
+        }
+
+
+class MonitorSaude:
+    def __init__(self, ollama_service, circuit_breaker: CircuitBreaker, intervalo_s: float = 10.0,
+                 timeout_s: float = 3.0):
+        """
+        Args:
+            ollama_service: OllamaService verificado (usa o mesmo pool de conexões)
+            circuit_breaker: Circuito alimentado pelo resultado das verificações
+            intervalo_s: Intervalo entre verificações
+            timeout_s: Tempo máximo de cada verificação
+        """
+        self.ollama_service = ollama_service
+        self.circuit_breaker = circuit_breaker
+        self.intervalo_s = intervalo_s
+        self.timeout_s = timeout_s
+        self._ultima: Optional[Dict[str, Any]] = None
+        self._verificacoes = 0
+        self._falhas = 0
+        self._tarefa: Optional[asyncio.Task] = None
+
+    @property
+    def disponivel(self) -> Optional[bool]:
+        """Resultado da última verificação (None se ainda não houve nenhuma)."""
+        return None if self._ultima is None else self._ultima["disponivel"]
+
+    async def verificar(self) -> Dict[str, Any]:
+        """Consulta /api/tags uma vez, guarda o resultado e atualiza o circuito."""
+        inicio = time.monotonic()
+        erro = None
+        modelos = []
+        try:
+            modelos = await asyncio.wait_for(self.ollama_service.listar_modelos(), timeout=self.timeout_s)
+        except asyncio.TimeoutError:
+            erro = f"sem resposta em {self.timeout_s:.0f}s"
+        except Exception as e:
+            erro = str(e) or type(e).__name__
+
+        modelo = self.ollama_service.model
+        # O Ollama lista os modelos com a tag ("mistral:latest")
+        modelo_disponivel = any(nome == modelo or nome.split(":")[0] == modelo for nome in modelos)
+        if erro is None and not modelo_disponivel:
+            erro = f"modelo {modelo} não encontrado"
+
+        self._verificacoes += 1
+        self._ultima = {
+            "disponivel": erro is None,
+            "modelo_disponivel": modelo_disponivel,
+            "latencia_ms": round((time.monotonic() - inicio) * 1000, 1),
+            "verificado_em": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "erro": erro
+        }
+        if erro is None:
+            self.circuit_breaker.liberar_teste()
+        else:
+            self._falhas += 1
+            logger.warning(f"Verificação de saúde do Ollama falhou: {erro}")
+            self.circuit_breaker.abrir(f"verificação de saúde: {erro}")
+        return self._ultima
+
+    async def _executar(self):
+        while True:
+            try:
+                await self.verificar()
+            except Exception as e:
+                logger.error(f"Erro na verificação de saúde do Ollama: {str(e)}")
+            await asyncio.sleep(self.intervalo_s)
+
+    def iniciar(self):
+        if self._tarefa is None or self._tarefa.done():
+            self._tarefa = asyncio.create_task(self._executar())
+            logger.info(f"Monitor de saúde do Ollama iniciado (intervalo {self.intervalo_s:.0f}s)")
+
+    async def parar(self):
+        if self._tarefa is not None:
+            self._tarefa.cancel()
+            try:
+                await self._tarefa
+            except asyncio.CancelledError:
+                pass
+            self._tarefa = None
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "ultima_verificacao": self._ultima,
+            "verificacoes": self._verificacoes,
+            "verificacoes_com_falha": self._falhas,
+            "circuito": self.circuit_breaker.get_metrics()
+        }
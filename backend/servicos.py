@@ -0,0 +1,89 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger("servicos")
+
+CARREGANDO = "loading"
+PRONTO = "ready"
+FALHOU = "failed"
+
+
+class ServicoIndisponivel(Exception):
+    """Erro levantado quando um serviço ainda está carregando ou falhou ao carregar."""
+
+    def __init__(self, nome: str, estado: str, erro: Optional[str] = None):
+        self.nome = nome
+        self.estado = estado
+        self.erro = erro
+        detalhe = "em carregamento" if estado == CARREGANDO else f"falhou ao carregar: {erro}"
+        super().__init__(f"Serviço {nome} {detalhe}")
+
+
+class RegistroServicos:
+    """
+    Acompanha o ciclo de vida dos serviços carregados em segundo plano.
+
+    Cada serviço passa de "loading" para "ready" (com a instância carregada) ou
+    "failed" (com a mensagem de erro). Todas as transições acontecem no loop de
+    eventos, e os endpoints podem aguardar um serviço com timeout.
+    """
+
+    def __init__(self):
+        self._estados: Dict[str, Dict[str, Any]] = {}
+        self._eventos: Dict[str, asyncio.Event] = {}
+
+    def registrar(self, nome: str):
+        """Marca o serviço como em carregamento."""
+        self._estados[nome] = {"estado": CARREGANDO, "instancia": None, "erro": None,
+                               "inicio": time.monotonic(), "duracao_s": None}
+        self._eventos[nome] = asyncio.Event()
+
+    def definir_pronto(self, nome: str, instancia: Any = None):
+        estado = self._estados[nome]
+        estado.update(estado=PRONTO, instancia=instancia,
+                      duracao_s=round(time.monotonic() - estado["inicio"], 3))
+        self._eventos[nome].set()
+        logger.info(f"Serviço {nome} pronto em {estado['duracao_s']}s")
+
+    def definir_falha(self, nome: str, erro: Exception):
+        estado = self._estados[nome]
+        estado.update(estado=FALHOU, erro=str(erro),
+                      duracao_s=round(time.monotonic() - estado["inicio"], 3))
+        self._eventos[nome].set()
+        logger.error(f"Serviço {nome} falhou ao carregar: {str(erro)}")
+
+    def estado(self, nome: str) -> str:
+        return self._estados.get(nome, {}).get("estado", FALHOU)
+
+    def obter(self, nome: str) -> Any:
+        """Retorna a instância do serviço se estiver pronto, senão levanta ServicoIndisponivel."""
+        estado = self._estados.get(nome)
+        if estado is None:
+            raise ServicoIndisponivel(nome, FALHOU, "serviço não registrado")
+        if estado["estado"] != PRONTO:
+            raise ServicoIndisponivel(nome, estado["estado"], estado["erro"])
+        return estado["instancia"]
+
+    async def aguardar(self, nome: str, timeout: float) -> Any:
+        """
+        Aguarda o serviço ficar pronto por até `timeout` segundos.
+
+        Raises:
+            ServicoIndisponivel: Se o serviço falhou ou não ficou pronto a tempo
+        """
+        evento = self._eventos.get(nome)
+        if evento is not None and not evento.is_set() and timeout > 0:
+            try:
+                await asyncio.wait_for(evento.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.obter(nome)
+
+    def resumo(self) -> Dict[str, Dict[str, Any]]:
+        """Estado, erro e tempo de carregamento de cada serviço, para /api/status."""
+        return {
+            nome: {"estado": estado["estado"], "erro": estado["erro"], "duracao_s": estado["duracao_s"]}
+            for nome, estado in self._estados.items()
+        }